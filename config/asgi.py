@@ -0,0 +1,12 @@
+"""
+ASGI config for habit_tracker project.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Асинхронный dispatch view DRF (см. habits/async_views.py)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
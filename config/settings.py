@@ -4,6 +4,7 @@ Django settings for habit_tracker project.
 import os
 import sys
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party apps
     'rest_framework',
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'habits.query_budget.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -70,6 +73,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+# Асинхронный dispatch view DRF; включается в config/asgi.py
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
 # Database
 DATABASES = {
@@ -130,6 +136,9 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5,
 }
 
+# Заголовки X-Query-Count / X-Query-Budget (только для разработки)
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', str(DEBUG)) == 'True'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.getenv(
     'CORS_ALLOWED_ORIGINS',
@@ -138,6 +147,18 @@ CORS_ALLOWED_ORIGINS = os.getenv(
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Redis (общие данные воркеров: лимиты, очереди, счетчики)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/1')
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'habit_tracker',
+    }
+}
+
 # Celery settings
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
@@ -145,10 +166,77 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    'schedule-habit-reminders': {
+        'task': 'habits.tasks.schedule_habit_reminders',
+        'schedule': crontab(),  # каждую минуту
+    },
+    'dispatch-due-reminders': {
+        'task': 'habits.tasks.dispatch_due_reminders',
+        'schedule': float(os.getenv('HABIT_REMINDER_POLL_INTERVAL', '1')),
+    },
+    'drain-reminder-outbox': {
+        'task': 'habits.tasks.drain_reminder_outbox',
+        'schedule': float(os.getenv('HABIT_REMINDER_OUTBOX_INTERVAL', '15')),
+    },
+    'prune-reminder-deliveries': {
+        'task': 'habits.tasks.prune_reminder_deliveries',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'prune-habit-tombstones': {
+        'task': 'habits.tasks.prune_habit_tombstones',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
+# Reminder scheduling settings
+HABIT_REMINDER_LOOKAHEAD_MINUTES = int(os.getenv('HABIT_REMINDER_LOOKAHEAD_MINUTES', '1'))
+HABIT_REMINDER_BATCH_SIZE = int(os.getenv('HABIT_REMINDER_BATCH_SIZE', '100'))
+HABIT_REMINDER_DEDUP_TTL = int(os.getenv('HABIT_REMINDER_DEDUP_TTL', str(2 * 24 * 60 * 60)))
+HABIT_REMINDER_SHARDS = int(os.getenv('HABIT_REMINDER_SHARDS', '4'))
+HABIT_REMINDER_CHUNK_SIZE = int(os.getenv('HABIT_REMINDER_CHUNK_SIZE', '2000'))
+HABIT_REMINDER_TEXT_LRU_SIZE = int(os.getenv('HABIT_REMINDER_TEXT_LRU_SIZE', '10000'))
+HABIT_REMINDER_MAX_ATTEMPTS = int(os.getenv('HABIT_REMINDER_MAX_ATTEMPTS', '5'))
+HABIT_REMINDER_RETRY_BASE_DELAY = int(os.getenv('HABIT_REMINDER_RETRY_BASE_DELAY', '30'))
+HABIT_REMINDER_TEXT_CACHE_TIMEOUT = int(os.getenv('HABIT_REMINDER_TEXT_CACHE_TIMEOUT', str(8 * 24 * 60 * 60)))
+HABIT_REMINDER_DELIVERY_TTL_DAYS = int(os.getenv('HABIT_REMINDER_DELIVERY_TTL_DAYS', '7'))
+HABIT_REMINDER_DELIVERY_LEASE = int(os.getenv('HABIT_REMINDER_DELIVERY_LEASE', '600'))
+
+# Prometheus metrics: /metrics/ requires "Authorization: Bearer <token>";
+# without a token the endpoint is only open when DEBUG is on
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Public feed cache settings
+HABIT_PUBLIC_FEED_CACHE_TIMEOUT = int(os.getenv('HABIT_PUBLIC_FEED_CACHE_TIMEOUT', '300'))
+HABIT_PUBLIC_FEED_CACHED_PAGES = int(os.getenv('HABIT_PUBLIC_FEED_CACHED_PAGES', '3'))
+HABIT_PUBLIC_FEED_LOCK_TIMEOUT = int(os.getenv('HABIT_PUBLIC_FEED_LOCK_TIMEOUT', '5'))
+
+# ETag for user habits: cached count/max(updated_at)
+HABIT_ETAG_CACHE_TIMEOUT = int(os.getenv('HABIT_ETAG_CACHE_TIMEOUT', '300'))
+
+# Bulk create/update/delete of habits
+HABIT_BULK_MAX_ITEMS = int(os.getenv('HABIT_BULK_MAX_ITEMS', '500'))
+
+# Streaming export: rows fetched per server-side cursor round trip
+HABIT_EXPORT_CHUNK_SIZE = int(os.getenv('HABIT_EXPORT_CHUNK_SIZE', '2000'))
+
+# Delta sync for offline clients
+HABIT_SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv('HABIT_SYNC_TOMBSTONE_TTL_DAYS', '30'))
+HABIT_SYNC_OVERLAP_SECONDS = int(os.getenv('HABIT_SYNC_OVERLAP_SECONDS', '5'))
 
 # Telegram settings
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+TELEGRAM_CONNECTION_POOL_SIZE = int(os.getenv('TELEGRAM_CONNECTION_POOL_SIZE', '64'))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv('TELEGRAM_SEND_TIMEOUT', '30'))
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+
+# Telegram rate limits (token bucket в Redis, общий для всех воркеров)
+TELEGRAM_RATE_LIMIT_ENABLED = os.getenv('TELEGRAM_RATE_LIMIT_ENABLED', 'True') == 'True'
+TELEGRAM_GLOBAL_RATE_LIMIT = float(os.getenv('TELEGRAM_GLOBAL_RATE_LIMIT', '30'))
+TELEGRAM_GLOBAL_BURST = int(os.getenv('TELEGRAM_GLOBAL_BURST', '30'))
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_CHAT_RATE_LIMIT', '1'))
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', '1'))
 
 # Test settings - disable migrations for tests
 if 'test' in sys.argv:
@@ -159,3 +247,9 @@ if 'test' in sys.argv:
         def __getitem__(self, item):
             return None
     MIGRATION_MODULES = DisableMigrations()
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
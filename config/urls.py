@@ -7,6 +7,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from habits.views import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Habit Tracker API",
@@ -24,6 +26,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/habits/', include('habits.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 
     # Swagger documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0),
@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db import transaction
 
-from .models import Habit
+from .models import Habit, ReminderDelivery
+from .search import search_filter, search_rank
+from .sync import record_tombstones
 
 
 @admin.register(Habit)
@@ -21,7 +25,37 @@ class HabitAdmin(admin.ModelAdmin):
     ]
     list_filter = ["is_pleasant", "is_public", "created_at"]
     search_fields = ["action", "place", "user__email"]
-    readonly_fields = ["created_at", "updated_at"]
+    readonly_fields = ["next_due_date", "created_at", "updated_at"]
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Подстрочный поиск по search_fields, как в стандартной админке,
+        дополненный полнотекстовым и нечетким поиском по действию и месту
+        (см. search.py). Если порядок не выбран в списке, найденное
+        упорядочивается по релевантности.
+        """
+        matched, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        search_term = search_term.strip()
+        if not search_term:
+            return matched, may_have_duplicates
+
+        found = (matched | queryset.filter(search_filter(search_term))).annotate(
+            rank=search_rank(search_term)
+        )
+        if ORDER_VAR not in request.GET:
+            found = found.order_by("-rank", "-pk")
+        return found, may_have_duplicates
+
+    def delete_queryset(self, request, queryset):
+        """
+        Массовое удаление с записью в журнал удалений для синхронизации.
+        """
+        with transaction.atomic():
+            deleted = list(queryset.values_list("user_id", "id"))
+            super().delete_queryset(request, queryset)
+            record_tombstones(deleted)
 
     fieldsets = (
         ("Основная информация", {"fields": ("user", "action", "place", "time")}),
@@ -40,6 +74,22 @@ class HabitAdmin(admin.ModelAdmin):
         ("Публичность", {"fields": ("is_public",)}),
         (
             "Служебная информация",
-            {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
+            {
+                "fields": ("next_due_date", "created_at", "updated_at"),
+                "classes": ("collapse",),
+            },
         ),
     )
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    """
+    Админка для доставок напоминаний (outbox).
+    """
+
+    list_display = ["habit", "chat_id", "fire_at", "status", "attempts", "sent_at"]
+    list_filter = ["status", "fire_at"]
+    list_select_related = ["habit"]
+    raw_id_fields = ["habit"]
+    readonly_fields = ["created_at"]
@@ -5,3 +5,6 @@ class HabitsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "habits"
     verbose_name = "Привычки"
+
+    def ready(self):
+        from . import signals  # noqa: F401
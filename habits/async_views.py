@@ -0,0 +1,88 @@
+"""
+Асинхронный dispatch для view DRF при запуске под ASGI.
+
+DRF вызывает обработчики синхронно, поэтому под ASGI Django выполняет
+такой view целиком в потоке, и медленный запрос занимает поток на все
+время ответа. AsyncAPIViewMixin делает dispatch асинхронным: если у
+обработчика есть асинхронная версия с префиксом "a" (alist для list, aget
+для get), она выполняется в цикле событий и читает базу через асинхронный
+ORM, а остальные обработчики (запись, детальный просмотр) по-прежнему
+выполняются в потоке через sync_to_async. initial() (аутентификация, права,
+?fields=) тоже выполняется в потоке: классы аутентификации DRF синхронные.
+
+Асинхронный dispatch включается настройкой ASYNC_VIEWS, которую выставляет
+config/asgi.py. Под WSGI view остаются синхронными и не платят за переход
+через async_to_sync.
+"""
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.utils.decorators import classonlymethod
+from django.utils.functional import classproperty
+
+
+class AsyncAPIViewMixin:
+    """
+    Асинхронный dispatch для APIView и ViewSet.
+    Должен стоять в базовых классах перед классами DRF.
+    """
+
+    async_dispatch = False
+
+    @classproperty
+    def view_is_async(cls):
+        # Синхронные и асинхронные обработчики можно смешивать: режим
+        # выбирает as_view, поэтому проверка Django здесь не нужна
+        return False
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        if not settings.ASYNC_VIEWS:
+            return super().as_view(*args, **kwargs)
+        view = super().as_view(*args, async_dispatch=True, **kwargs)
+        return markcoroutinefunction(view)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.async_dispatch:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_async_handler(self, handler):
+        """
+        Асинхронная версия обработчика или None.
+        """
+        name = getattr(handler, "__name__", "")
+        async_handler = getattr(self, f"a{name}", None)
+        if iscoroutinefunction(async_handler):
+            return async_handler
+        return None
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        APIView.dispatch с ожиданием асинхронных обработчиков.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            method = request.method.lower()
+            handler = self.http_method_not_allowed
+            if method in self.http_method_names:
+                handler = getattr(self, method, self.http_method_not_allowed)
+
+            async_handler = self.get_async_handler(handler)
+            if async_handler is not None:
+                response = await async_handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
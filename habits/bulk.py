@@ -0,0 +1,186 @@
+"""
+Массовое создание, изменение и удаление привычек пользователя.
+
+Все элементы запроса проверяются до записи: ошибки возвращаются по каждому
+элементу, и если есть хотя бы одна, ничего не записывается. Связанные
+привычки всей пачки загружаются одним запросом, запись выполняется через
+bulk_create/bulk_update в одной транзакции. Они не вызывают save() и
+сигналы, поэтому fire_minute, next_due_date, updated_at, кэш ленты и ETag
+обновляются здесь.
+"""
+
+from collections import Counter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .etags import invalidate_user_habit_stats
+from .feed_cache import bump_feed_generation
+from .models import Habit
+from .scheduling import minute_of_day
+from .serializers import HabitBulkItemSerializer, HabitBulkUpdateItemSerializer
+from .sync import record_tombstones
+
+HABIT_NOT_FOUND = "Привычка не найдена."
+HABIT_DUPLICATE = "Привычка указана в запросе несколько раз."
+
+
+def _validate_items(serializer_class, items, context, partial=False):
+    """
+    Проверка полей каждого элемента (без обращений к базе).
+
+    :return: Пара списков: данные элемента (None при ошибке) и ошибки
+    """
+    results, errors = [], []
+    for item in items:
+        serializer = serializer_class(data=item, partial=partial, context=context)
+        if serializer.is_valid():
+            data = dict(serializer.validated_data)
+            data.pop("user", None)
+            results.append(data)
+            errors.append({})
+        else:
+            results.append(None)
+            errors.append(serializer.errors)
+    return results, errors
+
+
+def _resolve_related(habits, errors, known, deleted_ids):
+    """
+    Подстановка связанных привычек и проверка clean() для пачки.
+    Связанные привычки, которых нет среди known, загружаются одним запросом.
+
+    :param habits: Пары (индекс элемента, привычка)
+    :param errors: Ошибки элементов, дополняются на месте
+    :param known: Уже загруженные привычки {id: привычка}
+    :param deleted_ids: ID удаляемых в этом же запросе привычек
+    """
+    related_ids = {habit.related_habit_id for _, habit in habits} - {None}
+    missing = related_ids - known.keys() - deleted_ids
+    related = {**Habit.objects.in_bulk(missing), **known} if missing else known
+
+    for index, habit in habits:
+        related_id = habit.related_habit_id
+        if related_id:
+            if related_id in deleted_ids or related_id not in related:
+                message = serializers.PrimaryKeyRelatedField.default_error_messages[
+                    "does_not_exist"
+                ].format(pk_value=related_id)
+                errors[index] = {
+                    "related_habit": [
+                        serializers.ErrorDetail(message, code="does_not_exist")
+                    ]
+                }
+                continue
+            habit.related_habit = related[related_id]
+        try:
+            habit.clean()
+        except DjangoValidationError as e:
+            errors[index] = serializers.as_serializer_error(e)
+
+
+def apply_bulk_changes(user, data, context):
+    """
+    Применение массового запроса к привычкам пользователя.
+
+    :param user: Владелец привычек
+    :param data: Проверенные данные HabitBulkSerializer
+    :param context: Контекст сериализатора (запрос)
+    :return: Тройка (созданные привычки, измененные привычки, ID удаленных)
+    :raises ValidationError: Ошибки по каждому элементу, ничего не записано
+    """
+    create_data, create_errors = _validate_items(
+        HabitBulkItemSerializer, data["create"], context
+    )
+    update_data, update_errors = _validate_items(
+        HabitBulkUpdateItemSerializer, data["update"], context, partial=True
+    )
+    delete_ids = data["delete"]
+    delete_errors = [{} for _ in delete_ids]
+
+    for index, item in enumerate(update_data):
+        if item is not None and "id" not in item:
+            update_data[index] = None
+            update_errors[index] = {
+                "id": [serializers.Field.default_error_messages["required"]]
+            }
+    update_ids = [item["id"] for item in update_data if item is not None]
+    mentions = Counter(update_ids + delete_ids)
+    existing = Habit.objects.filter(user=user, id__in=mentions).in_bulk()
+
+    def check_target(habit_id, errors, index):
+        if habit_id not in existing:
+            errors[index] = {"id": [HABIT_NOT_FOUND]}
+        elif mentions[habit_id] > 1:
+            errors[index] = {"id": [HABIT_DUPLICATE]}
+        return not errors[index]
+
+    for index, habit_id in enumerate(delete_ids):
+        check_target(habit_id, delete_errors, index)
+
+    updated = []
+    update_fields = {"updated_at"}
+    for index, item in enumerate(update_data):
+        if item is None or not check_target(item["id"], update_errors, index):
+            continue
+        habit = existing[item.pop("id")]
+        if "related_habit" in item:
+            habit.related_habit_id = item.pop("related_habit")
+            update_fields.add("related_habit")
+        for name, value in item.items():
+            setattr(habit, name, value)
+        update_fields.update(item)
+        updated.append((index, habit))
+
+    created = []
+    for index, item in enumerate(create_data):
+        if item is not None:
+            related_id = item.pop("related_habit", None)
+            habit = Habit(user=user, related_habit_id=related_id, **item)
+            created.append((index, habit))
+
+    deleted_ids = set(delete_ids)
+    # Измененные привычки пачки используются как связанные в новом состоянии
+    known = {habit.id: habit for _, habit in updated}
+    _resolve_related(created, create_errors, known, deleted_ids)
+    _resolve_related(updated, update_errors, known, deleted_ids)
+
+    errors = {
+        "create": create_errors,
+        "update": update_errors,
+        "delete": delete_errors,
+    }
+    errors = {name: items for name, items in errors.items() if any(items)}
+    if errors:
+        raise serializers.ValidationError(errors)
+
+    created = [habit for _, habit in created]
+    updated = [habit for _, habit in updated]
+    now = timezone.now()
+    for habit in created:
+        habit.fire_minute = minute_of_day(habit.time)
+    for habit in updated:
+        habit.fire_minute = minute_of_day(habit.time)
+        habit.updated_at = now
+        if habit.reset_next_due_date():
+            update_fields.add("next_due_date")
+    if "time" in update_fields:
+        update_fields.add("fire_minute")
+
+    with transaction.atomic():
+        if delete_ids:
+            # Удаление через QuerySet отправляет post_delete для каждой привычки
+            Habit.objects.filter(user=user, id__in=delete_ids).delete()
+            record_tombstones((user.id, habit_id) for habit_id in delete_ids)
+        created = Habit.objects.bulk_create(created)
+        if updated:
+            Habit.objects.bulk_update(updated, sorted(update_fields))
+
+    if any(habit.is_public for habit in created) or any(
+        habit.is_public or habit._loaded_is_public for habit in updated
+    ):
+        bump_feed_generation()
+    invalidate_user_habit_stats(user.id)
+    return created, updated, delete_ids
@@ -0,0 +1,70 @@
+"""
+Защита от повторной постановки и отправки одного и того же напоминания.
+
+Каждому напоминанию соответствует детерминированный ключ
+(habit_id, момент отправки), который атомарно занимается в Redis.
+"""
+
+import logging
+
+from django.conf import settings
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REMINDER_KEY = "habits:reminder:{stage}:{habit_id}:{fire_ts}"
+DUPLICATES_DROPPED_KEY = "habits:reminders:duplicates_dropped"
+
+# Этапы, на которых проверяется уникальность напоминания
+STAGE_SCHEDULED = "scheduled"
+STAGE_SENT = "sent"
+
+
+def reminder_key(habit_id, fire_ts, stage):
+    """
+    Ключ напоминания в Redis.
+
+    :param habit_id: ID привычки
+    :param fire_ts: Момент отправки (unix timestamp)
+    :param stage: Этап (STAGE_SCHEDULED или STAGE_SENT)
+    """
+    return REMINDER_KEY.format(stage=stage, habit_id=habit_id, fire_ts=fire_ts)
+
+
+def claim_reminders(habit_ids, fire_ts, stage):
+    """
+    Атомарный захват ключей напоминаний (SET NX) одним pipeline.
+    Уже занятые ключи считаются дубликатами и учитываются в счетчике.
+
+    :param habit_ids: Список ID привычек
+    :param fire_ts: Момент отправки (unix timestamp)
+    :param stage: Этап (STAGE_SCHEDULED или STAGE_SENT)
+    :return: Список ID, для которых ключ удалось занять
+    """
+    if not habit_ids:
+        return []
+
+    client = get_redis()
+    pipe = client.pipeline(transaction=False)
+    for habit_id in habit_ids:
+        pipe.set(
+            reminder_key(habit_id, fire_ts, stage),
+            1,
+            nx=True,
+            ex=settings.HABIT_REMINDER_DEDUP_TTL,
+        )
+    claimed = [habit_id for habit_id, ok in zip(habit_ids, pipe.execute()) if ok]
+
+    dropped = len(habit_ids) - len(claimed)
+    if dropped:
+        client.incrby(DUPLICATES_DROPPED_KEY, dropped)
+        logger.warning(f"Отброшено дубликатов напоминаний ({stage}): {dropped}")
+    return claimed
+
+
+def get_duplicates_dropped():
+    """
+    Количество отброшенных дубликатов напоминаний.
+    """
+    return int(get_redis().get(DUPLICATES_DROPPED_KEY) or 0)
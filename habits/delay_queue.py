@@ -0,0 +1,72 @@
+"""
+Отложенная очередь напоминаний на основе Redis sorted set.
+
+Напоминание хранится как элемент "<fire_ts>:<habit_id>" с весом fire_ts.
+Состояние доставки хранится в outbox (ReminderDelivery), очередь лишь
+будит отправителей в нужный момент.
+Вместо ETA-задач Celery, которые лежат в памяти воркеров до срока,
+будущие напоминания лежат в Redis, а воркерам передаются только наступившие.
+"""
+
+from .redis_client import get_redis
+
+REMINDER_QUEUE_KEY = "habits:reminders:delayed"
+
+# Атомарно забирает до ARGV[2] элементов с весом не больше ARGV[1]
+POP_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+class ReminderDelayQueue:
+    """
+    Очередь напоминаний, упорядоченная по времени отправки.
+    """
+
+    def __init__(self, key=REMINDER_QUEUE_KEY, redis_client=None):
+        self.key = key
+        self._redis = redis_client
+
+    @property
+    def redis(self):
+        return self._redis or get_redis()
+
+    def push(self, habit_ids, fire_ts):
+        """
+        Добавление напоминаний в очередь.
+
+        :param habit_ids: Список ID привычек
+        :param fire_ts: Момент отправки (unix timestamp)
+        """
+        if habit_ids:
+            self.redis.zadd(
+                self.key,
+                {f"{fire_ts}:{habit_id}": fire_ts for habit_id in habit_ids},
+            )
+
+    def pop_due(self, now_ts, limit):
+        """
+        Атомарное извлечение наступивших напоминаний.
+        Один и тот же элемент не достанется двум параллельным опросчикам.
+
+        :param now_ts: Текущий момент (unix timestamp)
+        :param limit: Максимальное количество элементов
+        :return: Список пар (habit_id, fire_ts) в порядке времени отправки
+        """
+        pop_due = self.redis.register_script(POP_DUE_SCRIPT)
+        items = pop_due(keys=[self.key], args=[now_ts, limit])
+        entries = []
+        for item in items:
+            fire_ts, habit_id = item.decode().split(":")
+            entries.append((int(habit_id), int(fire_ts)))
+        return entries
+
+    def __len__(self):
+        return self.redis.zcard(self.key)
+
+
+reminder_queue = ReminderDelayQueue()
@@ -0,0 +1,139 @@
+"""
+ETag для привычек пользователя.
+
+ETag строится из количества привычек пользователя и max(updated_at):
+любое создание, изменение или удаление привычки меняет хотя бы одно из них.
+Оба значения считаются одним агрегатным запросом и кэшируются под ключом
+с версией пользователя. Любое изменение привычек пользователя увеличивает
+версию (см. signals.py), поэтому ответ 304 на If-None-Match не выполняет
+основной запрос и сериализатор, а статистика, посчитанная параллельным
+запросом до изменения, записывается под уже устаревшей версией.
+"""
+
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Habit
+
+HABIT_STATS_VERSION_KEY = "habits:user_stats:{user_id}:version"
+HABIT_STATS_KEY = "habits:user_stats:{user_id}:{version}"
+
+
+def _habit_stats(aggregate):
+    updated_at = aggregate["updated_at"]
+    return (
+        aggregate["count"],
+        int(updated_at.timestamp() * 1_000_000) if updated_at else 0,
+    )
+
+
+def _stats_version(user_id):
+    """
+    Текущая версия статистики пользователя.
+    Если ключ вытеснен из кэша, версия начинается с текущего времени,
+    чтобы не совпасть с версиями уже закэшированной статистики.
+    """
+    key = HABIT_STATS_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _astats_version(user_id):
+    key = HABIT_STATS_VERSION_KEY.format(user_id=user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def user_habit_stats(user_id):
+    """
+    Количество привычек пользователя и время последнего изменения.
+
+    :param user_id: ID пользователя
+    :return: Пара (count, max(updated_at) в микросекундах)
+    """
+    key = HABIT_STATS_KEY.format(user_id=user_id, version=_stats_version(user_id))
+    stats = cache.get(key)
+    if stats is None:
+        stats = _habit_stats(
+            Habit.objects.filter(user_id=user_id).aggregate(
+                count=Count("id"), updated_at=Max("updated_at")
+            )
+        )
+        cache.set(key, stats, settings.HABIT_ETAG_CACHE_TIMEOUT)
+    return stats
+
+
+async def auser_habit_stats(user_id):
+    """
+    Асинхронная версия user_habit_stats.
+    """
+    key = HABIT_STATS_KEY.format(
+        user_id=user_id, version=await _astats_version(user_id)
+    )
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = _habit_stats(
+            await Habit.objects.filter(user_id=user_id).aaggregate(
+                count=Count("id"), updated_at=Max("updated_at")
+            )
+        )
+        await cache.aset(key, stats, settings.HABIT_ETAG_CACHE_TIMEOUT)
+    return stats
+
+
+def _bump_stats_version(user_id):
+    try:
+        cache.incr(HABIT_STATS_VERSION_KEY.format(user_id=user_id))
+    except ValueError:
+        _stats_version(user_id)
+
+
+def invalidate_user_habit_stats(user_id):
+    """
+    Сброс статистики пользователя увеличением версии. Версия увеличивается
+    сразу и еще раз после коммита: статистика, посчитанная другим запросом
+    до коммита изменения, не будет прочитана.
+
+    :param user_id: ID пользователя
+    """
+    _bump_stats_version(user_id)
+    transaction.on_commit(partial(_bump_stats_version, user_id))
+
+
+def _habits_etag(request, stats):
+    count, updated_at = stats
+    source = f"{request.user.id}:{count}:{updated_at}:{request.get_full_path()}"
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def user_habits_etag(request, *args, **kwargs):
+    """
+    ETag ответа со списком или одной привычкой пользователя.
+    Путь с параметрами входит в ETag: разные страницы дают разные ответы.
+
+    :param request: Запрос
+    """
+    if not request.user.is_authenticated:
+        return None
+    return _habits_etag(request, user_habit_stats(request.user.id))
+
+
+async def auser_habits_etag(request):
+    """
+    Асинхронная версия user_habits_etag.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return _habits_etag(request, await auser_habit_stats(request.user.id))
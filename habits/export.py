@@ -0,0 +1,136 @@
+"""
+Потоковая выгрузка привычек в NDJSON и CSV.
+
+Строки читаются итератором по серверному курсору (на PostgreSQL) пачками
+по HABIT_EXPORT_CHUNK_SIZE и сразу отдаются клиенту через
+StreamingHttpResponse, поэтому расход памяти не зависит от количества
+строк, а первые байты уходят до окончания чтения. Под ASGI ответ строится
+из асинхронного итератора (aiterator), иначе Django сначала собрал бы
+синхронный итератор целиком. Поля и их формат те же, что у списков
+(см. fast_read.py), включая ?fields=.
+"""
+
+import csv
+
+import orjson
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class _LineBuffer:
+    """
+    Буфер для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _chunks(reader, queryset):
+    """
+    Строки в формате списка пачками по HABIT_EXPORT_CHUNK_SIZE.
+    """
+    chunk_size = settings.HABIT_EXPORT_CHUNK_SIZE
+    chunk = []
+    for row in reader.values(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield reader.to_representation(chunk)
+            chunk = []
+    if chunk:
+        yield reader.to_representation(chunk)
+
+
+async def _achunks(reader, queryset):
+    """
+    Асинхронная версия _chunks.
+    """
+    chunk_size = settings.HABIT_EXPORT_CHUNK_SIZE
+    chunk = []
+    async for row in reader.values(queryset).aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield reader.to_representation(chunk)
+            chunk = []
+    if chunk:
+        yield reader.to_representation(chunk)
+
+
+def _ndjson_lines(rows):
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+def _csv_lines(writer, names, rows):
+    return "".join(
+        writer.writerow([_csv_value(row[name]) for name in names]) for row in rows
+    ).encode()
+
+
+def iter_ndjson(reader, queryset):
+    for rows in _chunks(reader, queryset):
+        yield _ndjson_lines(rows)
+
+
+def iter_csv(reader, queryset):
+    writer = csv.writer(_LineBuffer())
+    names = [name for name, _, _ in reader.fields]
+    yield writer.writerow(names).encode()
+    for rows in _chunks(reader, queryset):
+        yield _csv_lines(writer, names, rows)
+
+
+async def aiter_ndjson(reader, queryset):
+    async for rows in _achunks(reader, queryset):
+        yield _ndjson_lines(rows)
+
+
+async def aiter_csv(reader, queryset):
+    writer = csv.writer(_LineBuffer())
+    names = [name for name, _, _ in reader.fields]
+    yield writer.writerow(names).encode()
+    async for rows in _achunks(reader, queryset):
+        yield _csv_lines(writer, names, rows)
+
+
+STREAMS = {
+    ("ndjson", False): iter_ndjson,
+    ("csv", False): iter_csv,
+    ("ndjson", True): aiter_ndjson,
+    ("csv", True): aiter_csv,
+}
+
+
+def export_response(reader, queryset, export_format, filename, asynchronous=False):
+    """
+    Потоковый ответ с выгрузкой.
+
+    :param reader: FastListReader с полями выгрузки
+    :param queryset: Привычки в порядке выгрузки
+    :param export_format: "ndjson" или "csv"
+    :param filename: Имя файла без расширения
+    :param asynchronous: Асинхронный итератор для ASGI: синхронный Django
+        под ASGI сначала читает целиком в потоке и только потом отдает
+    """
+    stream = STREAMS[export_format, asynchronous]
+    response = StreamingHttpResponse(
+        stream(reader, queryset), content_type=EXPORT_FORMATS[export_format]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    # nginx не должен буферизовать поток целиком
+    response["X-Accel-Buffering"] = "no"
+    return response
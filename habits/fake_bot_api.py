@@ -0,0 +1,173 @@
+"""
+Локальная замена Telegram Bot API для тестов и нагрузочных прогонов.
+
+Сервер принимает sendMessage, запоминает полученные сообщения и,
+как настоящий Bot API, отвечает 429 при превышении лимитов. Для нагрузочных
+прогонов можно добавить задержку ответа, случайные 429 и ошибки сервера.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов вида POST /bot<token>/<method>.
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or "{}")
+        else:
+            params = dict(parse_qsl(body))
+
+        method = self.path.rsplit("/", 1)[-1]
+        if method != "sendMessage":
+            self.respond(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+
+        status, payload = self.server.api.handle_send_message(params)
+        self.respond(status, payload)
+
+    def respond(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeBotAPI:
+    """
+    Фейковый Bot API в фоновом потоке.
+
+    :param global_limit: Максимум сообщений в секунду на бота (None — без лимита)
+    :param chat_interval: Минимальный интервал между сообщениями в один чат
+    :param latency: Задержка ответа в секундах
+    :param throttle_rate: Доля запросов, на которые отвечать 429 (0–1)
+    :param error_rate: Доля запросов, на которые отвечать 500 (0–1)
+    :param seed: Начальное значение генератора случайных чисел
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        global_limit=None,
+        chat_interval=None,
+        latency=0,
+        throttle_rate=0,
+        error_rate=0,
+        seed=None,
+    ):
+        self.global_limit = global_limit
+        self.chat_interval = chat_interval
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.messages = []
+        self.rejected = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self._last_by_chat = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), FakeBotAPIHandler)
+        self._server.api = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """
+        Значение для настройки TELEGRAM_API_BASE_URL.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-bot-api", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _limit_exceeded(self, chat_id, now):
+        while self._recent and now - self._recent[0] >= 1:
+            self._recent.popleft()
+        if self.global_limit is not None and len(self._recent) >= self.global_limit:
+            return True
+        last = self._last_by_chat.get(chat_id)
+        return (
+            self.chat_interval is not None
+            and last is not None
+            and now - last < self.chat_interval
+        )
+
+    def handle_send_message(self, params):
+        """
+        Обработка sendMessage.
+
+        :return: Пара (HTTP статус, тело ответа)
+        """
+        chat_id = int(params["chat_id"])
+        if self.latency:
+            time.sleep(self.latency)
+        now = time.monotonic()
+
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return 500, {
+                    "ok": False,
+                    "error_code": 500,
+                    "description": "Internal Server Error",
+                }
+            if roll < self.error_rate + self.throttle_rate or self._limit_exceeded(
+                chat_id, now
+            ):
+                self.rejected += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }
+            self._recent.append(now)
+            self._last_by_chat[chat_id] = now
+            self.messages.append(
+                {"chat_id": chat_id, "text": params.get("text"), "received_at": time.time()}
+            )
+            message_id = len(self.messages)
+
+        return 200, {
+            "ok": True,
+            "result": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text"),
+            },
+        }
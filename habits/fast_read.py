@@ -0,0 +1,106 @@
+"""
+Быстрое чтение списков привычек без ModelSerializer.
+
+Список читается через values() только с отдаваемыми полями, а строки
+преобразуются в словари по таблице полей. Формат значений повторяет поля
+DRF при настройках по умолчанию (ISO 8601 для времени и дат), поэтому
+вместе с FastJSONRenderer ответ совпадает байт в байт с ответом
+HabitSerializer / PublicHabitSerializer. Таблицы полей должны идти в том же
+порядке, что и Meta.fields сериализаторов (это проверяется в тестах).
+"""
+
+from django.utils import timezone
+
+
+def format_time(value):
+    return value.isoformat()
+
+
+def format_datetime(value):
+    """
+    Как serializers.DateTimeField: в текущей временной зоне, UTC как "Z".
+    """
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+class FastListReader:
+    """
+    Чтение строк списка через values() и их преобразование в словари.
+
+    :param fields: Тройки (поле ответа, поле values(), функция форматирования
+        или None)
+    :param extra: Поля values(), которые читаются, но не отдаются
+    """
+
+    def __init__(self, fields, extra=()):
+        self.fields = fields
+        self.names = [name for name, _, _ in fields]
+        self.lookups = [lookup for _, lookup, _ in fields]
+        self.extra = tuple(extra)
+
+    def select(self, names, extra=()):
+        """
+        Читатель только для части полей (?fields=). Поля пагинации по
+        (created_at, id) читаются всегда: по ним строится курсор.
+
+        :param names: Поля ответа, известные этому читателю
+        :param extra: Дополнительные поля курсора (например, rank поиска)
+        """
+        fields = tuple(field for field in self.fields if field[0] in names)
+        return FastListReader(fields, extra=("id", "created_at", *extra))
+
+    def values(self, queryset):
+        return queryset.values(*dict.fromkeys(self.lookups + list(self.extra)))
+
+    def to_representation(self, rows):
+        """
+        :param rows: Словари из values()
+        :return: Список словарей в формате сериализатора
+        """
+        fields = self.fields
+        return [
+            {
+                name: (
+                    convert(row[lookup])
+                    if convert is not None and row[lookup] is not None
+                    else row[lookup]
+                )
+                for name, lookup, convert in fields
+            }
+            for row in rows
+        ]
+
+
+habit_list_reader = FastListReader(
+    (
+        ("id", "id", None),
+        ("place", "place", None),
+        ("time", "time", format_time),
+        ("action", "action", None),
+        ("is_pleasant", "is_pleasant", None),
+        ("related_habit", "related_habit", None),
+        ("periodicity", "periodicity", None),
+        ("reward", "reward", None),
+        ("execution_time", "execution_time", None),
+        ("is_public", "is_public", None),
+        ("created_at", "created_at", format_datetime),
+        ("updated_at", "updated_at", format_datetime),
+    )
+)
+
+public_habit_list_reader = FastListReader(
+    (
+        ("id", "id", None),
+        ("user_email", "user__email", None),
+        ("place", "place", None),
+        ("time", "time", format_time),
+        ("action", "action", None),
+        ("is_pleasant", "is_pleasant", None),
+        ("periodicity", "periodicity", None),
+        ("execution_time", "execution_time", None),
+        ("created_at", "created_at", format_datetime),
+    )
+)
@@ -0,0 +1,171 @@
+"""
+Кэш первых страниц ленты публичных привычек.
+
+Сериализованные страницы хранятся в кэше Django (Redis) под ключом,
+включающим номер поколения. Любое изменение публичной привычки увеличивает
+поколение (см. signals.py), после чего старые страницы больше не читаются
+и истекают сами. Одновременные промахи по одной странице объединяются:
+страницу строит только один запрос, остальные ждут готовый результат.
+Функции чтения есть в синхронной и асинхронной версии: под ASGI лента
+обслуживается асинхронным обработчиком (см. async_views.py).
+"""
+
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_GENERATION_KEY = "habits:public_feed:generation"
+FEED_PAGE_KEY = "habits:public_feed:{generation}:{digest}"
+FEED_LOCK_KEY = "{key}:lock"
+
+# Параметры запроса, от которых зависит содержимое страницы
+PAGE_PARAMS = ("page", "page_size", "pagination", "cursor", "fields")
+
+
+def get_feed_generation():
+    """
+    Текущее поколение ленты.
+    Если ключ вытеснен из кэша, поколение начинается с текущего времени,
+    чтобы не совпасть с номерами уже закэшированных страниц.
+    """
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        cache.add(FEED_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def bump_feed_generation():
+    """
+    Сброс закэшированных страниц ленты.
+    """
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        get_feed_generation()
+
+
+async def aget_feed_generation():
+    """
+    Асинхронная версия get_feed_generation.
+    """
+    generation = await cache.aget(FEED_GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(FEED_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = await cache.aget(FEED_GENERATION_KEY)
+    return generation
+
+
+def _page_digest(request):
+    """
+    Хэш параметров страницы или None, если страница не кэшируется.
+    Кэшируются только первые HABIT_PUBLIC_FEED_CACHED_PAGES страниц
+    и первая страница курсорной пагинации.
+    """
+    params = request.query_params
+    if set(params) - set(PAGE_PARAMS) or "cursor" in params:
+        return None
+    try:
+        page = int(params.get("page", 1))
+    except ValueError:
+        return None
+    if page > settings.HABIT_PUBLIC_FEED_CACHED_PAGES:
+        return None
+
+    # Ссылки next/previous абсолютные, поэтому хост входит в ключ
+    source = "|".join(
+        [request.get_host()]
+        + [f"{name}={params.get(name, '')}" for name in PAGE_PARAMS]
+    )
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def feed_page_key(request):
+    """
+    Ключ кэша для страницы ленты или None, если страница не кэшируется.
+
+    :param request: Запрос DRF
+    """
+    digest = _page_digest(request)
+    if digest is None:
+        return None
+    return FEED_PAGE_KEY.format(generation=get_feed_generation(), digest=digest)
+
+
+async def afeed_page_key(request):
+    """
+    Асинхронная версия feed_page_key.
+    """
+    digest = _page_digest(request)
+    if digest is None:
+        return None
+    generation = await aget_feed_generation()
+    return FEED_PAGE_KEY.format(generation=generation, digest=digest)
+
+
+def get_or_build_page(key, build):
+    """
+    Получение страницы из кэша или построение с объединением промахов.
+
+    :param key: Ключ из feed_page_key
+    :param build: Функция, возвращающая данные страницы
+    :return: Данные страницы
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_timeout = settings.HABIT_PUBLIC_FEED_LOCK_TIMEOUT
+    lock_key = FEED_LOCK_KEY.format(key=key)
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            data = build()
+            cache.set(key, data, settings.HABIT_PUBLIC_FEED_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data
+
+    # Страницу уже строит другой запрос: ждем его результат
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        data = cache.get(key)
+        if data is not None:
+            return data
+    return build()
+
+
+async def aget_or_build_page(key, build):
+    """
+    Асинхронная версия get_or_build_page: ожидание страницы, которую строит
+    другой запрос, не занимает поток.
+
+    :param key: Ключ из afeed_page_key
+    :param build: Корутинная функция, возвращающая данные страницы
+    :return: Данные страницы
+    """
+    data = await cache.aget(key)
+    if data is not None:
+        return data
+
+    lock_timeout = settings.HABIT_PUBLIC_FEED_LOCK_TIMEOUT
+    lock_key = FEED_LOCK_KEY.format(key=key)
+    if await cache.aadd(lock_key, 1, lock_timeout):
+        try:
+            data = await build()
+            await cache.aset(key, data, settings.HABIT_PUBLIC_FEED_CACHE_TIMEOUT)
+        finally:
+            await cache.adelete(lock_key)
+        return data
+
+    # Страницу уже строит другой запрос: ждем его результат
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        data = await cache.aget(key)
+        if data is not None:
+            return data
+    return await build()
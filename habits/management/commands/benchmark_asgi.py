@@ -0,0 +1,223 @@
+"""
+Сравнение пропускной способности API под WSGI и ASGI.
+
+Команда создает пользователя с токеном и публичными привычками, затем по
+очереди запускает gunicorn с синхронными воркерами (config.wsgi) и с
+воркерами uvicorn (config.asgi) и держит --concurrency одновременных
+соединений к горячим endpoint'ам чтения, пока не выполнит --requests
+запросов. Для обоих режимов выводятся запросы в секунду, перцентили
+задержки и количество ошибок. Под WSGI view синхронные (ASYNC_VIEWS
+выключен), то есть режим WSGI — исходная база для сравнения. Созданные
+данные в конце удаляются.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import time as dt_time
+
+import httpx
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from habits.management.commands.benchmark_reminders import (
+    BENCHMARK_EMAIL_DOMAIN, percentile)
+from habits.models import Habit
+
+User = get_user_model()
+
+BENCHMARK_USERNAME = "benchmark_asgi"
+
+# Горячие endpoint'ы чтения, запросы идут к ним по кругу
+BENCHMARK_PATHS = (
+    "/api/habits/my-habits/",
+    "/api/habits/public/",
+    "/api/users/profile/",
+)
+
+# Режим: (приложение, класс воркера gunicorn)
+SERVERS = {
+    "WSGI": ("config.wsgi:application", "sync"),
+    "ASGI": ("config.asgi:application", "uvicorn_worker.UvicornWorker"),
+}
+
+
+def seed_asgi_benchmark(count):
+    """
+    Пользователь с токеном и count публичными привычками.
+
+    :return: Ключ токена
+    """
+    user = User.objects.create(
+        username=BENCHMARK_USERNAME,
+        email=f"{BENCHMARK_USERNAME}@{BENCHMARK_EMAIL_DOMAIN}",
+        password=make_password(None),
+    )
+    Habit.objects.bulk_create(
+        [
+            Habit(
+                user=user,
+                place="Бенчмарк",
+                time=dt_time(8, i % 60),
+                fire_minute=8 * 60 + i % 60,
+                action=f"Привычка {i}",
+                execution_time=60,
+                is_public=True,
+            )
+            for i in range(count)
+        ]
+    )
+    return Token.objects.create(user=user).key
+
+
+async def run_load(client, paths, requests, concurrency):
+    """
+    Запросы к paths по кругу из concurrency одновременных соединений.
+
+    :param client: httpx.AsyncClient с адресом сервера и токеном
+    :param paths: Пути запросов
+    :param requests: Всего запросов
+    :param concurrency: Одновременных запросов
+    :return: Тройка (задержки в секундах, количество ошибок, длительность)
+    """
+    latencies = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def connection():
+        nonlocal errors
+        for number in numbers:
+            started = time.perf_counter()
+            try:
+                response = await client.get(paths[number % len(paths)])
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = "Сравнение пропускной способности gunicorn под WSGI и ASGI (uvicorn)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=50, help="Одновременных соединений"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Запросов на каждый режим"
+        )
+        parser.add_argument("--workers", type=int, default=3, help="Воркеров gunicorn")
+        parser.add_argument(
+            "--habits", type=int, default=100, help="Публичных привычек"
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30, help="Таймаут запроса, сек"
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять созданные данные"
+        )
+
+    def handle(self, *args, **options):
+        if min(options["concurrency"], options["requests"], options["workers"]) < 1:
+            raise CommandError(
+                "--concurrency, --requests и --workers должны быть больше нуля"
+            )
+
+        User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        token = seed_asgi_benchmark(options["habits"])
+        try:
+            results = {
+                name: self.measure(app, worker_class, token, options)
+                for name, (app, worker_class) in SERVERS.items()
+            }
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        self.report(results)
+
+    def measure(self, app, worker_class, token, options):
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                app,
+                "--workers",
+                str(options["workers"]),
+                "--worker-class",
+                worker_class,
+                "--bind",
+                f"127.0.0.1:{port}",
+                "--log-level",
+                "warning",
+            ],
+            env={**os.environ, "QUERY_COUNT_HEADER": "False"},
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        headers = {"Authorization": f"Token {token}"}
+        try:
+            self.wait_for_server(server, base_url, headers)
+            return asyncio.run(self.load(base_url, headers, options))
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for_server(self, server, base_url, headers, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("gunicorn завершился при запуске")
+            try:
+                httpx.get(base_url + BENCHMARK_PATHS[-1], headers=headers)
+                return
+            except httpx.TransportError:
+                time.sleep(0.2)
+        raise CommandError("gunicorn не запустился")
+
+    async def load(self, base_url, headers, options):
+        concurrency = options["concurrency"]
+        limits = httpx.Limits(
+            max_connections=concurrency, max_keepalive_connections=concurrency
+        )
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            limits=limits,
+            timeout=options["timeout"],
+        ) as client:
+            # Прогрев: соединения с базой в воркерах и кэш ленты
+            await run_load(client, BENCHMARK_PATHS, concurrency, concurrency)
+            return await run_load(
+                client, BENCHMARK_PATHS, options["requests"], concurrency
+            )
+
+    def report(self, results):
+        throughput = {}
+        for name, (latencies, errors, duration) in results.items():
+            throughput[name] = len(latencies) / duration
+            p50, p95, p99 = (percentile(latencies, pct) * 1000 for pct in (50, 95, 99))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: {throughput[name]:.0f} запросов/с, "
+                    f"p50 {p50:.1f} мс, p95 {p95:.1f} мс, p99 {p99:.1f} мс, "
+                    f"ошибок {errors}"
+                )
+            )
+        self.stdout.write(f"ASGI / WSGI: {throughput['ASGI'] / throughput['WSGI']:.2f}")
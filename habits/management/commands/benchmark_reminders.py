@@ -0,0 +1,234 @@
+"""
+Сквозной нагрузочный прогон отправки напоминаний.
+
+Команда создает N привычек, запускает настоящий Celery worker против
+локального Redis и фейкового Bot API и сама играет роль Celery beat:
+ставит задачи планирования на ближайшую минуту, а затем периодически
+запускает dispatch_due_reminders и drain_reminder_outbox. В конце выводится
+пропускная способность и задержка между плановым и фактическим временем
+отправки.
+"""
+
+import math
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from config.celery import app
+from habits.fake_bot_api import FakeBotAPI
+from habits.models import Habit, ReminderDelivery
+from habits.scheduling import minute_of_day, next_fire_at
+from habits.tasks import (dispatch_due_reminders, drain_reminder_outbox,
+                          enqueue_reminder_shards)
+
+User = get_user_model()
+
+BENCHMARK_EMAIL_DOMAIN = "benchmark.local"
+BENCHMARK_CHAT_ID_BASE = 9_000_000_000_000
+
+
+def percentile(values, pct):
+    """
+    Перцентиль по методу ближайшего ранга.
+
+    :param values: Непустой список чисел
+    :param pct: Перцентиль (0–100)
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def benchmark_users():
+    return User.objects.filter(email__endswith=f"@{BENCHMARK_EMAIL_DOMAIN}")
+
+
+def seed_benchmark_habits(count, fire_at):
+    """
+    Создание пользователей с Telegram и по одной привычке на каждого.
+
+    :param count: Количество привычек
+    :param fire_at: Время напоминания
+    :return: Список ID созданных привычек
+    """
+    password = make_password(None)
+    users = User.objects.bulk_create(
+        [
+            User(
+                username=f"benchmark{i}",
+                email=f"benchmark{i}@{BENCHMARK_EMAIL_DOMAIN}",
+                password=password,
+                telegram_chat_id=BENCHMARK_CHAT_ID_BASE + i,
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    # bulk_create не вызывает save(), поэтому fire_minute задается явно
+    habits = Habit.objects.bulk_create(
+        [
+            Habit(
+                user=user,
+                place="Бенчмарк",
+                time=fire_at.time(),
+                fire_minute=minute_of_day(fire_at),
+                action=f"Бенчмарк {i}",
+                execution_time=60,
+                periodicity=1,
+            )
+            for i, user in enumerate(users)
+        ],
+        batch_size=1000,
+    )
+    return [habit.id for habit in habits]
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный прогон отправки напоминаний через Celery и фейковый Bot API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--habits", type=int, default=1000, help="Количество привычек"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Процессов Celery worker"
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Задержка Bot API, сек"
+        )
+        parser.add_argument(
+            "--throttle-rate", type=float, default=0, help="Доля ответов 429"
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0, help="Доля ответов 500"
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument(
+            "--timeout", type=float, default=300, help="Максимальное время прогона"
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять созданные данные"
+        )
+
+    def handle(self, *args, **options):
+        count = options["habits"]
+        if count < 1:
+            raise CommandError("--habits должно быть больше нуля")
+
+        benchmark_users().delete()
+        habit_ids = seed_benchmark_habits(count, timezone.localtime())
+        self.stdout.write(f"Создано привычек: {count}")
+
+        api = FakeBotAPI(
+            latency=options["latency"],
+            throttle_rate=options["throttle_rate"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        with api:
+            worker = self.start_worker(api.base_url, options["concurrency"])
+            try:
+                self.wait_for_worker()
+                fire_at = next_fire_at(
+                    timezone.localtime(), settings.HABIT_REMINDER_LOOKAHEAD_MINUTES
+                )
+                Habit.objects.filter(id__in=habit_ids).update(
+                    time=fire_at.time(), fire_minute=minute_of_day(fire_at)
+                )
+                fire_ts = int(fire_at.timestamp())
+                self.stdout.write(f"Напоминания запланированы на {fire_at}")
+                self.run_pipeline(habit_ids, fire_at, options["timeout"])
+            finally:
+                worker.terminate()
+                worker.wait()
+
+        if not options["keep"]:
+            benchmark_users().delete()
+        self.report(api, count, fire_ts)
+
+    def start_worker(self, base_url, concurrency):
+        env = {
+            **os.environ,
+            "TELEGRAM_API_BASE_URL": base_url,
+            "TELEGRAM_BOT_TOKEN": settings.TELEGRAM_BOT_TOKEN or "benchmark",
+        }
+        return subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "celery",
+                "-A",
+                "config",
+                "worker",
+                "--concurrency",
+                str(concurrency),
+                "--loglevel",
+                "warning",
+            ],
+            env=env,
+        )
+
+    def wait_for_worker(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if app.control.ping(timeout=1):
+                return
+        raise CommandError("Celery worker не запустился")
+
+    def run_pipeline(self, habit_ids, fire_at, timeout):
+        """
+        Запуск задач вместо Celery beat до доставки всех напоминаний.
+        """
+        enqueue_reminder_shards(int(fire_at.timestamp()))
+
+        deliveries = ReminderDelivery.objects.filter(
+            habit_id__in=habit_ids, fire_at=fire_at
+        )
+        poll_interval = settings.CELERY_BEAT_SCHEDULE["dispatch-due-reminders"][
+            "schedule"
+        ]
+        drain_interval = settings.CELERY_BEAT_SCHEDULE["drain-reminder-outbox"][
+            "schedule"
+        ]
+        deadline = time.monotonic() + timeout
+        next_drain = time.monotonic() + drain_interval
+        while time.monotonic() < deadline:
+            dispatch_due_reminders.delay()
+            if time.monotonic() >= next_drain:
+                drain_reminder_outbox.delay()
+                next_drain += drain_interval
+            time.sleep(poll_interval)
+
+            if (
+                deliveries.count() == len(habit_ids)
+                and not deliveries.filter(
+                    status=ReminderDelivery.STATUS_PENDING
+                ).exists()
+            ):
+                return
+        self.stderr.write(self.style.WARNING("Прогон остановлен по таймауту"))
+
+    def report(self, api, count, fire_ts):
+        lags = [message["received_at"] - fire_ts for message in api.messages]
+        self.stdout.write(f"Доставлено: {len(lags)} из {count}")
+        self.stdout.write(f"Ответов 429: {api.rejected}, ответов 500: {api.errors}")
+        if not lags:
+            return
+
+        received = [message["received_at"] for message in api.messages]
+        duration = max(received) - min(received)
+        rate = len(lags) / duration if duration else float(len(lags))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Отправок в секунду: {rate:.1f}\n"
+                f"Задержка p50: {percentile(lags, 50):.3f} с, "
+                f"p99: {percentile(lags, 99):.3f} с, "
+                f"max: {max(lags):.3f} с"
+            )
+        )
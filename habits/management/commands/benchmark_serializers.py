@@ -0,0 +1,127 @@
+"""
+Сравнение CPU-времени сериализации списков привычек.
+
+Команда создает привычки во временной транзакции (в конце она
+откатывается), один раз читает страницу из базы и многократно
+преобразует ее в JSON двумя способами: ModelSerializer + JSONRenderer
+и values() + FastJSONRenderer (см. fast_read.py). Выводится CPU-время
+на 100 строк для обоих способов и проверяется совпадение ответов.
+"""
+
+import time
+from datetime import time as dt_time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from habits.fast_read import habit_list_reader, public_habit_list_reader
+from habits.models import Habit
+from habits.renderers import FastJSONRenderer
+from habits.serializers import HabitSerializer, PublicHabitSerializer
+
+User = get_user_model()
+
+
+def cpu_time_per_100(func, rows, repeat):
+    """
+    Среднее CPU-время вызова func на 100 строк, мс.
+    """
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 100 / rows * 1000
+
+
+def seed_serializer_habits(count):
+    """
+    Пользователь и count публичных привычек для замера.
+    """
+    user = User.objects.create(
+        username="benchmark_serializers",
+        email="benchmark_serializers@benchmark.local",
+        password=make_password(None),
+    )
+    pleasant = Habit.objects.create(
+        user=user,
+        place="Дом",
+        time=dt_time(7, 0),
+        action="Приятная привычка",
+        is_pleasant=True,
+        execution_time=30,
+    )
+    Habit.objects.bulk_create(
+        [
+            Habit(
+                user=user,
+                place="Бенчмарк",
+                time=dt_time(8, i % 60),
+                fire_minute=8 * 60 + i % 60,
+                action=f"Привычка {i}",
+                related_habit=pleasant if i % 2 else None,
+                reward=None if i % 2 else "Кофе",
+                periodicity=i % 7 + 1,
+                execution_time=60,
+                is_public=True,
+            )
+            for i in range(count - 1)
+        ]
+    )
+    return user
+
+
+class Command(BaseCommand):
+    help = "Сравнение CPU-времени ModelSerializer и быстрого чтения списков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100, help="Строк на странице")
+        parser.add_argument("--repeat", type=int, default=200, help="Повторов замера")
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        if rows < 2 or repeat < 1:
+            raise CommandError("--rows должно быть не меньше 2, --repeat больше нуля")
+
+        with transaction.atomic():
+            user = seed_serializer_habits(rows)
+            habits = Habit.objects.filter(user=user)
+            self.compare(
+                "HabitSerializer",
+                HabitSerializer,
+                habit_list_reader,
+                habits,
+                repeat,
+            )
+            self.compare(
+                "PublicHabitSerializer",
+                PublicHabitSerializer,
+                public_habit_list_reader,
+                habits.select_related("user"),
+                repeat,
+            )
+            transaction.set_rollback(True)
+
+    def compare(self, name, serializer_class, reader, queryset, repeat):
+        instances = list(queryset)
+        values = list(reader.values(queryset))
+
+        def old_path():
+            data = serializer_class(instances, many=True).data
+            return JSONRenderer().render(data)
+
+        def new_path():
+            return FastJSONRenderer().render(reader.to_representation(values))
+
+        if old_path() != new_path():
+            raise CommandError(f"{name}: ответы не совпадают")
+
+        old = cpu_time_per_100(old_path, len(instances), repeat)
+        new = cpu_time_per_100(new_path, len(instances), repeat)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: ModelSerializer {old:.2f} мс, быстрый путь {new:.2f} мс "
+                f"на 100 строк (в {old / new:.1f} раза быстрее)"
+            )
+        )
@@ -0,0 +1,163 @@
+"""
+Метрики отправки напоминаний в формате Prometheus.
+
+Воркеры Celery записывают значения в Redis, поэтому метрики всех процессов
+суммируются в одном месте, а веб-приложение отдает их по /metrics/.
+Ошибка записи метрики никогда не прерывает отправку напоминаний.
+"""
+
+import logging
+
+from redis.exceptions import RedisError
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+METRIC_KEY = "habits:metrics:{name}"
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин.
+    В Redis хранится хэш: количество значений в каждой корзине, sum и count.
+    """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.key = METRIC_KEY.format(name=name)
+
+    def observe_many(self, values, redis_client=None):
+        """
+        Добавление значений в гистограмму одним запросом к Redis.
+
+        :param values: Список значений
+        :param redis_client: Клиент Redis
+        """
+        if not values:
+            return
+        counts = {}
+        for value in values:
+            bucket = next(bound for bound in self.buckets if value <= bound)
+            counts[bucket] = counts.get(bucket, 0) + 1
+
+        pipe = (redis_client or get_redis()).pipeline(transaction=False)
+        for bucket, count in counts.items():
+            pipe.hincrby(self.key, _format_value(bucket), count)
+        pipe.hincrbyfloat(self.key, "sum", sum(values))
+        pipe.hincrby(self.key, "count", len(values))
+        try:
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось записать метрику {self.name}: {e}")
+
+    def observe(self, value, redis_client=None):
+        self.observe_many([value], redis_client)
+
+    def render(self, data):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        cumulative = 0
+        for bucket in self.buckets:
+            le = _format_value(bucket)
+            cumulative += int(data.get(le.encode(), 0))
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {float(data.get(b'sum', 0))}")
+        lines.append(f"{self.name}_count {int(data.get(b'count', 0))}")
+        return lines
+
+
+class Counter:
+    """
+    Счетчик с одной меткой. В Redis хранится хэш {значение метки: счетчик}.
+    """
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.key = METRIC_KEY.format(name=name)
+
+    def inc_many(self, label_values, redis_client=None):
+        """
+        Увеличение счетчиков для списка значений метки.
+
+        :param label_values: Значения метки, по одному на событие
+        :param redis_client: Клиент Redis
+        """
+        counts = {}
+        for value in label_values:
+            counts[value] = counts.get(value, 0) + 1
+        if not counts:
+            return
+
+        pipe = (redis_client or get_redis()).pipeline(transaction=False)
+        for value, count in counts.items():
+            pipe.hincrby(self.key, value, count)
+        try:
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось записать метрику {self.name}: {e}")
+
+    def render(self, data):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for value, count in sorted(data.items()):
+            lines.append(f'{self.name}{{{self.label}="{value.decode()}"}} {int(count)}')
+        return lines
+
+
+REMINDER_LAG = Histogram(
+    "habit_reminder_lag_seconds",
+    "Задержка фактической отправки напоминания относительно плановой",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600),
+)
+TELEGRAM_REQUEST_DURATION = Histogram(
+    "habit_telegram_request_seconds",
+    "Длительность запроса sendMessage к Telegram Bot API",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REMINDER_BATCH_SIZE = Histogram(
+    "habit_reminder_batch_size",
+    "Количество доставок в одной пачке отправки",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+REMINDER_OUTCOMES = Counter(
+    "habit_reminders_total",
+    "Напоминания по результату отправки",
+    label="outcome",
+)
+
+METRICS = [
+    REMINDER_LAG,
+    TELEGRAM_REQUEST_DURATION,
+    REMINDER_BATCH_SIZE,
+    REMINDER_OUTCOMES,
+]
+
+
+def render_metrics(redis_client=None):
+    """
+    Все метрики в текстовом формате Prometheus.
+
+    :param redis_client: Клиент Redis
+    :return: Текст для ответа на запрос Prometheus
+    """
+    pipe = (redis_client or get_redis()).pipeline(transaction=False)
+    for metric in METRICS:
+        pipe.hgetall(metric.key)
+
+    lines = []
+    for metric, data in zip(METRICS, pipe.execute()):
+        lines.extend(metric.render(data))
+    return "\n".join(lines) + "\n"
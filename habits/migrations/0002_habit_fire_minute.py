@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Колонка с постоянным значением по умолчанию добавляется без перезаписи
+    # habits_habit (PostgreSQL 11+), блокировка держится мгновение.
+    # Значения и индекс заполняются в 0003, вне транзакции.
+
+    dependencies = [
+        ("habits", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="fire_minute",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                editable=False,
+                help_text="Минута суток (0–1439), в которую отправляется напоминание",
+                verbose_name="Минута напоминания",
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:17
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+BATCH_SIZE = 10000
+
+
+def fill_fire_minute(apps, schema_editor):
+    """
+    Заполнение fire_minute пачками по id: каждая пачка фиксируется
+    отдельно и блокирует только свои строки.
+    """
+    Habit = apps.get_model("habits", "Habit")
+    habits = Habit.objects.order_by("id")
+    last_id = 0
+    while True:
+        ids = list(
+            habits.filter(id__gt=last_id).values_list("id", flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            return
+        habits.filter(id__gt=last_id, id__lte=ids[-1]).update(
+            fire_minute=ExtractHour("time") * 60 + ExtractMinute("time")
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Заполнение пачками и CREATE INDEX CONCURRENTLY не блокируют запись
+    # в habits_habit, но не выполняются в одной транзакции
+    atomic = False
+
+    dependencies = [
+        ("habits", "0002_habit_fire_minute"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_fire_minute, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(fields=["fire_minute"], name="habit_fire_minute_idx"),
+        ),
+    ]
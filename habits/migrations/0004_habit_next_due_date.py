@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:24
+
+import django.utils.timezone
+from django.conf import settings
+from django.contrib.postgres.operations import (AddIndexConcurrently,
+                                                RemoveIndexConcurrently)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Колонка с постоянным значением по умолчанию добавляется без перезаписи
+    # таблицы. CREATE/DROP INDEX CONCURRENTLY не блокируют запись в
+    # habits_habit, но не выполняются в транзакции. Новый индекс создается
+    # до удаления индекса fire_minute.
+    atomic = False
+
+    dependencies = [
+        ("habits", "0003_habit_fire_minute_backfill"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="next_due_date",
+            field=models.DateField(
+                default=django.utils.timezone.localdate,
+                editable=False,
+                help_text="Ближайшая дата, когда привычку нужно выполнить с учетом периодичности",
+                verbose_name="Дата следующего напоминания",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(
+                fields=["fire_minute", "next_due_date"], name="habit_due_reminder_idx"
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="habit",
+            name="habit_fire_minute_idx",
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 20:11
+
+from django.conf import settings
+from django.contrib.postgres.operations import (AddIndexConcurrently,
+                                                RemoveIndexConcurrently)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY не блокируют запись в habits_habit,
+    # но не выполняются в транзакции. Новый индекс создается до удаления
+    # старого, чтобы планировщику всегда было по чему искать.
+    atomic = False
+
+    dependencies = [
+        ("habits", "0004_habit_next_due_date"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(
+                fields=["fire_minute", "next_due_date", "user"],
+                name="habit_due_reminder_user_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="habit",
+            name="habit_due_reminder_idx",
+        ),
+    ]
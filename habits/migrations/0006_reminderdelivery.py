@@ -0,0 +1,103 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_habit_due_reminder_user_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderDelivery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chat_id", models.BigIntegerField(verbose_name="Telegram Chat ID")),
+                (
+                    "version",
+                    models.CharField(
+                        help_text="Версия привычки, по которой берется текст из кэша",
+                        max_length=64,
+                        verbose_name="Версия текста",
+                    ),
+                ),
+                ("fire_at", models.DateTimeField(verbose_name="Время напоминания")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("sent", "Отправлено"),
+                            ("dead", "Не доставлено"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Количество попыток"
+                    ),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(verbose_name="Следующая попытка"),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Последняя ошибка"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Отправлено"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Доставка напоминания",
+                "verbose_name_plural": "Доставки напоминаний",
+                "ordering": ["-fire_at"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["next_attempt_at"],
+                        name="delivery_pending_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("habit", "fire_at"), name="unique_delivery_per_fire_at"
+                    )
+                ],
+            },
+        ),
+    ]
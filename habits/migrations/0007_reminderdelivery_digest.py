@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_reminderdelivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reminderdelivery",
+            name="digest",
+            field=models.BooleanField(
+                default=False,
+                help_text="Отправляется одним сообщением с другими напоминаниями чата",
+                verbose_name="В сводке",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminderdelivery",
+            index=models.Index(
+                condition=models.Q(("digest", True), ("status", "pending")),
+                fields=["chat_id", "fire_at"],
+                name="delivery_digest_idx",
+            ),
+        ),
+    ]
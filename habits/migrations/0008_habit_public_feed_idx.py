@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:42
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не блокирует запись в habits_habit,
+    # но не выполняется в транзакции
+    atomic = False
+
+    dependencies = [
+        ("habits", "0007_reminderdelivery_digest"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("is_public", True)),
+                fields=["-created_at", "-id"],
+                name="habit_public_feed_idx",
+            ),
+        ),
+    ]
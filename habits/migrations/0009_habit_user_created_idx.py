@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется в транзакции
+    atomic = False
+
+    dependencies = [
+        ("habits", "0008_habit_public_feed_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Составной индекс создается до удаления индекса FK. DROP INDEX
+        # берет блокировку таблицы, но не читает ее и выполняется сразу.
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(
+                fields=["user", "-created_at"], name="habit_user_created_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="habits",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+    ]
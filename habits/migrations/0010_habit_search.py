@@ -0,0 +1,66 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:14
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import (AddIndexConcurrently,
+                                                TrigramExtension)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Хранимый GeneratedField добавляется с перезаписью habits_habit под
+    # ACCESS EXCLUSIVE: чтение и запись в таблицу ждут до конца AddField.
+    # На большой таблице миграцию нужно выполнять в окно обслуживания
+    # (см. README). GIN индексы затем строятся без блокировки записи.
+    atomic = False
+
+    dependencies = [
+        ("habits", "0009_habit_user_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="habit",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.SearchVector(
+                        "action", config="russian", weight="A"
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector(
+                        "place", config="russian", weight="B"
+                    ),
+                    django.contrib.postgres.search.SearchConfig("russian"),
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+                verbose_name="Поисковый вектор",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="habit_search_vector_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["action"],
+                name="habit_action_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["place"],
+                name="habit_place_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+import habits.models
+
+
+class Migration(migrations.Migration):
+    # Индекс habits_habit строится CONCURRENTLY, вне транзакции. Таблица
+    # habits_habittombstone создается пустой, ее индекс обычный.
+    atomic = False
+
+    dependencies = [
+        ("habits", "0010_habit_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HabitTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("habit_id", models.BigIntegerField(verbose_name="ID привычки")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Дата удаления"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Удаленная привычка",
+                "verbose_name_plural": "Удаленные привычки",
+            },
+        ),
+        AddIndexConcurrently(
+            model_name="habit",
+            index=models.Index(
+                fields=["user", "updated_at"], name="habit_user_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="habittombstone",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="habit_tombstones",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="related_habit",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Привычка, которая связана с другой привычкой",
+                null=True,
+                on_delete=habits.models.set_null_and_touch,
+                related_name="linked_habits",
+                to="habits.habit",
+                verbose_name="Связанная привычка",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="habittombstone",
+            index=models.Index(
+                fields=["user", "deleted_at"], name="tombstone_user_deleted_idx"
+            ),
+        ),
+    ]
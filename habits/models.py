@@ -1,10 +1,42 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.utils import timezone
 
-from .validators import (validate_execution_time, validate_periodicity,
-                         validate_pleasant_habit,
-                         validate_related_habit_is_pleasant,
-                         validate_reward_and_related_habit)
+from .scheduling import minute_of_day
+from .validators import (
+    validate_execution_time,
+    validate_periodicity,
+    validate_pleasant_habit,
+    validate_related_habit_is_pleasant,
+    validate_reward_and_related_habit,
+)
+
+# Конфигурация полнотекстового поиска: общая для колонки и запросов
+HABIT_SEARCH_CONFIG = "russian"
+
+# Поля расписания: при их изменении next_due_date рассчитывается заново
+HABIT_SCHEDULE_FIELDS = ("time", "periodicity")
+
+
+def set_null_and_touch(collector, field, sub_objs, using):
+    """
+    SET_NULL, который обновляет и updated_at связанных привычек: иначе
+    дельта-синхронизация (sync.py) не узнает, что связь была снята.
+    Оба обновления выбирают строки по связи, поэтому updated_at
+    обновляется раньше: обновления полей выполняются в порядке добавления,
+    а одно время на все удаление объединяет их в один UPDATE.
+    """
+    if not hasattr(collector, "touched_at"):
+        collector.touched_at = timezone.now()
+    collector.add_field_update(
+        field.model._meta.get_field("updated_at"), collector.touched_at, sub_objs
+    )
+    models.SET_NULL(collector, field, sub_objs, using)
+
+
+set_null_and_touch.lazy_sub_objs = True
 
 
 class Habit(models.Model):
@@ -15,6 +47,7 @@ class Habit(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name="habits",
         verbose_name="Пользователь",
     )
@@ -38,7 +71,7 @@ class Habit(models.Model):
     )
     related_habit = models.ForeignKey(
         "self",
-        on_delete=models.SET_NULL,
+        on_delete=set_null_and_touch,
         null=True,
         blank=True,
         related_name="linked_habits",
@@ -68,17 +101,119 @@ class Habit(models.Model):
         verbose_name="Признак публичности",
         help_text="Можно ли публиковать привычку в общий доступ",
     )
+    fire_minute = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Минута напоминания",
+        help_text="Минута суток (0–1439), в которую отправляется напоминание",
+    )
+    next_due_date = models.DateField(
+        default=timezone.localdate,
+        editable=False,
+        verbose_name="Дата следующего напоминания",
+        help_text="Ближайшая дата, когда привычку нужно выполнить с учетом периодичности",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    # Вычисляется базой при любой записи, включая bulk_create/bulk_update
+    search_vector = models.GeneratedField(
+        expression=SearchVector("action", weight="A", config=HABIT_SEARCH_CONFIG)
+        + SearchVector("place", weight="B", config=HABIT_SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый вектор",
+    )
 
     class Meta:
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
         ordering = ["-created_at"]
+        indexes = [
+            # Список привычек пользователя; заменяет отдельный индекс FK user_id
+            models.Index(fields=["user", "-created_at"], name="habit_user_created_idx"),
+            # Синхронизация: изменения пользователя после токена (см. sync.py)
+            models.Index(fields=["user", "updated_at"], name="habit_user_updated_idx"),
+            # Планировщик напоминаний; user_id — граница шарда (см. tasks.py)
+            models.Index(
+                fields=["fire_minute", "next_due_date", "user"],
+                name="habit_due_reminder_user_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(is_public=True),
+                name="habit_public_feed_idx",
+            ),
+            # Поиск (см. search.py): полнотекстовый и нечеткий по pg_trgm
+            GinIndex(fields=["search_vector"], name="habit_search_vector_idx"),
+            GinIndex(
+                fields=["action"],
+                opclasses=["gin_trgm_ops"],
+                name="habit_action_trgm_idx",
+            ),
+            GinIndex(
+                fields=["place"],
+                opclasses=["gin_trgm_ops"],
+                name="habit_place_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.action} в {self.time} в {self.place}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный признак публичности: снятие публичности тоже меняет ленту
+        instance._loaded_is_public = instance.__dict__.get("is_public")
+        instance._loaded_schedule = instance.get_schedule()
+        return instance
+
+    def get_schedule(self):
+        """
+        Загруженные поля расписания {поле: значение}.
+        """
+        return {
+            name: self.__dict__[name]
+            for name in HABIT_SCHEDULE_FIELDS
+            if name in self.__dict__
+        }
+
+    def reset_next_due_date(self):
+        """
+        Сбрасывает дату следующего напоминания на сегодня, если с загрузки
+        изменились время или периодичность. Дата, рассчитанная по старой
+        периодичности, иначе пропускает напоминания по новому расписанию.
+
+        :return: True, если дата сброшена
+        """
+        loaded = getattr(self, "_loaded_schedule", {})
+        if all(getattr(self, name) == value for name, value in loaded.items()):
+            return False
+        self.next_due_date = timezone.localdate()
+        return True
+
+    def save(self, *args, **kwargs):
+        """
+        Пересчитывает минуту напоминания из времени привычки и сбрасывает
+        дату следующего напоминания при изменении расписания.
+        """
+        self.fire_minute = minute_of_day(self.time)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.reset_next_due_date()
+        else:
+            update_fields = set(update_fields)
+            if "time" in update_fields:
+                update_fields.add("fire_minute")
+            if (
+                update_fields & set(HABIT_SCHEDULE_FIELDS)
+                and self.reset_next_due_date()
+            ):
+                update_fields.add("next_due_date")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_schedule = self.get_schedule()
+
     def clean(self):
         """
         Валидация модели на уровне объекта.
@@ -93,3 +228,107 @@ class Habit(models.Model):
 
         # Проверка, что связанная привычка является приятной
         validate_related_habit_is_pleasant(self)
+
+
+class ReminderDelivery(models.Model):
+    """
+    Доставка напоминания (transactional outbox).
+    Создается при планировании и хранит состояние отправки в Telegram.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_DEAD = "dead"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_DEAD, "Не доставлено"),
+    ]
+
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="Привычка",
+    )
+    chat_id = models.BigIntegerField(verbose_name="Telegram Chat ID")
+    version = models.CharField(
+        max_length=64,
+        verbose_name="Версия текста",
+        help_text="Версия привычки, по которой берется текст из кэша",
+    )
+    fire_at = models.DateTimeField(verbose_name="Время напоминания")
+    digest = models.BooleanField(
+        default=False,
+        verbose_name="В сводке",
+        help_text="Отправляется одним сообщением с другими напоминаниями чата",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Количество попыток"
+    )
+    next_attempt_at = models.DateTimeField(verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Доставка напоминания"
+        verbose_name_plural = "Доставки напоминаний"
+        ordering = ["-fire_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["habit", "fire_at"], name="unique_delivery_per_fire_at"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="delivery_pending_idx",
+            ),
+            models.Index(
+                fields=["chat_id", "fire_at"],
+                condition=models.Q(status="pending", digest=True),
+                name="delivery_digest_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} в {self.fire_at} ({self.status})"
+
+
+class HabitTombstone(models.Model):
+    """
+    Запись об удаленной привычке для синхронизации офлайн-клиентов.
+    Хранится HABIT_SYNC_TOMBSTONE_TTL_DAYS дней.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="habit_tombstones",
+        verbose_name="Пользователь",
+    )
+    habit_id = models.BigIntegerField(verbose_name="ID привычки")
+    deleted_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Дата удаления"
+    )
+
+    class Meta:
+        verbose_name = "Удаленная привычка"
+        verbose_name_plural = "Удаленные привычки"
+        indexes = [
+            models.Index(
+                fields=["user", "deleted_at"], name="tombstone_user_deleted_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Привычка {self.habit_id} удалена {self.deleted_at}"
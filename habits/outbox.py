@@ -0,0 +1,239 @@
+"""
+Transactional outbox для доставки напоминаний в Telegram.
+
+При планировании для каждого напоминания создается строка ReminderDelivery.
+Отправители забирают строки через SELECT ... FOR UPDATE SKIP LOCKED и
+в той же короткой транзакции сдвигают их next_attempt_at на время аренды,
+поэтому несколько параллельных отправителей никогда не отправят одну
+строку дважды, а сама отправка идет уже без транзакции и блокировок.
+Неудачные отправки повторяются с экспоненциальной задержкой,
+после HABIT_REMINDER_MAX_ATTEMPTS попыток строка переводится в статус dead.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import REMINDER_BATCH_SIZE, REMINDER_LAG, REMINDER_OUTCOMES
+from .models import Habit, ReminderDelivery
+from .reminder_cache import (habit_reminder_version, reminder_text_cache,
+                             reminder_text_key)
+from .telegram_bot import telegram_sender, telegram_service
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки напоминания
+REMINDER_SENT = "sent"
+REMINDER_NO_CHAT_ID = "no_chat_id"
+REMINDER_MISSING_HABIT = "missing_habit"
+REMINDER_TELEGRAM_ERROR = "telegram_error"
+REMINDER_DUPLICATE = "duplicate"
+
+
+def create_deliveries(reminders, fire_at):
+    """
+    Массовое создание доставок для запланированных напоминаний.
+    Уже существующие доставки (habit, fire_at) не дублируются.
+
+    :param reminders: Список кортежей (habit_id, chat_id, version, digest)
+    :param fire_at: Время напоминания
+    """
+    ReminderDelivery.objects.bulk_create(
+        [
+            ReminderDelivery(
+                habit_id=habit_id,
+                chat_id=chat_id,
+                version=version,
+                digest=digest,
+                fire_at=fire_at,
+                next_attempt_at=fire_at,
+            )
+            for habit_id, chat_id, version, digest in reminders
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def pending_deliveries():
+    """
+    Доставки, срок отправки которых наступил, с блокировкой строк без
+    ожидания. Должно выполняться внутри transaction.atomic().
+    """
+    return ReminderDelivery.objects.select_for_update(skip_locked=True).filter(
+        status=ReminderDelivery.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """
+    Задержка перед следующей попыткой (экспоненциальная).
+
+    :param attempts: Количество уже сделанных попыток
+    """
+    return timedelta(
+        seconds=settings.HABIT_REMINDER_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def _record_failure(delivery, error, now):
+    delivery.attempts += 1
+    delivery.last_error = error
+    if delivery.attempts >= settings.HABIT_REMINDER_MAX_ATTEMPTS:
+        delivery.status = ReminderDelivery.STATUS_DEAD
+        logger.error(
+            f"Напоминание {delivery.habit_id} на {delivery.fire_at} не доставлено "
+            f"после {delivery.attempts} попыток: {error}"
+        )
+    else:
+        delivery.next_attempt_at = now + retry_delay(delivery.attempts)
+
+
+def with_digest_siblings(deliveries):
+    """
+    Добавление к пачке остальных ожидающих доставок того же чата и той же
+    минуты для пользователей в режиме сводки. Напоминания одного пользователя
+    могут попасть в разные пачки, а сводка должна включать их все.
+
+    :param deliveries: Заблокированные доставки
+    :return: Доставки вместе с заблокированными соседями по сводке
+    """
+    digest = [delivery for delivery in deliveries if delivery.digest]
+    if not digest:
+        return deliveries
+
+    groups = {(delivery.chat_id, delivery.fire_at) for delivery in digest}
+    siblings = (
+        pending_deliveries()
+        .filter(
+            digest=True,
+            chat_id__in={chat_id for chat_id, _ in groups},
+            fire_at__in={fire_at for _, fire_at in groups},
+        )
+        .exclude(id__in=[delivery.id for delivery in deliveries])
+    )
+    return deliveries + [
+        delivery
+        for delivery in siblings
+        if (delivery.chat_id, delivery.fire_at) in groups
+    ]
+
+
+def claim_deliveries(deliveries):
+    """
+    Захват доставок на время отправки вместе с соседями по сводке.
+    next_attempt_at всех строк одним запросом сдвигается на
+    HABIT_REMINDER_DELIVERY_LEASE секунд: после коммита другие отправители
+    их не видят, а если воркер упадет во время отправки, доставка снова
+    станет доступной по истечении аренды. Вызывается в той же транзакции,
+    что и pending_deliveries().
+
+    :param deliveries: Заблокированные доставки
+    :return: Захваченные доставки
+    """
+    deliveries = with_digest_siblings(deliveries)
+    if deliveries:
+        lease = timedelta(seconds=settings.HABIT_REMINDER_DELIVERY_LEASE)
+        ReminderDelivery.objects.filter(
+            id__in=[delivery.id for delivery in deliveries]
+        ).update(next_attempt_at=timezone.now() + lease)
+    return deliveries
+
+
+def deliver(deliveries):
+    """
+    Отправка захваченных доставок и сохранение результата.
+    Описания привычек берутся из кэша по (habit_id, version); из БД одним
+    запросом загружаются и рендерятся только промахи кэша. Напоминания
+    пользователей в режиме сводки, приходящиеся на одну минуту, отправляются
+    одним сообщением. Сообщения отправляются параллельно. Вызывается после
+    коммита claim_deliveries(), результат записывается одним bulk_update.
+    Размер пачки, задержка отправки и результаты записываются в метрики.
+
+    :param deliveries: Список объектов ReminderDelivery
+    :return: Словарь {habit_id: результат отправки}
+    """
+    if not deliveries:
+        return {}
+
+    keys = {
+        delivery.id: reminder_text_key(delivery.habit_id, delivery.version)
+        for delivery in deliveries
+    }
+    chat_ids = {delivery.id: delivery.chat_id for delivery in deliveries}
+    cached = reminder_text_cache.get_many(list(keys.values()))
+    details = {
+        delivery.id: cached[keys[delivery.id]]
+        for delivery in deliveries
+        if keys[delivery.id] in cached
+    }
+
+    missing = [delivery for delivery in deliveries if delivery.id not in details]
+    if missing:
+        habits = Habit.objects.select_related("user", "related_habit").in_bulk(
+            {delivery.habit_id for delivery in missing}
+        )
+        rendered = {}
+        for delivery in missing:
+            habit = habits[delivery.habit_id]
+            chat_ids[delivery.id] = habit.user.telegram_chat_id
+            text = telegram_service.format_habit_details(habit)
+            rendered[reminder_text_key(habit.id, habit_reminder_version(habit))] = text
+            details[delivery.id] = text
+        reminder_text_cache.set_many(rendered)
+
+    results = {}
+    groups = {}
+    for delivery in deliveries:
+        chat_id = chat_ids[delivery.id]
+        if not chat_id:
+            logger.warning(
+                f"Для привычки {delivery.habit_id} не указан telegram_chat_id"
+            )
+            delivery.status = ReminderDelivery.STATUS_DEAD
+            delivery.last_error = "Не указан telegram_chat_id"
+            results[delivery.habit_id] = REMINDER_NO_CHAT_ID
+        elif delivery.digest:
+            groups.setdefault((chat_id, delivery.fire_at), []).append(delivery)
+        else:
+            groups[delivery.id] = [delivery]
+
+    outgoing = list(groups.values())
+    sent = telegram_sender.send_messages(
+        [
+            (
+                chat_ids[group[0].id],
+                telegram_service.format_reminders(
+                    [details[delivery.id] for delivery in group]
+                ),
+            )
+            for group in outgoing
+        ]
+    )
+    now = timezone.now()
+    lags = []
+    for group, ok in zip(outgoing, sent):
+        for delivery in group:
+            if ok:
+                delivery.status = ReminderDelivery.STATUS_SENT
+                delivery.attempts += 1
+                delivery.sent_at = now
+                lags.append((now - delivery.fire_at).total_seconds())
+                results[delivery.habit_id] = REMINDER_SENT
+            else:
+                _record_failure(delivery, "Ошибка Telegram API", now)
+                results[delivery.habit_id] = REMINDER_TELEGRAM_ERROR
+
+    ReminderDelivery.objects.bulk_update(
+        deliveries,
+        ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+    )
+    REMINDER_BATCH_SIZE.observe(len(deliveries))
+    REMINDER_LAG.observe_many(lags)
+    REMINDER_OUTCOMES.inc_many(results.values())
+    logger.info(
+        f"Отправлено сообщений: {sent.count(True)} из {len(outgoing)} "
+        f"(доставок: {len(deliveries)})"
+    )
+    return results
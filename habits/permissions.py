@@ -7,4 +7,5 @@ class IsOwner(permissions.BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        # Сравнение по ID не загружает пользователя объекта
+        return obj.user_id == request.user.id
@@ -0,0 +1,102 @@
+"""
+Бюджет SQL-запросов для view и задач Celery.
+
+View объявляют максимум запросов в атрибуте query_budgets: по действию
+для ViewSet ({"list": 3, ...}) или по HTTP методу для APIView ({"post": 4}).
+Задачи Celery объявляют бюджет опцией query_budget в @shared_task: это
+максимум запросов на одну пачку (HABIT_REMINDER_BATCH_SIZE) строк.
+Бюджеты проверяются в тестах, а в режиме разработки QueryCountMiddleware
+добавляет к ответу заголовки X-Query-Count и X-Query-Budget и пишет
+предупреждение в лог при превышении. Middleware работает и под WSGI, и под
+ASGI, где запросы асинхронного ORM и синхронных view выполняются в потоке
+запроса.
+"""
+
+import logging
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Обертка выполнения запросов (connection.execute_wrapper), считающая их.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def view_query_budget(view_func, method):
+    """
+    Бюджет запросов для действия ViewSet ("list", "retrieve", ...)
+    или HTTP метода обычного APIView ("get", "post", ...).
+
+    :param view_func: Функция view из URLconf
+    :param method: HTTP метод запроса
+    :return: Максимум запросов или None, если бюджет не объявлен
+    """
+    view_class = getattr(view_func, "cls", None)
+    actions = getattr(view_func, "actions", None)
+    action = actions.get(method.lower()) if actions else method.lower()
+    return getattr(view_class, "query_budgets", {}).get(action)
+
+
+class QueryCountMiddleware:
+    """
+    Подсчет SQL-запросов на каждый запрос (включается QUERY_COUNT_HEADER).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_COUNT_HEADER:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        return self.add_headers(request, response, counter)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_COUNT_HEADER:
+            return await self.get_response(request)
+
+        # Соединения с базой у каждого потока свои: счетчик ставится на
+        # соединение потока, в котором sync_to_async выполняет запросы
+        counter = QueryCounter()
+        wrapper = await sync_to_async(lambda: connection.execute_wrapper(counter))()
+        with wrapper:
+            response = await self.get_response(request)
+        return self.add_headers(request, response, counter)
+
+    def add_headers(self, request, response, counter):
+        response["X-Query-Count"] = str(counter.count)
+        budget = getattr(request, "query_budget", None)
+        if budget is not None:
+            response["X-Query-Budget"] = str(budget)
+            if counter.count > budget:
+                logger.warning(
+                    f"{request.method} {request.path}: {counter.count} SQL-запросов "
+                    f"при бюджете {budget}"
+                )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = view_query_budget(view_func, request.method)
@@ -0,0 +1,160 @@
+"""
+Ограничение скорости отправки сообщений в Telegram.
+
+Token bucket хранится в Redis и общий для всех воркеров Celery:
+один глобальный bucket на бота и по одному bucket на каждый chat_id.
+Ожидающие токен отправки регистрируются в sorted set с временем последней
+проверки: глубина очереди — число записей не старше WAITER_TTL секунд,
+поэтому ожидания упавших воркеров не учитываются.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_BUCKET_KEY = "habits:telegram:bucket:global"
+CHAT_BUCKET_KEY = "habits:telegram:bucket:chat:{chat_id}"
+WAITERS_KEY = "habits:telegram:limiter:waiters"
+STATS_KEY = "habits:telegram:limiter:stats"
+
+# Срок, после которого непродленная запись об ожидании считается брошенной
+WAITER_TTL = 60
+
+# Атомарная проверка двух bucket'ов: токен списывается, только если он есть
+# в обоих. Иначе возвращается время ожидания в миллисекундах.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local wait = 0
+local state = {}
+
+for i = 1, 2 do
+    local rate = tonumber(ARGV[i * 2 - 1]) / 1000
+    local burst = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) / rate))
+    end
+    state[i] = {tokens, math.ceil(burst / rate) * 2}
+end
+
+if wait > 0 then
+    return wait
+end
+
+for i = 1, 2 do
+    redis.call('HSET', KEYS[i], 'tokens', state[i][1] - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], state[i][2])
+end
+return 0
+"""
+
+
+class TelegramRateLimiter:
+    """
+    Ограничитель скорости отправки на основе token bucket в Redis.
+
+    Вызов acquire() ждет свободный токен в глобальном bucket и в bucket
+    чата вместо того, чтобы получать 429 от Bot API.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        global_rate=None,
+        global_burst=None,
+        chat_rate=None,
+        chat_burst=None,
+    ):
+        self._redis = redis_client
+        self.global_rate = global_rate or settings.TELEGRAM_GLOBAL_RATE_LIMIT
+        self.global_burst = global_burst or settings.TELEGRAM_GLOBAL_BURST
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE_LIMIT
+        self.chat_burst = chat_burst or settings.TELEGRAM_CHAT_BURST
+        self._script = None
+
+    @property
+    def redis(self):
+        """
+        Асинхронный клиент Redis, создается в event loop отправителя.
+        """
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    async def _try_acquire(self, chat_id):
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        return await self._script(
+            keys=[GLOBAL_BUCKET_KEY, CHAT_BUCKET_KEY.format(chat_id=chat_id)],
+            args=[self.global_rate, self.global_burst, self.chat_rate, self.chat_burst],
+        )
+
+    async def acquire(self, chat_id):
+        """
+        Ожидание токена для отправки сообщения в чат.
+
+        :param chat_id: ID чата
+        :return: Время ожидания в секундах
+        """
+        started = time.monotonic()
+        waiter = None
+        try:
+            while True:
+                wait_ms = await self._try_acquire(chat_id)
+                if not wait_ms:
+                    break
+                # Запись об ожидании продлевается на каждой проверке,
+                # сон не дольше половины WAITER_TTL
+                waiter = waiter or uuid.uuid4().hex
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.zadd(WAITERS_KEY, {waiter: time.time()})
+                pipe.expire(WAITERS_KEY, WAITER_TTL)
+                await pipe.execute()
+                await asyncio.sleep(min(wait_ms / 1000, WAITER_TTL / 2))
+        finally:
+            if waiter:
+                await self.redis.zrem(WAITERS_KEY, waiter)
+
+        waited = time.monotonic() - started
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(STATS_KEY, "acquired", 1)
+        pipe.hincrbyfloat(STATS_KEY, "wait_seconds_total", waited)
+        pipe.hset(STATS_KEY, "last_wait_seconds", waited)
+        await pipe.execute()
+        return waited
+
+
+def get_rate_limiter_stats(redis_client=None):
+    """
+    Текущее состояние ограничителя: глубина очереди и время ожидания.
+
+    :param redis_client: Синхронный клиент Redis
+    :return: Словарь со статистикой
+    """
+    client = redis_client or get_redis()
+    pipe = client.pipeline(transaction=False)
+    pipe.zremrangebyscore(WAITERS_KEY, "-inf", time.time() - WAITER_TTL)
+    pipe.zcard(WAITERS_KEY)
+    pipe.hgetall(STATS_KEY)
+    _, queue_depth, stats = pipe.execute()
+    acquired = int(stats.get(b"acquired", 0))
+    wait_total = float(stats.get(b"wait_seconds_total", 0))
+    return {
+        "queue_depth": queue_depth,
+        "acquired": acquired,
+        "wait_seconds_total": wait_total,
+        "wait_seconds_avg": wait_total / acquired if acquired else 0.0,
+        "last_wait_seconds": float(stats.get(b"last_wait_seconds", 0)),
+    }
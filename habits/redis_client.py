@@ -0,0 +1,19 @@
+"""
+Общее синхронное подключение к Redis для задач напоминаний.
+"""
+
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    """
+    Клиент Redis из настроек REDIS_URL, один на процесс.
+    Клиент потокобезопасен и сам управляет пулом соединений.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
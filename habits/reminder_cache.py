@@ -0,0 +1,107 @@
+"""
+Кэш готовых описаний привычек для напоминаний.
+
+Текст хранится по ключу (habit_id, версия), где версия складывается из
+updated_at привычки и updated_at связанной привычки. Любое изменение
+привычки или ее связанной привычки дает новую версию, поэтому устаревший
+текст больше не читается. Хранится описание без заголовка
+(TelegramService.format_habit_details), которое подходит и для отдельного
+напоминания, и для сводки. Двухуровневый кэш: ограниченный LRU в памяти
+процесса и общий кэш Django (Redis). Тексты удаленных привычек отдельно не
+удаляются: их больше никто не читает, и они истекают сами.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+REMINDER_TEXT_KEY = "habits:reminder_details:{habit_id}:{version}"
+
+
+def _timestamp_us(value):
+    return int(value.timestamp() * 1_000_000) if value else 0
+
+
+def reminder_version(updated_at, related_updated_at=None):
+    """
+    Версия текста напоминания.
+
+    :param updated_at: Дата обновления привычки
+    :param related_updated_at: Дата обновления связанной привычки
+    """
+    return f"{_timestamp_us(updated_at)}.{_timestamp_us(related_updated_at)}"
+
+
+def habit_reminder_version(habit):
+    """
+    Версия текста напоминания для загруженной привычки.
+    """
+    related = habit.related_habit
+    return reminder_version(habit.updated_at, related.updated_at if related else None)
+
+
+def reminder_text_key(habit_id, version):
+    return REMINDER_TEXT_KEY.format(habit_id=habit_id, version=version)
+
+
+class ReminderTextCache:
+    """
+    Кэш текстов напоминаний: LRU в памяти процесса поверх кэша Django.
+    """
+
+    def __init__(self, maxsize=None, timeout=None):
+        self.maxsize = maxsize or settings.HABIT_REMINDER_TEXT_LRU_SIZE
+        self.timeout = timeout or settings.HABIT_REMINDER_TEXT_CACHE_TIMEOUT
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, text):
+        self._local[key] = text
+        self._local.move_to_end(key)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Получение текстов по ключам.
+
+        :param keys: Ключи из reminder_text_key
+        :return: Словарь {ключ: текст} для найденных ключей
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._local:
+                    self._local.move_to_end(key)
+                    found[key] = self._local[key]
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = cache.get_many(missing)
+            with self._lock:
+                for key, text in shared.items():
+                    self._remember(key, text)
+            found.update(shared)
+        return found
+
+    def set_many(self, texts):
+        """
+        Сохранение текстов в оба уровня кэша.
+
+        :param texts: Словарь {ключ: текст}
+        """
+        if not texts:
+            return
+        cache.set_many(texts, self.timeout)
+        with self._lock:
+            for key, text in texts.items():
+                self._remember(key, text)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+reminder_text_cache = ReminderTextCache()
@@ -0,0 +1,34 @@
+"""
+JSON renderer на orjson с тем же выводом, что и JSONRenderer DRF.
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# JSONRenderer экранирует разделители строк для совместимости с JavaScript
+LINE_SEPARATORS = (
+    ("\u2028".encode(), b"\\u2028"),
+    ("\u2029".encode(), b"\\u2029"),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Компактный JSON через orjson: байт в байт совпадает с JSONRenderer
+    для словарей, списков, строк, чисел, bool и None. Ответы с отступами
+    (browsable API, ?indent) и данные, которые orjson не умеет
+    сериализовать (ленивые переводы, Decimal), рендерятся JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+        return ret
@@ -0,0 +1,31 @@
+"""
+Вспомогательные функции для расчета времени отправки напоминаний.
+"""
+
+from datetime import timedelta
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def minute_of_day(value):
+    """
+    Номер минуты суток (0–1439) для времени привычки.
+
+    :param value: Объект time или datetime
+    :return: Минута суток
+    """
+    return value.hour * 60 + value.minute
+
+
+def next_fire_at(now, lookahead_minutes=1):
+    """
+    Момент отправки напоминаний, которые планируются в текущем запуске.
+
+    Время округляется вниз до минуты и сдвигается на lookahead_minutes,
+    поэтому окно корректно переходит через полночь на следующие сутки.
+
+    :param now: Текущее локальное время (aware datetime)
+    :param lookahead_minutes: На сколько минут вперед планировать
+    :return: Aware datetime начала минуты отправки
+    """
+    return now.replace(second=0, microsecond=0) + timedelta(minutes=lookahead_minutes)
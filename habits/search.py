@@ -0,0 +1,58 @@
+"""
+Поиск по привычкам.
+
+Полнотекстовый поиск идет по колонке search_vector (tsvector, GIN индекс),
+которую база пересчитывает при каждой записи. Нечеткий поиск по action и
+place (опечатки, части слов) использует триграммные GIN индексы pg_trgm.
+Результаты упорядочиваются по релевантности: сумма ts_rank и наибольшего
+триграммного сходства.
+"""
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+from .models import HABIT_SEARCH_CONFIG
+
+
+def _search_query(query):
+    return SearchQuery(query, config=HABIT_SEARCH_CONFIG, search_type="websearch")
+
+
+def search_filter(query):
+    """
+    Условие поиска, которое может использовать индексы.
+
+    :param query: Строка поиска в синтаксисе websearch_to_tsquery
+    """
+    return (
+        Q(search_vector=_search_query(query))
+        | Q(action__trigram_similar=query)
+        | Q(place__trigram_similar=query)
+    )
+
+
+def search_rank(query):
+    """
+    Релевантность привычки для строки поиска.
+
+    :param query: Строка поиска
+    """
+    rank = SearchRank(F("search_vector"), _search_query(query)) + Greatest(
+        TrigramSimilarity("action", query), TrigramSimilarity("place", query)
+    )
+    # ts_rank и similarity возвращают real. Позиция курсора, прочитанная из
+    # real, при сравнении в double precision оказывается больше исходного
+    # значения, и последняя строка повторяется на следующей странице.
+    return Cast(rank, FloatField())
+
+
+def search_habits(queryset, query):
+    """
+    Привычки, найденные по строке, с релевантностью в поле rank.
+
+    :param queryset: Исходный queryset привычек
+    :param query: Строка поиска
+    """
+    return queryset.annotate(rank=search_rank(query)).filter(search_filter(query))
@@ -1,9 +1,24 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from .models import Habit
 
 
-class HabitSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Ограничение полей ответа списком context["fields"] (параметр ?fields=).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get("fields")
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                if not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+
+class HabitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для привычки.
     """
@@ -42,7 +57,53 @@ class HabitSerializer(serializers.ModelSerializer):
         return data
 
 
-class PublicHabitSerializer(serializers.ModelSerializer):
+class HabitBulkItemSerializer(HabitSerializer):
+    """
+    Сериализатор одной привычки в массовом запросе.
+    Связанная привычка принимается как ID: все ID пачки загружаются одним
+    запросом, а проверки clean() выполняются для пачки целиком (см. bulk.py).
+    """
+
+    related_habit = serializers.IntegerField(
+        required=False, allow_null=True, min_value=1
+    )
+
+    def validate(self, data):
+        return data
+
+
+class HabitBulkUpdateItemSerializer(HabitBulkItemSerializer):
+    """
+    Сериализатор изменения привычки в массовом запросе (частичное обновление).
+    """
+
+    id = serializers.IntegerField(min_value=1)
+
+
+class HabitBulkSerializer(serializers.Serializer):
+    """
+    Массовый запрос: списки привычек для создания, изменения и удаления.
+    Элементы create и update проверяются по отдельности в bulk.py.
+    """
+
+    create = serializers.ListField(child=serializers.JSONField(), default=list)
+    update = serializers.ListField(child=serializers.JSONField(), default=list)
+    delete = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list
+    )
+
+    def validate(self, data):
+        total = sum(len(items) for items in data.values())
+        if not total:
+            raise serializers.ValidationError("Пустой запрос.")
+        if total > settings.HABIT_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Не более {settings.HABIT_BULK_MAX_ITEMS} привычек в одном запросе."
+            )
+        return data
+
+
+class PublicHabitSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для публичных привычек (только для чтения).
     """
@@ -0,0 +1,75 @@
+"""
+Обработчики сигналов модели привычки.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_migrate
+from django.dispatch import receiver
+
+from .etags import invalidate_user_habit_stats
+from .feed_cache import bump_feed_generation
+from .models import Habit, HabitTombstone
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_feed_on_save(sender, instance, created, **kwargs):
+    """
+    Сброс кэша ленты при изменении публичной привычки или ее публичности.
+    """
+    was_public = getattr(instance, "_loaded_is_public", None)
+    if instance.is_public or was_public or (was_public is None and not created):
+        bump_feed_generation()
+    instance._loaded_is_public = instance.is_public
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_feed_on_delete(sender, instance, **kwargs):
+    if instance.is_public:
+        bump_feed_generation()
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_feed_on_user_save(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Лента показывает email автора, поэтому его смена тоже сбрасывает кэш.
+    Сохранения без email (например, last_login при входе) пропускаются.
+    """
+    if created or (update_fields is not None and "email" not in update_fields):
+        return
+    if instance.habits.filter(is_public=True).exists():
+        bump_feed_generation()
+
+
+@receiver(post_delete, sender=Habit)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Запись в журнал удалений для синхронизации (см. sync.py).
+    Удаления через QuerySet записываются вызывающим кодом одним запросом
+    (record_tombstones), привычки удаленного пользователя не записываются.
+    """
+    if isinstance(origin, Habit):
+        HabitTombstone.objects.create(user_id=instance.user_id, habit_id=instance.id)
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def invalidate_user_etag(sender, instance, **kwargs):
+    """
+    Сброс закэшированной статистики, из которой строится ETag привычек.
+    """
+    invalidate_user_habit_stats(instance.user_id)
+
+
+@receiver(pre_migrate)
+def create_trigram_extension(sender, using, **kwargs):
+    """
+    Расширение pg_trgm для триграммных индексов. Создается и миграцией,
+    но тестовая база строится без миграций (см. settings.py).
+    """
+    connection = connections[using]
+    if sender.name == "habits" and connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
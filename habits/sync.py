@@ -0,0 +1,90 @@
+"""
+Дельта-синхронизация привычек для офлайн-клиентов.
+
+Токен синхронизации — подписанная метка времени начала предыдущей
+синхронизации. Ответ содержит привычки, созданные или измененные после нее
+(один проход по индексу (user_id, updated_at)), и ID привычек, удаленных
+после нее (журнал HabitTombstone), поэтому объем ответа зависит только от
+количества изменений. Окно начинается на HABIT_SYNC_OVERLAP_SECONDS раньше
+токена, чтобы не потерять записи, которые еще не были закоммичены в момент
+прошлой синхронизации: клиент может получить известную ему привычку
+повторно и должен применять изменения идемпотентно.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import HabitTombstone
+
+SYNC_TOKEN_SALT = "habits.sync"
+
+
+def record_tombstones(deleted):
+    """
+    Запись удаленных привычек в журнал одним запросом.
+    Нужна после QuerySet.delete(): сигнал записывает только удаления
+    отдельных привычек (см. signals.py).
+
+    :param deleted: Пары (ID владельца, ID привычки)
+    """
+    now = timezone.now()
+    HabitTombstone.objects.bulk_create(
+        [
+            HabitTombstone(user_id=user_id, habit_id=habit_id, deleted_at=now)
+            for user_id, habit_id in deleted
+        ]
+    )
+
+
+def make_sync_token(moment):
+    return signing.dumps(int(moment.timestamp() * 1_000_000), salt=SYNC_TOKEN_SALT)
+
+
+def parse_sync_token(token):
+    """
+    Метка времени из токена синхронизации.
+
+    :raises signing.BadSignature: Токен поврежден или выдан не этим сервером
+    """
+    micros = signing.loads(token, salt=SYNC_TOKEN_SALT)
+    if not isinstance(micros, int):
+        raise signing.BadSignature("Неверный формат токена")
+    return datetime.fromtimestamp(micros / 1_000_000, tz=UTC)
+
+
+def sync_changes(user, queryset, reader, token=None):
+    """
+    Изменения привычек пользователя после токена.
+
+    :param user: Пользователь
+    :param queryset: Привычки пользователя
+    :param reader: FastListReader для формата привычек
+    :param token: Токен прошлой синхронизации или None для полной
+    :return: Словарь changed, deleted, reset и token для следующей синхронизации
+    """
+    started = timezone.now()
+    since = parse_sync_token(token) if token else None
+    retention = timedelta(days=settings.HABIT_SYNC_TOMBSTONE_TTL_DAYS)
+    # Журнал удалений уже очищен: клиент должен заменить все данные
+    reset = since is not None and since < started - retention
+
+    deleted = []
+    if since is None or reset:
+        changed = queryset
+    else:
+        since -= timedelta(seconds=settings.HABIT_SYNC_OVERLAP_SECONDS)
+        changed = queryset.filter(updated_at__gte=since).order_by("updated_at")
+        deleted = list(
+            HabitTombstone.objects.filter(user=user, deleted_at__gte=since)
+            .order_by("deleted_at")
+            .values_list("habit_id", flat=True)
+        )
+    return {
+        "changed": reader.to_representation(reader.values(changed)),
+        "deleted": deleted,
+        "reset": reset,
+        "token": make_sync_token(started),
+    }
@@ -2,26 +2,43 @@
 Celery задачи для отправки напоминаний о привычках.
 """
 
-import asyncio
 import logging
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from itertools import batched
 
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
 from django.utils import timezone
 
-from .models import Habit
-from .telegram_bot import telegram_service
+from .dedup import STAGE_SCHEDULED, STAGE_SENT, claim_reminders
+from .delay_queue import reminder_queue
+from .metrics import REMINDER_OUTCOMES
+from .models import Habit, HabitTombstone, ReminderDelivery
+from .outbox import (REMINDER_DUPLICATE, REMINDER_MISSING_HABIT,
+                     claim_deliveries, create_deliveries, deliver,
+                     pending_deliveries)
+from .reminder_cache import reminder_version
+from .scheduling import minute_of_day, next_fire_at
+from .telegram_bot import telegram_sender, telegram_service
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def send_habit_reminder(habit_id):
+@shared_task(query_budget=1)
+def send_habit_reminder(habit_id, fire_ts=None):
     """
     Отправка напоминания о привычке через Telegram.
 
     :param habit_id: ID привычки
+    :param fire_ts: Момент отправки (unix timestamp) для защиты от дублей
     """
+    if fire_ts is not None and not claim_reminders([habit_id], fire_ts, STAGE_SENT):
+        return
+
     try:
         habit = Habit.objects.select_related("user", "related_habit").get(id=habit_id)
 
@@ -35,11 +52,9 @@ def send_habit_reminder(habit_id):
         # Форматируем сообщение
         message = telegram_service.format_habit_reminder(habit)
 
-        # Отправляем сообщение
-        asyncio.run(
-            telegram_service.send_message(
-                chat_id=habit.user.telegram_chat_id, message=message
-            )
+        # Отправляем сообщение через долгоживущий клиент процесса
+        telegram_sender.send_message(
+            chat_id=habit.user.telegram_chat_id, message=message
         )
 
         logger.info(f"Напоминание о привычке {habit_id} отправлено")
@@ -50,36 +65,285 @@ def send_habit_reminder(habit_id):
         logger.error(f"Ошибка при отправке напоминания: {e}")
 
 
-@shared_task
+@shared_task(query_budget=6)
+def send_habit_reminders_batch(habit_ids, fire_ts):
+    """
+    Отправка напоминаний для пачки привычек через outbox.
+    Доставки захватываются в короткой транзакции (FOR UPDATE SKIP LOCKED),
+    поэтому строки, которые уже отправляет другой воркер, пропускаются.
+
+    :param habit_ids: Список ID привычек
+    :param fire_ts: Момент отправки (unix timestamp)
+    :return: Словарь {habit_id: результат отправки}
+    """
+    skipped = {}
+    claimed = set(claim_reminders(habit_ids, fire_ts, STAGE_SENT))
+    for habit_id in habit_ids:
+        if habit_id not in claimed:
+            skipped[habit_id] = REMINDER_DUPLICATE
+
+    fire_at = datetime.fromtimestamp(fire_ts, tz=UTC)
+    with transaction.atomic():
+        deliveries = claim_deliveries(
+            list(pending_deliveries().filter(habit_id__in=claimed, fire_at=fire_at))
+        )
+    results = deliver(deliveries)
+
+    unmatched = claimed - {delivery.habit_id for delivery in deliveries}
+    if unmatched:
+        # Доставка уже обработана другим отправителем или привычка удалена
+        existing = set(
+            ReminderDelivery.objects.filter(
+                habit_id__in=unmatched, fire_at=fire_at
+            ).values_list("habit_id", flat=True)
+        )
+        for habit_id in unmatched:
+            if habit_id in existing:
+                skipped[habit_id] = REMINDER_DUPLICATE
+            else:
+                logger.error(f"Привычка с ID {habit_id} не найдена")
+                skipped[habit_id] = REMINDER_MISSING_HABIT
+
+    REMINDER_OUTCOMES.inc_many(skipped.values())
+    results.update(skipped)
+    return results
+
+
+@shared_task(query_budget=5)
+def drain_reminder_outbox():
+    """
+    Отправка доставок, срок которых наступил: повторные попытки и напоминания,
+    не переданные через отложенную очередь. Несколько экземпляров задачи
+    работают параллельно и не пересекаются благодаря SKIP LOCKED.
+    Задача запускается Celery beat каждые HABIT_REMINDER_OUTBOX_INTERVAL секунд.
+    """
+    drained = 0
+    while True:
+        with transaction.atomic():
+            deliveries = list(
+                pending_deliveries().order_by("next_attempt_at")[
+                    : settings.HABIT_REMINDER_BATCH_SIZE
+                ]
+            )
+            claimed = claim_deliveries(deliveries)
+        deliver(claimed)
+
+        drained += len(deliveries)
+        if len(deliveries) < settings.HABIT_REMINDER_BATCH_SIZE:
+            break
+
+    if drained:
+        logger.info(f"Обработано доставок из outbox: {drained}")
+    return drained
+
+
+@shared_task(query_budget=1)
+def prune_reminder_deliveries():
+    """
+    Очистка отправленных доставок старше HABIT_REMINDER_DELIVERY_TTL_DAYS дней.
+    Ожидающие и мертвые доставки не удаляются.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.HABIT_REMINDER_DELIVERY_TTL_DAYS)
+    deleted, _ = ReminderDelivery.objects.filter(
+        status=ReminderDelivery.STATUS_SENT, fire_at__lt=cutoff
+    ).delete()
+    if deleted:
+        logger.info(f"Удалено отправленных доставок: {deleted}")
+    return deleted
+
+
+def advance_next_due_dates(habits, fire_date):
+    """
+    Перенос даты следующего напоминания с учетом периодичности.
+    Выполняет по одному UPDATE на каждое значение периодичности.
+
+    :param habits: Строки, начинающиеся с (habit_id, periodicity)
+    :param fire_date: Дата отправленного напоминания
+    """
+    by_periodicity = defaultdict(list)
+    for habit_id, periodicity, *_ in habits:
+        by_periodicity[periodicity].append(habit_id)
+
+    for periodicity, habit_ids in by_periodicity.items():
+        Habit.objects.filter(id__in=habit_ids).update(
+            next_due_date=fire_date + timedelta(days=periodicity)
+        )
+
+
+def shard_user_ranges(shard_count, max_user_id):
+    """
+    Разбиение user_id на shard_count непрерывных диапазонов.
+    У последнего диапазона нет верхней границы, поэтому пользователи,
+    созданные после подсчета max_user_id, тоже попадают в шард.
+
+    :param shard_count: Количество шардов
+    :param max_user_id: Наибольший user_id среди привычек
+    :return: Список пар (first_user_id, last_user_id)
+    """
+    size = (max_user_id or 0) // shard_count + 1
+    ranges = [(shard * size, (shard + 1) * size - 1) for shard in range(shard_count)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def enqueue_reminder_shards(fire_ts):
+    """
+    Запуск schedule_reminder_shard для каждого диапазона пользователей.
+
+    :param fire_ts: Момент отправки (unix timestamp)
+    :return: Количество шардов
+    """
+    max_user_id = Habit.objects.aggregate(max_user_id=Max("user_id"))["max_user_id"]
+    ranges = shard_user_ranges(settings.HABIT_REMINDER_SHARDS, max_user_id)
+    for first_user_id, last_user_id in ranges:
+        schedule_reminder_shard.delay(first_user_id, last_user_id, fire_ts)
+    return len(ranges)
+
+
+@shared_task(query_budget=1)
 def schedule_habit_reminders():
     """
-    Планирование напоминаний для всех активных привычек.
-    Эта задача должна запускаться периодически (например, каждый час).
+    Планирование напоминаний на ближайшую минуту.
+    Задача запускается Celery beat каждую минуту (см. CELERY_BEAT_SCHEDULE)
+    и распределяет сканирование привычек между HABIT_REMINDER_SHARDS
+    задачами schedule_reminder_shard, которые выполняются параллельно.
     """
-    now = timezone.now()
-    current_time = now.time()
-    current_date = now.date()
+    now = timezone.localtime()
+    eta = next_fire_at(now, settings.HABIT_REMINDER_LOOKAHEAD_MINUTES)
+    shard_count = enqueue_reminder_shards(int(eta.timestamp()))
 
-    # Находим привычки, для которых нужно отправить напоминание
-    # в ближайший час
-    hour_later = (now + timedelta(hours=1)).time()
+    logger.info(f"Планирование напоминаний на {eta}: {shard_count} шардов")
+    return shard_count
 
-    habits = Habit.objects.select_related("user").filter(
+
+def due_habits(first_user_id, last_user_id, eta):
+    """
+    Привычки пользователей из диапазона, напоминание по которым нужно
+    отправить в момент eta. Запрос обслуживается индексом
+    habit_due_reminder_user_idx: user_id — последняя колонка индекса,
+    поэтому границы диапазона проверяются по индексу, без чтения таблицы.
+
+    :param first_user_id: Первый user_id диапазона
+    :param last_user_id: Последний user_id диапазона или None
+    :param eta: Время напоминания (локальное)
+    """
+    habits = Habit.objects.filter(
+        user_id__gte=first_user_id,
         user__telegram_chat_id__isnull=False,
-        time__gte=current_time,
-        time__lt=hour_later,
+        fire_minute=minute_of_day(eta),
+        next_due_date__lte=eta.date(),
     )
+    if last_user_id is not None:
+        habits = habits.filter(user_id__lte=last_user_id)
+    return habits
+
+
+def enqueue_reminders(habit_ids, fire_ts):
+    """
+    Постановка напоминаний в отложенную очередь. Повторный или параллельный
+    запуск не ставит те же напоминания: ключи уже заняты.
+
+    :param habit_ids: Список ID привычек
+    :param fire_ts: Момент отправки (unix timestamp)
+    """
+    reminder_queue.push(claim_reminders(habit_ids, fire_ts, STAGE_SCHEDULED), fire_ts)
+
+
+# Выборка, до 7 UPDATE (по одному на периодичность) и вставка доставок
+@shared_task(query_budget=9)
+def schedule_reminder_shard(first_user_id, last_user_id, fire_ts):
+    """
+    Планирование напоминаний одного шарда — непрерывного диапазона user_id.
+    По индексу (fire_minute, next_due_date, user_id) выбираются только
+    привычки, которые нужно выполнить в эту минуту с учетом периодичности.
+    Строки читаются курсором порциями, поэтому память не зависит от числа
+    привычек. Напоминания кладутся в отложенную очередь Redis, откуда их
+    в срок забирает dispatch_due_reminders.
 
-    for habit in habits:
-        # Проверяем периодичность
-        # Здесь можно добавить логику проверки, что привычку
-        # нужно выполнить сегодня
+    :param first_user_id: Первый user_id шарда
+    :param last_user_id: Последний user_id шарда или None
+    :param fire_ts: Момент отправки (unix timestamp)
+    """
+    eta = timezone.localtime(datetime.fromtimestamp(fire_ts, tz=UTC))
 
-        # Планируем отправку напоминания в указанное время
-        eta = timezone.make_aware(datetime.combine(current_date, habit.time))
+    habits = (
+        due_habits(first_user_id, last_user_id, eta)
+        .values_list(
+            "id",
+            "periodicity",
+            "user__telegram_chat_id",
+            "updated_at",
+            "related_habit__updated_at",
+            "user__reminder_digest",
+        )
+        .iterator(chunk_size=settings.HABIT_REMINDER_CHUNK_SIZE)
+    )
 
-        if eta > now:
-            send_habit_reminder.apply_async(args=[habit.id], eta=eta)
-            logger.info(
-                f"Запланировано напоминание для привычки " f"{habit.id} на {eta}"
+    scheduled = 0
+    for batch in batched(habits, settings.HABIT_REMINDER_BATCH_SIZE):
+        # Перенос дат и доставки фиксируются вместе. Ключи дублей и очередь
+        # Redis занимаются только после коммита: при сбое привычки остаются
+        # к отправке, и повтор задачи не отбросит их как дубликаты
+        with transaction.atomic():
+            advance_next_due_dates(batch, eta.date())
+            reminders = [
+                (
+                    habit_id,
+                    chat_id,
+                    reminder_version(updated_at, related_updated_at),
+                    digest,
+                )
+                for habit_id, _, chat_id, updated_at, related_updated_at, digest in batch
+            ]
+            create_deliveries(reminders, eta)
+            transaction.on_commit(
+                partial(enqueue_reminders, [row[0] for row in batch], fire_ts)
             )
+        scheduled += len(reminders)
+
+    logger.info(
+        f"Пользователи {first_user_id}–{last_user_id or '…'}: "
+        f"запланировано напоминаний {scheduled}"
+    )
+    return scheduled
+
+
+@shared_task(query_budget=0)
+def dispatch_due_reminders():
+    """
+    Передача наступивших напоминаний из отложенной очереди в задачи отправки.
+    Задача запускается Celery beat каждые HABIT_REMINDER_POLL_INTERVAL секунд.
+    """
+    now_ts = int(timezone.now().timestamp())
+    batch_size = settings.HABIT_REMINDER_BATCH_SIZE
+
+    dispatched = 0
+    while True:
+        entries = reminder_queue.pop_due(now_ts, batch_size)
+
+        by_fire_ts = defaultdict(list)
+        for habit_id, fire_ts in entries:
+            by_fire_ts[fire_ts].append(habit_id)
+        for fire_ts, habit_ids in by_fire_ts.items():
+            send_habit_reminders_batch.delay(habit_ids, fire_ts)
+
+        dispatched += len(entries)
+        if len(entries) < batch_size:
+            break
+
+    if dispatched:
+        logger.info(f"Передано на отправку напоминаний: {dispatched}")
+    return dispatched
+
+
+@shared_task(query_budget=1)
+def prune_habit_tombstones():
+    """
+    Очистка журнала удалений старше HABIT_SYNC_TOMBSTONE_TTL_DAYS дней.
+    Клиенты с более старым токеном получают полную синхронизацию.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.HABIT_SYNC_TOMBSTONE_TTL_DAYS)
+    deleted, _ = HabitTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    if deleted:
+        logger.info(f"Удалено записей журнала удалений: {deleted}")
+    return deleted
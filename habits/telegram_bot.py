@@ -2,11 +2,21 @@
 Интеграция с Telegram для отправки напоминаний о привычках.
 """
 
+import asyncio
 import logging
+import os
+import threading
+import time
+from datetime import timedelta
 
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 from telegram import Bot
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+
+from .metrics import TELEGRAM_REQUEST_DURATION
+from .rate_limit import TelegramRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -16,15 +26,27 @@ class TelegramService:
     Сервис для работы с Telegram Bot API.
     """
 
-    def __init__(self):
+    def __init__(self, rate_limiter=None):
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.bot = None
         if self.bot_token:
-            self.bot = Bot(token=self.bot_token)
+            self.bot = Bot(
+                token=self.bot_token,
+                base_url=settings.TELEGRAM_API_BASE_URL,
+                request=HTTPXRequest(
+                    connection_pool_size=settings.TELEGRAM_CONNECTION_POOL_SIZE
+                ),
+            )
+        self.rate_limiter = rate_limiter
+        if rate_limiter is None and settings.TELEGRAM_RATE_LIMIT_ENABLED:
+            self.rate_limiter = TelegramRateLimiter()
+        self.request_durations = []
 
     async def send_message(self, chat_id, message):
         """
-        Отправка сообщения в Telegram.
+        Отправка сообщения в Telegram. TELEGRAM_SEND_TIMEOUT ограничивает
+        каждый запрос к Bot API, но не ожидание rate limiter'а: сообщения
+        в очереди лимита не считаются зависшими.
 
         :param chat_id: ID чата для отправки
         :param message: Текст сообщения
@@ -34,15 +56,47 @@ class TelegramService:
             logger.error("Telegram bot token не настроен")
             return False
 
-        try:
-            await self.bot.send_message(
-                chat_id=chat_id, text=message, parse_mode="HTML"
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(chat_id)
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self.bot.send_message(
+                        chat_id=chat_id, text=message, parse_mode="HTML"
+                    ),
+                    settings.TELEGRAM_SEND_TIMEOUT,
+                )
+            except RetryAfter as e:
+                retry_after = e.retry_after
+            except TelegramError as e:
+                logger.error(f"Ошибка отправки сообщения: {e}")
+                return False
+            except TimeoutError:
+                logger.warning(
+                    f"Сообщение в чат {chat_id} не отправлено "
+                    f"за {settings.TELEGRAM_SEND_TIMEOUT} сек."
+                )
+                return False
+            else:
+                logger.info(f"Сообщение отправлено в чат {chat_id}")
+                return True
+            finally:
+                # Только сам запрос к Bot API, без ожидания повтора
+                self.request_durations.append(time.monotonic() - started)
+
+            # Лимит все же превышен (например, другим клиентом бота):
+            # ждем указанное Telegram время и повторяем
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning(
+                f"Превышен лимит Telegram для чата {chat_id}, "
+                f"повтор через {retry_after} сек."
             )
-            logger.info(f"Сообщение отправлено в чат {chat_id}")
-            return True
-        except TelegramError as e:
-            logger.error(f"Ошибка отправки сообщения: {e}")
-            return False
+            await asyncio.sleep(retry_after)
+
+        logger.error(f"Сообщение в чат {chat_id} не отправлено: лимит повторов")
+        return False
 
     def format_habit_reminder(self, habit):
         """
@@ -51,8 +105,16 @@ class TelegramService:
         :param habit: Объект привычки
         :return: Отформатированное сообщение
         """
-        message = "🔔 <b>Напоминание о привычке!</b>\n\n"
-        message += f"⏰ Время: {habit.time.strftime('%H:%M')}\n"
+        return self.format_reminders([self.format_habit_details(habit)])
+
+    def format_habit_details(self, habit):
+        """
+        Описание привычки для напоминания (без заголовка).
+
+        :param habit: Объект привычки
+        :return: Текст описания
+        """
+        message = f"⏰ Время: {habit.time.strftime('%H:%M')}\n"
         message += f"📍 Место: {habit.place}\n"
         message += f"✨ Действие: {habit.action}\n"
         message += f"⏱ Время на выполнение: {habit.execution_time} сек.\n"
@@ -64,6 +126,173 @@ class TelegramService:
 
         return message
 
+    def format_reminders(self, details):
+        """
+        Сообщение с одной или несколькими привычками. Несколько привычек
+        объединяются в сводку (режим User.reminder_digest).
+
+        :param details: Список описаний из format_habit_details
+        :return: Отформатированное сообщение
+        """
+        if len(details) == 1:
+            return "🔔 <b>Напоминание о привычке!</b>\n\n" + details[0]
+
+        message = f"🔔 <b>Напоминания о привычках ({len(details)})</b>\n\n"
+        message += "\n\n".join(detail.rstrip("\n") for detail in details)
+        return message
+
+    def take_request_durations(self):
+        """
+        Длительности запросов к Bot API, накопленные с прошлого вызова.
+        """
+        durations, self.request_durations = self.request_durations, []
+        return durations
+
+
+class TelegramSender:
+    """
+    Долгоживущий асинхронный отправитель сообщений.
+
+    Держит собственный event loop в фоновом потоке и один TelegramService
+    на процесс воркера, поэтому пул HTTP-соединений с Bot API остается
+    «теплым» между задачами. Синхронный код передает ему сообщения
+    вместо создания нового event loop на каждую отправку.
+    """
+
+    def __init__(self, service_factory=TelegramService):
+        self.service_factory = service_factory
+        self.service = None
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """
+        Запуск event loop при первом обращении в текущем процессе.
+        После fork (prefork-пул Celery) loop родителя не используется.
+        """
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="telegram-sender", daemon=True
+            )
+            thread.start()
+
+            self._loop = loop
+            self._thread = thread
+            self._pid = os.getpid()
+            self.service = self.service_factory()
+
+    def run(self, coro):
+        """
+        Выполнение корутины в event loop отправителя с ожиданием результата.
+        Время ожидания не ограничивается: каждый запрос к Bot API ограничен
+        TELEGRAM_SEND_TIMEOUT внутри TelegramService.
+
+        :param coro: Корутина
+        :return: Результат корутины
+        """
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def send_message(self, chat_id, message):
+        """
+        Отправка сообщения через долгоживущий клиент.
+
+        :param chat_id: ID чата для отправки
+        :param message: Текст сообщения
+        :return: True если успешно, False если ошибка
+        """
+        self._ensure_started()
+        service = self.service
+
+        async def send_one():
+            result = await service.send_message(chat_id=chat_id, message=message)
+            return result, service.take_request_durations()
+
+        result, durations = self.run(send_one())
+        TELEGRAM_REQUEST_DURATION.observe_many(durations)
+        return result
+
+    def send_messages(self, messages):
+        """
+        Параллельная отправка нескольких сообщений.
+        Число одновременных запросов ограничено размером пула соединений.
+        Зависший запрос считается неудачной отправкой только своего сообщения,
+        а не прерывает весь пакет: результат возвращается для каждого.
+        Длительности запросов к Bot API записываются в метрики после отправки,
+        чтобы не блокировать event loop обращениями к Redis.
+
+        :param messages: Список пар (chat_id, message)
+        :return: Список результатов (True/False) в порядке сообщений
+        """
+        self._ensure_started()
+        service = self.service
+
+        async def send_all():
+            semaphore = asyncio.Semaphore(settings.TELEGRAM_CONNECTION_POOL_SIZE)
+
+            async def send_one(chat_id, message):
+                async with semaphore:
+                    return await service.send_message(chat_id=chat_id, message=message)
+
+            results = await asyncio.gather(
+                *(send_one(chat_id, message) for chat_id, message in messages),
+                return_exceptions=True,
+            )
+            return results, service.take_request_durations()
+
+        sent, durations = self.run(send_all())
+        TELEGRAM_REQUEST_DURATION.observe_many(durations)
+
+        results = []
+        for result in sent:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка отправки сообщения: {result}")
+                result = False
+            results.append(result)
+        return results
+
+    def stop(self):
+        """
+        Закрытие HTTP-соединений и остановка event loop.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            owned = loop is not None and self._pid == os.getpid()
+            self._loop = self._thread = self._pid = None
+            service, self.service = self.service, None
+
+        if not owned:
+            return
+
+        bot = getattr(service, "bot", None)
+        if bot is not None:
+            future = asyncio.run_coroutine_threadsafe(bot.request.shutdown(), loop)
+            try:
+                future.result(settings.TELEGRAM_SEND_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Ошибка при закрытии Telegram клиента: {e}")
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(settings.TELEGRAM_SEND_TIMEOUT)
+        loop.close()
+
 
 # Создаем экземпляр сервиса
 telegram_service = TelegramService()
+
+# Отправитель создает event loop лениво, отдельно в каждом процессе воркера
+telegram_sender = TelegramSender()
+
+
+@worker_process_shutdown.connect
+def stop_telegram_sender(**kwargs):
+    """
+    Корректное закрытие соединений при остановке процесса воркера.
+    """
+    telegram_sender.stop()
@@ -1,17 +1,99 @@
-from datetime import time
+import asyncio
+import base64
+import csv
+import json
+import threading
+import time as time_module
+from datetime import UTC, datetime, time, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import urlencode, urlparse
 
+import fakeredis
+import httpx
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import TestCase
-from django.urls import reverse
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from redis.exceptions import RedisError
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.routers import DefaultRouter
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from telegram.error import RetryAfter, TelegramError
 
-from .models import Habit
+from users.views import UserProfileView
+
+from .admin import HabitAdmin
+from .dedup import get_duplicates_dropped
+from .delay_queue import reminder_queue
+from .etags import _habit_stats, user_habit_stats
+from .fake_bot_api import FakeBotAPI
+from .fast_read import habit_list_reader, public_habit_list_reader
+from .feed_cache import (aget_or_build_page, get_feed_generation,
+                         get_or_build_page)
+from .management.commands.benchmark_asgi import run_load
+from .management.commands.benchmark_reminders import (percentile,
+                                                      seed_benchmark_habits)
+from .metrics import REMINDER_LAG, REMINDER_OUTCOMES, render_metrics
+from .models import Habit, HabitTombstone, ReminderDelivery
+from .outbox import (REMINDER_DUPLICATE, REMINDER_MISSING_HABIT,
+                     REMINDER_NO_CHAT_ID, REMINDER_SENT,
+                     REMINDER_TELEGRAM_ERROR, claim_deliveries,
+                     create_deliveries, pending_deliveries)
+from .query_budget import view_query_budget
+from .rate_limit import (WAITER_TTL, WAITERS_KEY, TelegramRateLimiter,
+                         get_rate_limiter_stats)
+from .reminder_cache import habit_reminder_version, reminder_text_cache
+from .renderers import FastJSONRenderer
+from .scheduling import MINUTES_PER_DAY
+from .search import search_filter
+from .serializers import HabitSerializer, PublicHabitSerializer
+from .sync import make_sync_token
+from .tasks import (dispatch_due_reminders, drain_reminder_outbox, due_habits,
+                    prune_habit_tombstones, prune_reminder_deliveries,
+                    schedule_habit_reminders, schedule_reminder_shard,
+                    send_habit_reminder, send_habit_reminders_batch,
+                    shard_user_ranges)
+from .telegram_bot import TelegramSender, TelegramService
+from .views import (HabitSearchCursorPagination, HabitViewSet,
+                    PublicHabitViewSet)
 
 User = get_user_model()
 
 
+class HabitFactoryMixin:
+    """
+    Создание привычек с обязательными полями по умолчанию.
+    По умолчанию владелец — self.user; habit_defaults дополняет поля.
+    """
+
+    habit_defaults = {}
+
+    def create_habit(self, action="Выпить воду", user=None, **kwargs):
+        fields = {
+            "place": "Дом",
+            "time": time(8, 0),
+            "execution_time": 60,
+            **self.habit_defaults,
+            **kwargs,
+        }
+        return Habit.objects.create(user=user or self.user, action=action, **fields)
+
+
 class HabitModelTest(TestCase):
     """
     Тесты для модели привычки.
@@ -287,3 +369,2308 @@ class HabitPaginationTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 5)
         self.assertIsNone(response.data["next"])
+
+
+class HabitETagTest(APITestCase):
+    """
+    Тесты для условных GET-запросов к привычкам пользователя.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time=time(8, 0),
+            action="Выпить воду",
+            execution_time=60,
+        )
+        self.list_url = reverse("habits:habit-list")
+        self.detail_url = reverse("habits:habit-detail", args=[self.habit.id])
+
+    def test_not_modified_skips_main_query(self):
+        """Тест: совпадающий If-None-Match дает 304 без запросов к БД"""
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.has_header("ETag"))
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_update_etag(self):
+        """Тест: изменение, создание и удаление привычки меняют ETag"""
+        etags = [self.client.get(self.list_url)["ETag"]]
+
+        self.habit.action = "Выпить чай"
+        self.habit.save()
+        etags.append(self.client.get(self.list_url)["ETag"])
+
+        Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time=time(9, 0),
+            action="Зарядка",
+            execution_time=60,
+        )
+        etags.append(self.client.get(self.list_url)["ETag"])
+
+        self.habit.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etags[2])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etags.append(response["ETag"])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_stats_computed_before_change_are_not_cached(self):
+        """Тест: статистика, посчитанная до изменения, не читается после него"""
+
+        def change_during_compute(aggregate):
+            # Привычка меняется, пока параллельный запрос считает статистику
+            self.habit.save()
+            return _habit_stats(aggregate)
+
+        with patch("habits.etags._habit_stats", side_effect=change_during_compute):
+            stale = user_habit_stats(self.user.id)
+
+        self.assertNotEqual(user_habit_stats(self.user.id), stale)
+
+    def test_pages_have_different_etags(self):
+        """Тест: разные страницы списка имеют разные ETag"""
+        first = self.client.get(self.list_url)
+        second = self.client.get(self.list_url + "?page_size=1")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+
+class HabitBulkAPITest(HabitFactoryMixin, APITestCase):
+    """
+    Тесты массового создания, изменения и удаления привычек.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("habits:habit-bulk")
+        self.pleasant = self.create_habit("Съесть яблоко", is_pleasant=True)
+        self.habit = self.create_habit("Выпить воду", is_public=True)
+
+    def habit_data(self, action, **kwargs):
+        return {
+            "place": "Офис",
+            "time": "09:30",
+            "action": action,
+            "execution_time": 60,
+            "periodicity": 1,
+            **kwargs,
+        }
+
+    def test_bulk_create_update_delete(self):
+        """Тест: все изменения применяются одним запросом"""
+        obsolete = self.create_habit("Старая привычка")
+        response = self.client.post(
+            self.url,
+            {
+                "create": [
+                    self.habit_data("Зарядка", related_habit=self.pleasant.id),
+                    self.habit_data("Прогулка", reward="Кофе", is_public=True),
+                ],
+                "update": [{"id": self.habit.id, "time": "21:15", "place": "Парк"}],
+                "delete": [obsolete.id],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(len(response.data["created"]), 2)
+        self.assertEqual(response.data["created"][0]["related_habit"], self.pleasant.id)
+        self.assertEqual(response.data["updated"][0]["place"], "Парк")
+        self.assertEqual(response.data["deleted"], [obsolete.id])
+
+        created = Habit.objects.get(id=response.data["created"][0]["id"])
+        self.assertEqual(created.user, self.user)
+        self.assertEqual(created.fire_minute, 9 * 60 + 30)
+        self.assertIsNotNone(created.created_at)
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.place, "Парк")
+        self.assertEqual(self.habit.fire_minute, 21 * 60 + 15)
+        self.assertGreater(self.habit.updated_at, self.habit.created_at)
+        self.assertFalse(Habit.objects.filter(id=obsolete.id).exists())
+
+    def test_bulk_validation_errors_per_item(self):
+        """Тест: ошибки возвращаются по каждому элементу, ничего не записано"""
+        other = self.create_habit(
+            "Чужая", user=User.objects.create_user(username="other", password="x")
+        )
+        duplicate = self.create_habit("Дубль")
+        response = self.client.post(
+            self.url,
+            {
+                "create": [
+                    self.habit_data("Зарядка"),
+                    self.habit_data("Долго", execution_time=150),
+                    self.habit_data(
+                        "Связь", related_habit=self.pleasant.id, reward="Кофе"
+                    ),
+                    self.habit_data("Неприятная", related_habit=self.habit.id),
+                    self.habit_data("Нет связи", related_habit=999999),
+                ],
+                "update": [
+                    {"id": self.habit.id, "periodicity": 10},
+                    {"id": other.id, "place": "Парк"},
+                    {"place": "Без id"},
+                ],
+                "delete": [duplicate.id, duplicate.id],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        create_errors = response.data["create"]
+        self.assertEqual(create_errors[0], {})
+        self.assertIn("execution_time", create_errors[1])
+        self.assertIn("non_field_errors", create_errors[2])
+        self.assertIn("non_field_errors", create_errors[3])
+        self.assertIn("related_habit", create_errors[4])
+
+        update_errors = response.data["update"]
+        self.assertIn("periodicity", update_errors[0])
+        self.assertIn("id", update_errors[1])
+        self.assertIn("id", update_errors[2])
+        self.assertEqual(len(response.data["delete"]), 2)
+
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 3)
+        other.refresh_from_db()
+        self.assertEqual(other.place, "Дом")
+
+    def test_bulk_related_habit_state_in_batch(self):
+        """Тест: связь проверяется с учетом изменений и удалений в этом же запросе"""
+        response = self.client.post(
+            self.url,
+            {
+                "create": [
+                    self.habit_data("Связь", related_habit=self.habit.id),
+                    self.habit_data("Удаленная", related_habit=self.pleasant.id),
+                ],
+                "update": [{"id": self.habit.id, "is_pleasant": True}],
+                "delete": [self.pleasant.id],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["create"][0], {})
+        self.assertIn("related_habit", response.data["create"][1])
+
+    def test_bulk_validates_related_habits_in_one_query(self):
+        """Тест: связанные привычки пачки загружаются одним запросом"""
+        pleasant = [
+            self.create_habit(f"Приятная {i}", is_pleasant=True) for i in range(20)
+        ]
+        payload = {
+            "create": [
+                self.habit_data(f"Привычка {i}", related_habit=habit.id)
+                for i, habit in enumerate(pleasant)
+            ]
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        selects = [query for query in context if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 42)
+
+    def test_bulk_invalidates_feed_and_etag(self):
+        """Тест: массовые изменения сбрасывают кэш ленты и ETag"""
+        list_url = reverse("habits:habit-list")
+        etag = self.client.get(list_url)["ETag"]
+        generation = get_feed_generation()
+
+        response = self.client.post(
+            self.url,
+            {"update": [{"id": self.habit.id, "is_public": False}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(get_feed_generation(), generation)
+        self.assertNotEqual(self.client.get(list_url)["ETag"], etag)
+
+    def test_bulk_schedule_change_resets_next_due_date(self):
+        """Тест: смена периодичности сбрасывает дату напоминания, смена места нет"""
+        later = timezone.localdate() + timedelta(days=6)
+        Habit.objects.update(next_due_date=later)
+
+        response = self.client.post(
+            self.url,
+            {
+                "update": [
+                    {"id": self.habit.id, "periodicity": 2},
+                    {"id": self.pleasant.id, "place": "Кухня"},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.habit.refresh_from_db()
+        self.pleasant.refresh_from_db()
+        self.assertEqual(self.habit.next_due_date, timezone.localdate())
+        self.assertEqual(self.pleasant.next_due_date, later)
+
+    def test_bulk_request_limits(self):
+        """Тест: пустой и слишком большой запросы отклоняются"""
+        response = self.client.post(self.url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with override_settings(HABIT_BULK_MAX_ITEMS=2):
+            response = self.client.post(
+                self.url,
+                {"create": [self.habit_data(f"П{i}") for i in range(3)]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Habit.objects.count(), 2)
+
+
+class FastListReadTest(APITestCase):
+    """
+    Тесты быстрого чтения списков: ответ совпадает с ModelSerializer байт в байт.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="tést@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        pleasant = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time=time(7, 30, 15),
+            action='Съесть "яблоко" \t🍎',
+            is_pleasant=True,
+            execution_time=30,
+            is_public=True,
+        )
+        for i in range(6):
+            Habit.objects.create(
+                user=self.user,
+                place="Парк\\\u2028",
+                time=time(8, i, 0, 500 * i),
+                action=f"Привычка {i} \x01",
+                related_habit=pleasant if i % 2 else None,
+                reward=None if i % 2 else "Кофе",
+                periodicity=i + 1,
+                execution_time=60,
+                is_public=i % 3 == 0,
+            )
+
+    def serializer_content(self, serializer_class, queryset, **page):
+        data = serializer_class(queryset, many=True).data
+        if page:
+            data = {**page, "results": data}
+        return JSONRenderer().render(data)
+
+    def test_reader_fields_match_serializers(self):
+        """Тест: поля быстрого чтения совпадают с полями сериализаторов"""
+        for serializer_class, reader in (
+            (HabitSerializer, habit_list_reader),
+            (PublicHabitSerializer, public_habit_list_reader),
+        ):
+            readable = [
+                name
+                for name, field in serializer_class().fields.items()
+                if not field.write_only
+            ]
+            self.assertEqual([name for name, _, _ in reader.fields], readable)
+
+    def test_my_habits_list_bytes(self):
+        """Тест: список своих привычек совпадает с HabitSerializer"""
+        response = self.client.get(reverse("habits:habit-list") + "?page_size=100")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = self.serializer_content(
+            HabitSerializer,
+            Habit.objects.filter(user=self.user),
+            count=7,
+            next=None,
+            previous=None,
+        )
+        self.assertEqual(response.content, expected)
+
+    def test_public_list_bytes(self):
+        """Тест: лента (обе пагинации) совпадает с PublicHabitSerializer"""
+        queryset = Habit.objects.filter(is_public=True).order_by("-created_at", "-id")
+        response = self.client.get(reverse("habits:public-habit-list"))
+        expected = self.serializer_content(
+            PublicHabitSerializer, queryset, count=3, next=None, previous=None
+        )
+        self.assertEqual(response.content, expected)
+
+        response = self.client.get(
+            reverse("habits:public-habit-list") + "?pagination=cursor"
+        )
+        expected = self.serializer_content(
+            PublicHabitSerializer, queryset, next=None, previous=None
+        )
+        self.assertEqual(response.content, expected)
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_utc_datetimes_bytes(self):
+        """Тест: время в UTC форматируется как у DRF (суффикс Z)"""
+        queryset = Habit.objects.filter(user=self.user)
+        content = FastJSONRenderer().render(
+            habit_list_reader.to_representation(habit_list_reader.values(queryset))
+        )
+        self.assertEqual(content, self.serializer_content(HabitSerializer, queryset))
+        self.assertIn(b'Z"', content)
+
+    def test_renderer_falls_back_to_json_renderer(self):
+        """Тест: ленивые строки и отступы рендерятся стандартным JSONRenderer"""
+        data = {"detail": gettext_lazy("Not found."), "items": [1, None, True]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_benchmark_command(self):
+        """Тест: бенчмарк сравнивает оба способа и откатывает свои данные"""
+        out = StringIO()
+        call_command("benchmark_serializers", rows=5, repeat=1, stdout=out)
+        self.assertIn("HabitSerializer", out.getvalue())
+        self.assertIn("PublicHabitSerializer", out.getvalue())
+        self.assertEqual(Habit.objects.count(), 7)
+
+
+class SparseFieldsTest(APITestCase):
+    """
+    Тесты параметра ?fields= для привычек и ленты.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user,
+            place="Дом",
+            time=time(8, 0),
+            action="Выпить воду",
+            reward="Кофе",
+            execution_time=60,
+            is_public=True,
+        )
+
+    def get_with_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        habit_queries = [
+            query["sql"] for query in context if "habits_habit" in query["sql"]
+        ]
+        return response, habit_queries
+
+    def test_list_fields(self):
+        """Тест: список отдает и читает только запрошенные колонки"""
+        response, queries = self.get_with_queries(
+            reverse("habits:habit-list") + "?fields=time, action,id"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [{"id": self.habit.id, "time": "08:00:00", "action": "Выпить воду"}],
+        )
+        self.assertFalse([sql for sql in queries if "reward" in sql])
+
+    def test_retrieve_fields(self):
+        """Тест: детальный просмотр загружает только запрошенные колонки"""
+        url = reverse("habits:habit-detail", args=[self.habit.id]) + "?fields=action"
+        response, queries = self.get_with_queries(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"action": "Выпить воду"})
+        self.assertFalse([sql for sql in queries if "reward" in sql])
+
+        url = reverse("habits:public-habit-detail", args=[self.habit.id])
+        response = self.client.get(url + "?fields=user_email,action")
+        self.assertEqual(
+            response.data, {"user_email": "test@example.com", "action": "Выпить воду"}
+        )
+
+    def test_public_feed_fields(self):
+        """Тест: лента с ?fields= в обеих пагинациях"""
+        url = reverse("habits:public-habit-list") + "?fields=action,user_email"
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data["results"],
+            [{"user_email": "test@example.com", "action": "Выпить воду"}],
+        )
+        response = self.client.get(url + "&pagination=cursor&page_size=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data["results"][0]), ["user_email", "action"])
+
+    def test_unknown_fields_rejected_without_queries(self):
+        """Тест: неизвестные поля отклоняются без запросов к базе"""
+        for url in (
+            reverse("habits:habit-list") + "?fields=id,password",
+            reverse("habits:habit-detail", args=[self.habit.id]) + "?fields=user",
+            reverse("habits:public-habit-list") + "?fields=reward",
+            reverse("habits:public-habit-list") + "?fields=",
+        ):
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn("fields", response.data)
+
+    def test_writes_ignore_fields(self):
+        """Тест: запись возвращает полный ответ независимо от ?fields="""
+        url = reverse("habits:habit-detail", args=[self.habit.id]) + "?fields=id"
+        response = self.client.patch(url, {"place": "Парк"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["place"], "Парк")
+        self.assertIn("reward", response.data)
+
+
+class HabitExportTest(APITestCase):
+    """
+    Тесты потоковой выгрузки привычек в NDJSON и CSV.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            Habit.objects.create(
+                user=self.user if i < 3 else other,
+                place="Дом, кухня",
+                time=time(8, i),
+                action=f'Привычка "{i}"',
+                reward=None if i % 2 else "Кофе",
+                execution_time=60,
+                is_public=i != 1,
+            )
+
+    def test_ndjson_export_matches_list(self):
+        """Тест: NDJSON содержит свои привычки в формате списка, None как null"""
+        response = self.client.get(
+            reverse("habits:habit-export", args=["ndjson"]), HTTP_ACCEPT="*/*"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="habits.ndjson"', response["Content-Disposition"])
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        listed = self.client.get(reverse("habits:habit-list") + "?page_size=100")
+        expected = sorted(listed.json()["results"], key=lambda row: row["id"])
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_csv_export_public_feed(self):
+        """Тест: CSV ленты с заголовком, пустыми значениями и ?fields="""
+        url = reverse("habits:public-habit-export", args=["csv"])
+        response = self.client.get(url + "?fields=id,user_email,action,is_pleasant")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ["id", "user_email", "action", "is_pleasant"])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1][1:], ["test@example.com", 'Привычка "0"', "false"])
+
+        response = self.client.get(url)
+        rows = list(
+            csv.DictReader(StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(rows[0]["place"], "Дом, кухня")
+        self.assertEqual(rows[0]["periodicity"], "1")
+
+    @override_settings(HABIT_EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_in_chunks(self):
+        """Тест: заголовок уходит до запроса, строки идут пачками"""
+        response = self.client.get(reverse("habits:public-habit-export", args=["csv"]))
+        content = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            self.assertTrue(next(content).startswith(b"id,"))
+        chunks = list(content)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(sum(chunk.count(b"\n") for chunk in chunks), 4)
+
+    def test_unknown_export_format(self):
+        """Тест: неизвестный формат выгрузки"""
+        response = self.client.get(reverse("habits:habit-list") + "export/xml/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HabitSearchTest(HabitFactoryMixin, APITestCase):
+    """
+    Тесты поиска по публичным привычкам и в админке.
+    """
+
+    habit_defaults = {"is_public": True}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("habits:public-habit-list")
+
+    def test_search_uses_relevance_cursor(self):
+        """Тест: результаты поиска всегда пагинируются курсором по rank"""
+        view = PublicHabitViewSet()
+        view.request = Request(APIRequestFactory().get(self.url, {"search": "вода"}))
+        self.assertIsInstance(view.paginator, HabitSearchCursorPagination)
+        self.assertEqual(view.paginator.ordering, ("-rank", "-id"))
+
+        view = PublicHabitViewSet()
+        view.request = Request(APIRequestFactory().get(self.url, {"search": " "}))
+        self.assertNotIsInstance(view.paginator, HabitSearchCursorPagination)
+
+    def admin_search(self, search_term):
+        request = APIRequestFactory().get("/admin/habits/habit/", {"q": search_term})
+        queryset, duplicates = HabitAdmin(Habit, admin.site).get_search_results(
+            request, Habit.objects.all(), search_term
+        )
+        self.assertFalse(duplicates)
+        return list(queryset)
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_admin_search_partial_matches(self):
+        """Тест: админка находит части email, действия и места"""
+        meditation = self.create_habit("Медитация", place="Парк")
+        ivan = User.objects.create_user(
+            username="ivan", email="ivan@corp.org", password="testpass123"
+        )
+        run = self.create_habit("Бег", user=ivan, place="Стадион")
+
+        self.assertEqual(self.admin_search("example.com"), [meditation])
+        self.assertEqual(self.admin_search(" TEST@example.com "), [meditation])
+        self.assertEqual(self.admin_search("ivan"), [run])
+        self.assertEqual(self.admin_search("Медит"), [meditation])
+        self.assertEqual(self.admin_search("стадион"), [run])
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_admin_search_ranked(self):
+        """Тест: в админке совпадение в действии выше совпадения в месте"""
+        in_place = self.create_habit("Гулять", place="Магазин книг")
+        in_action = self.create_habit("Читать книгу")
+
+        self.assertEqual(self.admin_search("книга"), [in_action, in_place])
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_full_text_search(self):
+        """Тест: полнотекстовый поиск с учетом словоформ, только публичные"""
+        water = self.create_habit("Выпить стакан воды")
+        run = self.create_habit("Пробежка", place="В парке")
+        self.create_habit("Выпить воды перед сном", is_public=False)
+
+        response = self.client.get(self.url, {"search": "вода"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [water.id])
+
+        response = self.client.get(self.url, {"search": "парк"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [run.id])
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_fuzzy_search(self):
+        """Тест: опечатки находятся по триграммному сходству"""
+        habit = self.create_habit("Meditation", place="Garden")
+        self.create_habit("Reading")
+        response = self.client.get(self.url, {"search": "meditaton"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [habit.id])
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_search_ranking_and_cursor_pages(self):
+        """Тест: совпадение в действии выше совпадения в месте, страницы курсором"""
+        in_place = self.create_habit("Гулять", place="Магазин книг")
+        in_action = self.create_habit("Читать книгу")
+
+        response = self.client.get(self.url, {"search": "книга", "page_size": 1})
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]], [in_action.id]
+        )
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([row["id"] for row in response.data["results"]], [in_place.id])
+        self.assertIsNone(response.data["next"])
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_search_cursor_with_equal_rank(self):
+        """Тест: результаты с одинаковой релевантностью не теряются между страницами"""
+        habits = [self.create_habit("Читать книгу") for _ in range(3)]
+
+        ids = []
+        response = self.client.get(self.url, {"search": "книга", "page_size": 1})
+        while True:
+            ids.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+        self.assertEqual(ids, sorted((habit.id for habit in habits), reverse=True))
+
+    @skipUnless(connection.vendor == "postgresql", "Поиск работает на PostgreSQL")
+    def test_search_vector_maintained_on_bulk_writes(self):
+        """Тест: поисковый вектор пересчитывается и при update() без save()"""
+        habit = self.create_habit("Выпить воду")
+        Habit.objects.filter(id=habit.id).update(action="Медитация")
+
+        response = self.client.get(self.url, {"search": "медитация"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [habit.id])
+        self.assertEqual(
+            self.client.get(self.url, {"search": "воду"}).data["results"], []
+        )
+
+        self.assertEqual(self.admin_search("медитация"), [habit])
+
+
+class HabitSyncTest(HabitFactoryMixin, APITestCase):
+    """
+    Тесты дельта-синхронизации привычек.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("habits:habit-sync")
+        self.habits = [self.create_habit(f"Привычка {i}") for i in range(3)]
+        self.create_habit("Чужая", user=self.other)
+        # Привычки созданы давно, вне окна перекрытия токена
+        Habit.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_full_sync(self):
+        """Тест: без токена возвращаются все свои привычки и новый токен"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {row["id"] for row in response.data["changed"]},
+            {habit.id for habit in self.habits},
+        )
+        self.assertEqual(response.data["deleted"], [])
+        self.assertFalse(response.data["reset"])
+        self.assertTrue(response.data["token"])
+
+    def test_delta_sync(self):
+        """Тест: после токена приходят только изменения и удаления"""
+        token = self.client.get(self.url).data["token"]
+        response = self.client.get(self.url, {"since": token})
+        self.assertEqual(response.data["changed"], [])
+        self.assertEqual(response.data["deleted"], [])
+
+        updated, deleted, _ = self.habits
+        self.client.patch(
+            reverse("habits:habit-detail", args=[updated.id]), {"place": "Парк"}
+        )
+        self.client.delete(reverse("habits:habit-detail", args=[deleted.id]))
+        created = self.client.post(
+            reverse("habits:habit-list"),
+            {"place": "Офис", "time": "09:00", "action": "Новая", "execution_time": 60},
+        ).data
+        self.create_habit("Чужая новая", user=self.other)
+
+        response = self.client.get(self.url, {"since": token})
+        self.assertEqual(
+            [row["id"] for row in response.data["changed"]], [updated.id, created["id"]]
+        )
+        self.assertEqual(response.data["changed"][0]["place"], "Парк")
+        self.assertEqual(response.data["deleted"], [deleted.id])
+        self.assertNotEqual(response.data["token"], token)
+
+    def test_deleted_related_habit_resends_linked(self):
+        """Тест: удаление связанной привычки снова отдает привычки, ссылавшиеся на нее"""
+        pleasant, linked, _ = self.habits
+        Habit.objects.filter(id=pleasant.id).update(is_pleasant=True)
+        Habit.objects.filter(id=linked.id).update(related_habit=pleasant)
+        token = self.client.get(self.url).data["token"]
+
+        self.client.delete(reverse("habits:habit-detail", args=[pleasant.id]))
+
+        response = self.client.get(self.url, {"since": token})
+        self.assertEqual([row["id"] for row in response.data["changed"]], [linked.id])
+        self.assertIsNone(response.data["changed"][0]["related_habit"])
+        self.assertEqual(response.data["deleted"], [pleasant.id])
+
+    def test_sync_with_fields(self):
+        """Тест: ?fields= ограничивает поля изменений"""
+        response = self.client.get(self.url, {"fields": "id,updated_at"})
+        self.assertEqual(list(response.data["changed"][0]), ["id", "updated_at"])
+
+    def test_invalid_token(self):
+        """Тест: поддельный токен отклоняется"""
+        response = self.client.get(self.url, {"since": "1700000000"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("since", response.data)
+
+    def test_expired_token_resets(self):
+        """Тест: токен старше журнала удалений требует полной синхронизации"""
+        old = timezone.now() - timedelta(
+            days=settings.HABIT_SYNC_TOMBSTONE_TTL_DAYS + 1
+        )
+        response = self.client.get(self.url, {"since": make_sync_token(old)})
+        self.assertTrue(response.data["reset"])
+        self.assertEqual(len(response.data["changed"]), 3)
+
+    def test_tombstones(self):
+        """Тест: журнал удалений, удаление пользователя и очистка"""
+        habit_ids = [habit.id for habit in self.habits]
+        self.habits[0].delete()
+        self.client.post(
+            reverse("habits:habit-bulk"),
+            {"delete": [self.habits[1].id, self.habits[2].id]},
+            format="json",
+        )
+        self.assertEqual(
+            sorted(HabitTombstone.objects.values_list("user_id", "habit_id")),
+            [(self.user.id, habit_id) for habit_id in habit_ids],
+        )
+        self.user.delete()
+        self.assertFalse(HabitTombstone.objects.exists())
+
+        HabitTombstone.objects.create(user=self.other, habit_id=1)
+        HabitTombstone.objects.create(
+            user=self.other,
+            habit_id=2,
+            deleted_at=timezone.now()
+            - timedelta(days=settings.HABIT_SYNC_TOMBSTONE_TTL_DAYS + 1),
+        )
+        self.assertEqual(prune_habit_tombstones(), 1)
+        self.assertEqual(
+            list(HabitTombstone.objects.values_list("habit_id", flat=True)), [1]
+        )
+
+
+class PublicHabitCursorPaginationTest(APITestCase):
+    """
+    Тесты для курсорной пагинации публичных привычек.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habits = [
+            Habit.objects.create(
+                user=self.user,
+                place=f"Место {i}",
+                time=time(8, 0),
+                action=f"Действие {i}",
+                execution_time=60,
+                is_public=True,
+            )
+            for i in range(12)
+        ]
+        self.list_url = reverse("habits:public-habit-list")
+
+    def test_walks_all_pages_without_count(self):
+        """Тест: курсор проходит все страницы по порядку без COUNT(*)"""
+        ids = []
+        url = self.list_url + "?pagination=cursor"
+        with CaptureQueriesContext(connection) as context:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn("count", response.data)
+                ids.extend(habit["id"] for habit in response.data["results"])
+                url = response.data["next"]
+
+        expected = sorted(
+            self.habits, key=lambda habit: (habit.created_at, habit.id), reverse=True
+        )
+        self.assertEqual(ids, [habit.id for habit in expected])
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_equal_created_at_walks_both_ways(self):
+        """Тест: строки с одинаковым created_at читаются по id, без OFFSET"""
+        Habit.objects.update(created_at=self.habits[0].created_at)
+        expected = sorted(habit.id for habit in self.habits)[::-1]
+
+        ids, pages = [], []
+        url = self.list_url + "?pagination=cursor"
+        with CaptureQueriesContext(connection) as context:
+            while url:
+                response = self.client.get(url)
+                pages.append(response.data)
+                ids.extend(habit["id"] for habit in response.data["results"])
+                url = response.data["next"]
+        self.assertEqual(ids, expected)
+        self.assertFalse(
+            any("OFFSET" in query["sql"] for query in context.captured_queries)
+        )
+
+        ids = []
+        url = pages[-1]["previous"]
+        while url:
+            response = self.client.get(url)
+            ids[:0] = [habit["id"] for habit in response.data["results"]]
+            url = response.data["previous"]
+        self.assertEqual(ids, expected[: -len(pages[-1]["results"])])
+
+    def test_invalid_cursor(self):
+        """Тест: поврежденный курсор дает 404, а не ошибку сервера"""
+        cursor = base64.b64encode(b"p=not-a-date%7C5").decode()
+        response = self.client.get(
+            self.list_url, {"pagination": "cursor", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_is_default(self):
+        """Тест: без параметра остается постраничная пагинация"""
+        response = self.client.get(self.list_url + "?page=3")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class PublicFeedCacheTest(HabitFactoryMixin, APITestCase):
+    """
+    Тесты для кэша ленты публичных привычек.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit = self.create_habit("Пробежка", is_public=True)
+        self.list_url = reverse("habits:public-habit-list")
+
+    def actions(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [habit["action"] for habit in response.data["results"]]
+
+    def test_second_request_served_from_cache(self):
+        """Тест: повторный запрос не обращается к таблице привычек"""
+        first = self.client.get(self.list_url)
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(self.list_url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertFalse(
+            any('"habits_habit"' in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_public_changes_invalidate_feed(self):
+        """Тест: изменение публичной привычки или публичности сбрасывает кэш"""
+        self.assertEqual(self.actions(), ["Пробежка"])
+
+        self.habit.action = "Плавание"
+        self.habit.save()
+        self.assertEqual(self.actions(), ["Плавание"])
+
+        private = self.create_habit("Чтение", is_public=False)
+        generation = get_feed_generation()
+        private.is_public = True
+        private.save()
+        self.assertNotEqual(get_feed_generation(), generation)
+        self.assertEqual(self.actions(), ["Чтение", "Плавание"])
+
+        habit = Habit.objects.get(id=self.habit.id)
+        habit.is_public = False
+        habit.save()
+        self.assertEqual(self.actions(), ["Чтение"])
+
+        private.delete()
+        self.assertEqual(self.actions(), [])
+
+    def test_private_changes_keep_feed(self):
+        """Тест: изменения приватных привычек не сбрасывают кэш"""
+        generation = get_feed_generation()
+        private = self.create_habit("Чтение", is_public=False)
+        private = Habit.objects.get(id=private.id)
+        private.action = "Письмо"
+        private.save()
+        self.assertEqual(get_feed_generation(), generation)
+
+    def test_concurrent_misses_build_page_once(self):
+        """Тест: одновременные промахи строят страницу один раз"""
+        calls = []
+
+        def build():
+            calls.append(1)
+            time_module.sleep(0.2)
+            return {"results": []}
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_build_page("page", build))
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"results": []}] * 3)
+
+    async def test_concurrent_async_misses_build_page_once(self):
+        """Тест: одновременные асинхронные промахи строят страницу один раз"""
+        calls = []
+
+        async def build():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return {"results": []}
+
+        results = await asyncio.gather(
+            *(aget_or_build_page("page", build) for _ in range(3))
+        )
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"results": []}] * 3)
+
+
+def async_urlconf():
+    """
+    URLconf API с view, собранными при ASYNC_VIEWS=True, как под config.asgi.
+    """
+    with override_settings(ASYNC_VIEWS=True):
+        router = DefaultRouter()
+        router.register(r"my-habits", HabitViewSet, basename="habit")
+        router.register(r"public", PublicHabitViewSet, basename="public-habit")
+        users = [path("profile/", UserProfileView.as_view(), name="profile")]
+        urlpatterns = [
+            path("api/habits/", include((router.urls, "habits"))),
+            path("api/users/", include((users, "users"))),
+        ]
+    return type("AsyncURLConf", (), {"urlpatterns": urlpatterns})
+
+
+class AsyncViewTest(APITestCase):
+    """
+    Тесты асинхронных view через ASGI (AsyncClient).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(ROOT_URLCONF=async_urlconf()))
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.headers = {
+            "Authorization": f"Token {Token.objects.create(user=self.user).key}"
+        }
+        for i in range(3):
+            Habit.objects.create(
+                user=self.user,
+                place="Дом",
+                time=time(8, i),
+                action=f"Привычка {i}",
+                execution_time=60,
+                is_public=True,
+            )
+        self.list_url = reverse("habits:habit-list")
+        self.public_url = reverse("habits:public-habit-list")
+        self.profile_url = reverse("users:profile")
+
+    def test_read_views_are_async(self):
+        """Тест: под ASGI view асинхронные, под WSGI — синхронные"""
+        for url in (self.list_url, self.public_url, self.profile_url):
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+            self.assertFalse(
+                iscoroutinefunction(resolve(url, urlconf="config.urls").func), url
+            )
+
+    async def test_list_with_etag(self):
+        """Тест: список и ETag через асинхронный ORM"""
+        response = await self.async_client.get(
+            self.list_url, {"page_size": 2}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIn("page=2", data["next"])
+
+        response = await self.async_client.get(
+            self.list_url,
+            {"page_size": 2},
+            headers={**self.headers, "If-None-Match": response["ETag"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.get(
+            self.list_url, {"page": 9}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_public_feed_and_profile(self):
+        """Тест: лента (из кэша и курсором) и профиль"""
+        for params in ({}, {}, {"pagination": "cursor"}, {"page": 2, "page_size": 2}):
+            response = await self.async_client.get(
+                self.public_url, params, headers=self.headers
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK, params)
+            self.assertTrue(response.json()["results"], params)
+
+        response = await self.async_client.get(self.profile_url, headers=self.headers)
+        self.assertEqual(response.json()["email"], "test@example.com")
+
+    @override_settings(HABIT_EXPORT_CHUNK_SIZE=1)
+    async def test_export_streams_async(self):
+        """Тест: выгрузка под ASGI отдается асинхронным итератором по строкам"""
+        url = reverse("habits:habit-export", args=["ndjson"])
+        response = await self.async_client.get(url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(
+            [json.loads(chunk)["action"] for chunk in chunks],
+            ["Привычка 0", "Привычка 1", "Привычка 2"],
+        )
+
+        url = reverse("habits:habit-export", args=["csv"])
+        response = await self.async_client.get(url, headers=self.headers)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 4)
+
+    async def test_sync_handlers_and_errors(self):
+        """Тест: запись, аутентификация и ошибки через асинхронный dispatch"""
+        response = await self.async_client.post(
+            self.list_url,
+            {"place": "Офис", "time": "09:00", "action": "Новая", "execution_time": 60},
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await self.async_client.patch(
+            self.profile_url,
+            {"first_name": "Иван"},
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(response.json()["first_name"], "Иван")
+
+        response = await self.async_client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.delete(
+            self.profile_url, headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(QUERY_COUNT_HEADER=True)
+    async def test_query_count_under_asgi(self):
+        """Тест: запросы асинхронного ORM попадают в счетчик middleware"""
+        response = await self.async_client.get(self.list_url, headers=self.headers)
+        self.assertEqual(response["X-Query-Budget"], "4")
+        self.assertEqual(response["X-Query-Count"], "4")
+
+    def test_benchmark_load(self):
+        """Тест: нагрузка бенчмарка ASGI считает запросы и ошибки"""
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(500 if request.url.path == "/fail/" else 200)
+        )
+
+        async def load():
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await run_load(client, ("/ok/", "/fail/"), 10, 3)
+
+        latencies, errors, duration = asyncio.run(load())
+        self.assertEqual(len(latencies), 10)
+        self.assertEqual(errors, 5)
+        self.assertGreater(duration, 0)
+
+
+class FakeRedisMixin:
+    """
+    Подменяет общий клиент Redis на fakeredis.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch("habits.redis_client._client", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class HabitReminderSchedulingTest(HabitFactoryMixin, FakeRedisMixin, TestCase):
+    """
+    Тесты для поминутного планирования напоминаний.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123",
+            telegram_chat_id=123456,
+        )
+
+    def local_dt(self, hour, minute, second=0, days=0):
+        day = timezone.localdate() + timedelta(days=days)
+        return timezone.make_aware(datetime.combine(day, time(hour, minute, second)))
+
+    def run_scheduler_at(self, now):
+        """
+        Запуск планировщика и извлечение всего, что он положил в очередь.
+        """
+        with patch("django.utils.timezone.now", return_value=now), patch(
+            "habits.tasks.schedule_reminder_shard.delay",
+            side_effect=schedule_reminder_shard,
+        ), self.captureOnCommitCallbacks(execute=True):
+            schedule_habit_reminders()
+        return reminder_queue.pop_due(float("inf"), 1000)
+
+    def test_fire_minute_follows_time(self):
+        """Тест: минута напоминания пересчитывается при сохранении"""
+        habit = self.create_habit(time=time(8, 30))
+        self.assertEqual(habit.fire_minute, 8 * 60 + 30)
+
+        habit.time = time(21, 5)
+        habit.save(update_fields=["time"])
+        habit.refresh_from_db()
+        self.assertEqual(habit.fire_minute, 21 * 60 + 5)
+
+    def test_schedules_only_next_minute(self):
+        """Тест: планируются только привычки следующей минуты"""
+        due = self.create_habit(time=time(8, 1))
+        self.create_habit(time=time(8, 2))
+        self.create_habit(time=time(8, 0))
+
+        queued = self.run_scheduler_at(self.local_dt(8, 0, 30))
+
+        fire_ts = int(self.local_dt(8, 1).timestamp())
+        self.assertEqual(queued, [(due.id, fire_ts)])
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.habit_id, due.id)
+        self.assertEqual(delivery.chat_id, 123456)
+        self.assertEqual(delivery.fire_at, self.local_dt(8, 1))
+
+    def test_window_wraps_past_midnight(self):
+        """Тест: окно планирования переходит через полночь"""
+        due = self.create_habit(time=time(0, 0))
+        self.create_habit(time=time(23, 59))
+
+        queued = self.run_scheduler_at(self.local_dt(23, 59, 10))
+
+        fire_ts = int(self.local_dt(0, 0, days=1).timestamp())
+        self.assertEqual(queued, [(due.id, fire_ts)])
+
+    def test_skips_users_without_telegram(self):
+        """Тест: привычки пользователей без Telegram не планируются"""
+        other_user = User.objects.create_user(
+            username="otheruser", email="other@example.com", password="otherpass123"
+        )
+        self.create_habit(time=time(8, 1), user=other_user)
+
+        self.assertEqual(self.run_scheduler_at(self.local_dt(8, 0)), [])
+
+    def test_respects_periodicity(self):
+        """Тест: привычка раз в 2 дня не планируется в промежуточный день"""
+        habit = self.create_habit(time=time(8, 1), periodicity=2)
+
+        counts = [
+            len(self.run_scheduler_at(self.local_dt(8, 0, days=day)))
+            for day in range(4)
+        ]
+
+        self.assertEqual(counts, [1, 0, 1, 0])
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_date, timezone.localdate() + timedelta(days=4))
+
+    def test_schedule_change_resets_next_due_date(self):
+        """Тест: после смены периодичности напоминание идет по новому расписанию"""
+        habit = self.create_habit(time=time(8, 1), periodicity=7)
+        self.run_scheduler_at(self.local_dt(8, 0))
+
+        habit.refresh_from_db()
+        habit.place = "Парк"
+        habit.save()
+        self.assertEqual(habit.next_due_date, timezone.localdate() + timedelta(days=7))
+
+        habit.periodicity = 1
+        habit.save(update_fields=["periodicity"])
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_date, timezone.localdate())
+        self.assertEqual(len(self.run_scheduler_at(self.local_dt(8, 0, days=1))), 1)
+
+    def test_repeated_run_does_not_enqueue_duplicates(self):
+        """Тест: повторный запуск в той же минуте не ставит дубликаты"""
+        habit = self.create_habit(time=time(8, 1))
+
+        first = self.run_scheduler_at(self.local_dt(8, 0, 5))
+        Habit.objects.filter(id=habit.id).update(next_due_date=timezone.localdate())
+        second = self.run_scheduler_at(self.local_dt(8, 0, 40))
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+        self.assertEqual(get_duplicates_dropped(), 1)
+
+    @override_settings(HABIT_REMINDER_SHARDS=3)
+    def test_shards_split_habits_by_user(self):
+        """Тест: каждый шард планирует только привычки своего диапазона user_id"""
+        for i in range(6):
+            user = User.objects.create_user(
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+                password="testpass123",
+                telegram_chat_id=1000 + i,
+            )
+            self.create_habit(time=time(8, 1), user=user)
+        fire_ts = int(self.local_dt(8, 1).timestamp())
+
+        with patch("habits.tasks.schedule_reminder_shard.delay") as delay:
+            schedule_habit_reminders()
+        ranges = [call.args[:2] for call in delay.call_args_list]
+        self.assertEqual(len(ranges), 3)
+        self.assertIsNone(ranges[-1][1])
+
+        scheduled = []
+        for first_user_id, last_user_id in ranges:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_reminder_shard(first_user_id, last_user_id, fire_ts)
+            queued = [
+                habit_id for habit_id, _ in reminder_queue.pop_due(float("inf"), 1000)
+            ]
+            for user_id in Habit.objects.filter(id__in=queued).values_list(
+                "user_id", flat=True
+            ):
+                self.assertGreaterEqual(user_id, first_user_id)
+                if last_user_id is not None:
+                    self.assertLessEqual(user_id, last_user_id)
+            scheduled += queued
+        self.assertCountEqual(scheduled, Habit.objects.values_list("id", flat=True))
+
+    def test_shard_user_ranges_cover_all_ids(self):
+        """Тест: диапазоны шардов идут подряд, последний без верхней границы"""
+        self.assertEqual(shard_user_ranges(3, 7), [(0, 2), (3, 5), (6, None)])
+        self.assertEqual(shard_user_ranges(2, None), [(0, 0), (1, None)])
+
+    def test_failed_batch_is_rolled_back(self):
+        """Тест: сбой при создании доставок не переносит дату и не ставит в очередь"""
+        habit = self.create_habit(time=time(8, 1))
+        fire_ts = int(self.local_dt(8, 1).timestamp())
+
+        with patch(
+            "habits.tasks.create_deliveries", side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            schedule_reminder_shard(habit.user_id, None, fire_ts)
+
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_due_date, timezone.localdate())
+        self.assertEqual(len(reminder_queue), 0)
+
+        # Повтор задачи с тем же моментом отправки ставит напоминание
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(schedule_reminder_shard(habit.user_id, None, fire_ts), 1)
+        self.assertEqual(ReminderDelivery.objects.get().habit_id, habit.id)
+        self.assertEqual(reminder_queue.pop_due(fire_ts, 10), [(habit.id, fire_ts)])
+
+
+class ReminderDelayQueueTest(FakeRedisMixin, TestCase):
+    """
+    Тесты для отложенной очереди напоминаний в Redis.
+    """
+
+    def test_pops_only_due_entries_in_order(self):
+        """Тест: извлекаются только наступившие напоминания, по времени"""
+        reminder_queue.push([3], 300)
+        reminder_queue.push([1, 2], 100)
+
+        self.assertEqual(reminder_queue.pop_due(200, 10), [(1, 100), (2, 100)])
+        self.assertEqual(reminder_queue.pop_due(200, 10), [])
+        self.assertEqual(len(reminder_queue), 1)
+
+    def test_dispatch_sends_due_batches(self):
+        """Тест: наступившие напоминания передаются в задачи отправки"""
+        now_ts = int(timezone.now().timestamp())
+        reminder_queue.push([1, 2], now_ts - 60)
+        reminder_queue.push([3], now_ts - 5)
+        reminder_queue.push([4], now_ts + 60)
+
+        with patch("habits.tasks.send_habit_reminders_batch.delay") as delay:
+            self.assertEqual(dispatch_due_reminders(), 3)
+
+        self.assertEqual(
+            sorted(call.args for call in delay.call_args_list),
+            [([1, 2], now_ts - 60), ([3], now_ts - 5)],
+        )
+        self.assertEqual(len(reminder_queue), 1)
+
+
+class RecordingTelegramService(TelegramService):
+    """
+    TelegramService с заглушкой Bot API, запоминающей loop и поток каждой
+    отправки.
+    """
+
+    failing_chat_id = None
+    hanging_chat_id = None
+
+    def __init__(self):
+        super().__init__(rate_limiter=False)
+        self.bot = SimpleNamespace(
+            send_message=self.send_to_bot,
+            request=SimpleNamespace(shutdown=self.shutdown_request),
+        )
+        self.sent = []
+
+    async def send_to_bot(self, chat_id, text, parse_mode):
+        self.sent.append(
+            (chat_id, text, asyncio.get_running_loop(), threading.get_ident())
+        )
+        if chat_id == self.hanging_chat_id:
+            await asyncio.Event().wait()
+        if chat_id == self.failing_chat_id:
+            raise TelegramError("Chat not found")
+
+    async def shutdown_request(self):
+        pass
+
+    def take_request_durations(self):
+        return []
+
+
+class TelegramFormatTest(TestCase):
+    """
+    Тесты для форматирования напоминаний.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username="format", email="format@example.com", password="testpass123"
+        )
+        self.habit = Habit.objects.create(
+            user=user,
+            place="Дом",
+            time=time(8, 0),
+            action="Выпить воду",
+            execution_time=60,
+            reward="Чай",
+        )
+        self.service = TelegramService(rate_limiter=False)
+
+    def test_single_reminder(self):
+        """Тест: одиночное напоминание с заголовком и описанием"""
+        message = self.service.format_habit_reminder(self.habit)
+        self.assertEqual(
+            message,
+            "🔔 <b>Напоминание о привычке!</b>\n\n"
+            "⏰ Время: 08:00\n"
+            "📍 Место: Дом\n"
+            "✨ Действие: Выпить воду\n"
+            "⏱ Время на выполнение: 60 сек.\n"
+            "\n🎁 Вознаграждение: Чай",
+        )
+
+    def test_digest(self):
+        """Тест: сводка содержит все привычки под одним заголовком"""
+        details = self.service.format_habit_details(self.habit)
+        message = self.service.format_reminders([details, details])
+        self.assertTrue(message.startswith("🔔 <b>Напоминания о привычках (2)</b>"))
+        self.assertEqual(message.count("✨ Действие: Выпить воду"), 2)
+
+
+class TelegramServiceTest(TestCase):
+    """
+    Тесты для отправки сообщений через Bot API.
+    """
+
+    def setUp(self):
+        self.service = TelegramService(rate_limiter=False)
+
+    def test_retry_after_wait_not_in_request_duration(self):
+        """Тест: ожидание RetryAfter не входит в длительность запроса"""
+        calls = []
+
+        async def send_message(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise RetryAfter(timedelta(seconds=0.3))
+
+        self.service.bot = SimpleNamespace(send_message=send_message)
+
+        self.assertTrue(asyncio.run(self.service.send_message(1, "text")))
+        durations = self.service.take_request_durations()
+        self.assertEqual(len(durations), 2)
+        self.assertLess(max(durations), 0.3)
+
+    @override_settings(TELEGRAM_SEND_TIMEOUT=0.1)
+    def test_hanging_request_times_out(self):
+        """Тест: зависший запрос к Bot API прерывается по таймауту"""
+
+        async def send_message(**kwargs):
+            await asyncio.Event().wait()
+
+        self.service.bot = SimpleNamespace(send_message=send_message)
+
+        self.assertFalse(asyncio.run(self.service.send_message(1, "text")))
+
+    @override_settings(TELEGRAM_SEND_TIMEOUT=0.1)
+    def test_rate_limit_wait_not_in_send_timeout(self):
+        """Тест: ожидание rate limiter'а не входит в таймаут отправки"""
+
+        async def acquire(chat_id):
+            await asyncio.sleep(0.3)
+
+        async def send_message(**kwargs):
+            pass
+
+        self.service.rate_limiter = SimpleNamespace(acquire=acquire)
+        self.service.bot = SimpleNamespace(send_message=send_message)
+
+        self.assertTrue(asyncio.run(self.service.send_message(1, "text")))
+
+
+class TelegramSenderTest(TestCase):
+    """
+    Тесты для долгоживущего отправителя сообщений.
+    """
+
+    def setUp(self):
+        self.sender = TelegramSender(service_factory=RecordingTelegramService)
+        self.addCleanup(self.sender.stop)
+
+    def test_reuses_event_loop_between_sends(self):
+        """Тест: все отправки выполняются в одном фоновом event loop"""
+        self.assertTrue(self.sender.send_message(1, "first"))
+        self.assertTrue(self.sender.send_message(2, "second"))
+
+        (_, _, loop1, thread1), (_, _, loop2, thread2) = self.sender.service.sent
+        self.assertIs(loop1, loop2)
+        self.assertEqual(thread1, thread2)
+        self.assertNotEqual(thread1, threading.get_ident())
+
+    def test_stop_closes_loop(self):
+        """Тест: остановка закрывает loop, следующая отправка создает новый"""
+        self.sender.send_message(1, "first")
+        first_loop = self.sender.service.sent[0][2]
+
+        self.sender.stop()
+        self.assertTrue(first_loop.is_closed())
+
+        self.sender.send_message(1, "again")
+        self.assertIsNot(self.sender.service.sent[0][2], first_loop)
+
+    @override_settings(TELEGRAM_SEND_TIMEOUT=0.1, TELEGRAM_CONNECTION_POOL_SIZE=1)
+    def test_hanging_message_does_not_fail_batch(self):
+        """Тест: зависшее сообщение не прерывает пакет, остальные отправляются"""
+        RecordingTelegramService.hanging_chat_id = 2
+        self.addCleanup(setattr, RecordingTelegramService, "hanging_chat_id", None)
+
+        results = self.sender.send_messages([(1, "a"), (2, "b"), (3, "c")])
+
+        self.assertEqual(results, [True, False, True])
+
+    def test_send_habit_reminder_uses_sender(self):
+        """Тест: задача напоминания передает сообщение отправителю"""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123",
+            telegram_chat_id=123456,
+        )
+        habit = Habit.objects.create(
+            user=user,
+            place="Дом",
+            time=time(8, 0),
+            action="Выпить воду",
+            execution_time=60,
+            periodicity=1,
+        )
+        with patch("habits.tasks.telegram_sender", self.sender):
+            send_habit_reminder(habit.id)
+
+        chat_id, message, _, _ = self.sender.service.sent[0]
+        self.assertEqual(chat_id, 123456)
+        self.assertIn("Выпить воду", message)
+
+
+class BatchReminderTaskTest(HabitFactoryMixin, FakeRedisMixin, TestCase):
+    """
+    Тесты для пакетной отправки напоминаний через outbox.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.sender = TelegramSender(service_factory=RecordingTelegramService)
+        self.addCleanup(self.sender.stop)
+        patcher = patch("habits.outbox.telegram_sender", self.sender)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, RecordingTelegramService, "failing_chat_id", None)
+        self.addCleanup(setattr, RecordingTelegramService, "hanging_chat_id", None)
+        cache.clear()
+        reminder_text_cache.clear_local()
+        self.fire_ts = int(timezone.now().timestamp()) - 60
+
+    def create_chat_habit(self, email, chat_id, **kwargs):
+        user = User.objects.create_user(
+            username=email,
+            email=email,
+            password="testpass123",
+            telegram_chat_id=chat_id,
+        )
+        return self.create_habit(f"Действие {email}", user=user, **kwargs)
+
+    def schedule(self, habits, fire_ts=None, chat_id=None):
+        """
+        Создание доставок так же, как это делает планировщик.
+        """
+        fire_ts = fire_ts or self.fire_ts
+        reminders = []
+        for habit in habits:
+            habit = Habit.objects.select_related("user", "related_habit").get(
+                id=habit.id
+            )
+            reminders.append(
+                (
+                    habit.id,
+                    chat_id or habit.user.telegram_chat_id,
+                    habit_reminder_version(habit),
+                    habit.user.reminder_digest,
+                )
+            )
+        create_deliveries(reminders, datetime.fromtimestamp(fire_ts, tz=UTC))
+        return [habit.id for habit in habits]
+
+    def habit_queries(self, context):
+        return [q for q in context.captured_queries if '"habits_habit"' in q["sql"]]
+
+    def test_reports_outcome_per_habit(self):
+        """Тест: результат отправки возвращается для каждой привычки"""
+        ok = self.create_chat_habit("ok@example.com", 1)
+        failing = self.create_chat_habit("fail@example.com", 2)
+        no_chat = self.create_chat_habit("nochat@example.com", None)
+        self.schedule([ok, failing])
+        self.schedule([no_chat], chat_id=3)
+        RecordingTelegramService.failing_chat_id = 2
+
+        results = send_habit_reminders_batch(
+            [ok.id, failing.id, no_chat.id, 999999], self.fire_ts
+        )
+
+        self.assertEqual(
+            results,
+            {
+                ok.id: REMINDER_SENT,
+                failing.id: REMINDER_TELEGRAM_ERROR,
+                no_chat.id: REMINDER_NO_CHAT_ID,
+                999999: REMINDER_MISSING_HABIT,
+            },
+        )
+        self.assertEqual(
+            sorted(chat_id for chat_id, *_ in self.sender.service.sent), [1, 2]
+        )
+        statuses = dict(ReminderDelivery.objects.values_list("habit_id", "status"))
+        self.assertEqual(
+            statuses,
+            {
+                ok.id: ReminderDelivery.STATUS_SENT,
+                failing.id: ReminderDelivery.STATUS_PENDING,
+                no_chat.id: ReminderDelivery.STATUS_DEAD,
+            },
+        )
+
+    def test_loads_batch_in_one_query(self):
+        """Тест: все привычки пачки загружаются одним запросом"""
+        habit_ids = self.schedule(
+            [self.create_chat_habit(f"user{i}@example.com", 100 + i) for i in range(5)]
+        )
+        with CaptureQueriesContext(connection) as context:
+            results = send_habit_reminders_batch(habit_ids, self.fire_ts)
+        self.assertEqual(set(results.values()), {REMINDER_SENT})
+        self.assertEqual(len(self.habit_queries(context)), 1)
+
+    def test_cached_texts_skip_habit_query(self):
+        """Тест: при попадании в кэш привычки не загружаются из БД"""
+        habits = [
+            self.create_chat_habit(f"user{i}@example.com", 100 + i) for i in range(3)
+        ]
+        send_habit_reminders_batch(self.schedule(habits), self.fire_ts)
+
+        habit_ids = self.schedule(habits, fire_ts=self.fire_ts + 1)
+        with CaptureQueriesContext(connection) as context:
+            results = send_habit_reminders_batch(habit_ids, self.fire_ts + 1)
+        self.assertEqual(set(results.values()), {REMINDER_SENT})
+        self.assertEqual(self.habit_queries(context), [])
+
+    def test_related_habit_change_renders_new_text(self):
+        """Тест: изменение связанной привычки дает новый текст"""
+        owner = User.objects.create_user(
+            username="owner", email="owner@example.com", password="testpass123"
+        )
+        pleasant = Habit.objects.create(
+            user=owner,
+            place="Дом",
+            time=time(9, 0),
+            action="Выпить кофе",
+            execution_time=60,
+            is_pleasant=True,
+        )
+        habit = self.create_chat_habit("ok@example.com", 1, related_habit=pleasant)
+        send_habit_reminders_batch(self.schedule([habit]), self.fire_ts)
+
+        pleasant.action = "Съесть яблоко"
+        pleasant.save()
+        habit_ids = self.schedule([habit], fire_ts=self.fire_ts + 1)
+        send_habit_reminders_batch(habit_ids, self.fire_ts + 1)
+
+        first, second = (message for _, message, *_ in self.sender.service.sent)
+        self.assertIn("Выпить кофе", first)
+        self.assertIn("Съесть яблоко", second)
+
+    def test_drops_already_sent_reminders(self):
+        """Тест: повторная доставка того же напоминания отбрасывается"""
+        habit_ids = self.schedule([self.create_chat_habit("ok@example.com", 1)])
+
+        first = send_habit_reminders_batch(habit_ids, self.fire_ts)
+        second = send_habit_reminders_batch(habit_ids, self.fire_ts)
+
+        self.assertEqual(first, {habit_ids[0]: REMINDER_SENT})
+        self.assertEqual(second, {habit_ids[0]: REMINDER_DUPLICATE})
+        self.assertEqual(len(self.sender.service.sent), 1)
+        self.assertEqual(get_duplicates_dropped(), 1)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_records_metrics(self):
+        """Тест: пачка записывает размер, задержку и результаты в метрики"""
+        ok = self.create_chat_habit("ok@example.com", 1)
+        failing = self.create_chat_habit("fail@example.com", 2)
+        RecordingTelegramService.failing_chat_id = 2
+        habit_ids = self.schedule([ok, failing])
+        send_habit_reminders_batch(habit_ids, self.fire_ts)
+        send_habit_reminders_batch(habit_ids, self.fire_ts)
+
+        response = self.client.get(
+            "/metrics/", headers={"Authorization": "Bearer secret"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('habit_reminders_total{outcome="sent"} 1', text)
+        self.assertIn('habit_reminders_total{outcome="telegram_error"} 1', text)
+        self.assertIn('habit_reminders_total{outcome="duplicate"} 2', text)
+        self.assertIn("habit_reminder_batch_size_count 1", text)
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="+Inf"} 1', text)
+
+    def test_digest_groups_reminders_of_one_minute(self):
+        """Тест: в режиме сводки напоминания одной минуты идут одним сообщением"""
+        first = self.create_chat_habit("digest@example.com", 7)
+        first.user.reminder_digest = True
+        first.user.save()
+        habits = [first] + [
+            Habit.objects.create(
+                user=first.user,
+                place="Офис",
+                time=time(8, 0),
+                action=f"Действие {i}",
+                execution_time=60,
+                periodicity=1,
+            )
+            for i in range(2)
+        ]
+        other = self.create_chat_habit("other@example.com", 8)
+        habit_ids = self.schedule(habits + [other])
+
+        # Соседи по сводке из других пачек отправляются вместе с первой
+        first_batch = send_habit_reminders_batch([habit_ids[0]], self.fire_ts)
+        second_batch = send_habit_reminders_batch(habit_ids[1:], self.fire_ts)
+
+        self.assertEqual(
+            first_batch, {habit_id: REMINDER_SENT for habit_id in habit_ids[:3]}
+        )
+        self.assertEqual(second_batch[other.id], REMINDER_SENT)
+        self.assertEqual(second_batch[habit_ids[1]], REMINDER_DUPLICATE)
+        chat_ids = [chat_id for chat_id, *_ in self.sender.service.sent]
+        self.assertEqual(chat_ids, [7, 8])
+
+        digest = self.sender.service.sent[0][1]
+        self.assertIn("Напоминания о привычках (3)", digest)
+        for habit in habits:
+            self.assertIn(habit.action, digest)
+        self.assertEqual(
+            ReminderDelivery.objects.filter(
+                status=ReminderDelivery.STATUS_SENT
+            ).count(),
+            4,
+        )
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        """Тест: неудачная доставка повторяется после задержки"""
+        habit_ids = self.schedule([self.create_chat_habit("fail@example.com", 2)])
+        RecordingTelegramService.failing_chat_id = 2
+        send_habit_reminders_batch(habit_ids, self.fire_ts)
+
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.attempts, 1)
+        self.assertGreater(delivery.next_attempt_at, timezone.now())
+        self.assertEqual(drain_reminder_outbox(), 0)
+
+        RecordingTelegramService.failing_chat_id = None
+        later = delivery.next_attempt_at + timedelta(seconds=1)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(drain_reminder_outbox(), 1)
+
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_SENT)
+        self.assertEqual(delivery.attempts, 2)
+
+    def test_claimed_delivery_is_leased(self):
+        """Тест: захваченная доставка не видна другим отправителям до конца аренды"""
+        self.schedule([self.create_chat_habit("ok@example.com", 1)])
+        with transaction.atomic():
+            claimed = claim_deliveries(list(pending_deliveries()))
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(drain_reminder_outbox(), 0)
+
+        lease = timedelta(seconds=settings.HABIT_REMINDER_DELIVERY_LEASE + 1)
+        with patch("django.utils.timezone.now", return_value=timezone.now() + lease):
+            self.assertEqual(drain_reminder_outbox(), 1)
+        self.assertEqual(
+            ReminderDelivery.objects.get().status, ReminderDelivery.STATUS_SENT
+        )
+
+    @override_settings(HABIT_REMINDER_MAX_ATTEMPTS=2, HABIT_REMINDER_RETRY_BASE_DELAY=0)
+    def test_delivery_goes_dead_after_max_attempts(self):
+        """Тест: после исчерпания попыток доставка переводится в dead"""
+        self.schedule([self.create_chat_habit("fail@example.com", 2)])
+        RecordingTelegramService.failing_chat_id = 2
+
+        drain_reminder_outbox()
+        drain_reminder_outbox()
+        drain_reminder_outbox()
+
+        delivery = ReminderDelivery.objects.get()
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_DEAD)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertEqual(len(self.sender.service.sent), 2)
+
+    @override_settings(TELEGRAM_SEND_TIMEOUT=0.1)
+    def test_timed_out_delivery_is_retried(self):
+        """Тест: таймаут отправки фиксируется как неудачная попытка"""
+        ok = self.create_chat_habit("ok@example.com", 1)
+        hanging = self.create_chat_habit("hang@example.com", 2)
+        habit_ids = self.schedule([ok, hanging])
+        RecordingTelegramService.hanging_chat_id = 2
+
+        results = send_habit_reminders_batch(habit_ids, self.fire_ts)
+
+        self.assertEqual(
+            results, {ok.id: REMINDER_SENT, hanging.id: REMINDER_TELEGRAM_ERROR}
+        )
+        delivery = ReminderDelivery.objects.get(habit=hanging)
+        self.assertEqual(delivery.status, ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(
+            ReminderDelivery.objects.get(habit=ok).status,
+            ReminderDelivery.STATUS_SENT,
+        )
+
+    def test_prune_removes_old_sent_deliveries(self):
+        """Тест: очистка удаляет только старые отправленные доставки"""
+        sent, dead, pending = (
+            self.create_chat_habit(f"prune{i}@example.com", i + 1) for i in range(3)
+        )
+        ttl = timedelta(days=settings.HABIT_REMINDER_DELIVERY_TTL_DAYS + 1)
+        self.schedule([sent, dead, pending], self.fire_ts - int(ttl.total_seconds()))
+        self.schedule([sent])
+        ReminderDelivery.objects.filter(habit=sent).update(
+            status=ReminderDelivery.STATUS_SENT
+        )
+        ReminderDelivery.objects.filter(habit=dead).update(
+            status=ReminderDelivery.STATUS_DEAD
+        )
+
+        self.assertEqual(prune_reminder_deliveries(), 1)
+        self.assertEqual(ReminderDelivery.objects.count(), 3)
+        self.assertEqual(ReminderDelivery.objects.filter(habit=sent).count(), 1)
+
+
+class TelegramRateLimiterTest(FakeRedisMixin, TestCase):
+    """
+    Тесты для ограничителя скорости отправки в Telegram.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.redis_server = fakeredis.FakeServer()
+        self.limiter = TelegramRateLimiter(
+            redis_client=fakeredis.aioredis.FakeRedis(server=self.redis_server),
+            global_rate=1000,
+            global_burst=1000,
+            chat_rate=20,
+            chat_burst=1,
+        )
+
+    def acquire_all(self, chat_ids):
+        async def acquire():
+            return await asyncio.gather(*(self.limiter.acquire(c) for c in chat_ids))
+
+        return asyncio.run(acquire())
+
+    def test_waits_for_chat_token(self):
+        """Тест: отправки в один чат ждут токен, а не отклоняются"""
+        waits = self.acquire_all([1, 1, 1])
+        self.assertGreaterEqual(max(waits), 0.09)
+
+        stats = get_rate_limiter_stats(fakeredis.FakeRedis(server=self.redis_server))
+        self.assertEqual(stats["acquired"], 3)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["wait_seconds_total"], 0)
+
+    def test_queue_depth_skips_abandoned_waiters(self):
+        """Тест: глубина очереди считает ожидающих, кроме брошенных записей"""
+        client = fakeredis.FakeRedis(server=self.redis_server)
+        client.zadd(WAITERS_KEY, {"dead": time_module.time() - WAITER_TTL - 1})
+
+        async def depth_while_waiting():
+            waiting = asyncio.gather(*(self.limiter.acquire(1) for _ in range(3)))
+            await asyncio.sleep(0.02)
+            depth = get_rate_limiter_stats(client)["queue_depth"]
+            await waiting
+            return depth
+
+        self.assertEqual(asyncio.run(depth_while_waiting()), 2)
+        self.assertEqual(get_rate_limiter_stats(client)["queue_depth"], 0)
+
+    def test_different_chats_do_not_wait(self):
+        """Тест: разные чаты не ограничивают друг друга"""
+        waits = self.acquire_all([1, 2, 3])
+        self.assertLess(max(waits), 0.05)
+
+    def test_no_429_from_fake_bot_api(self):
+        """Тест: с ограничителем фейковый Bot API не возвращает 429"""
+        with FakeBotAPI(chat_interval=0.04) as api, override_settings(
+            TELEGRAM_BOT_TOKEN="123:TEST", TELEGRAM_API_BASE_URL=api.base_url
+        ):
+            sender = TelegramSender(
+                service_factory=lambda: TelegramService(rate_limiter=self.limiter)
+            )
+            self.addCleanup(sender.stop)
+            # Первый запрос открывает соединение и идет дольше остальных:
+            # он не должен сокращать интервал между сообщениями в чат 42
+            sender.send_message(1, "Прогрев")
+            results = sender.send_messages([(42, f"Сообщение {i}") for i in range(4)])
+
+        self.assertEqual(results, [True] * 4)
+        self.assertEqual(len(api.messages), 5)
+        self.assertEqual(api.rejected, 0)
+        self.assertIn("habit_telegram_request_seconds_count 5", render_metrics())
+
+    @override_settings(TELEGRAM_SEND_TIMEOUT=0.5)
+    def test_queued_messages_do_not_time_out(self):
+        """Тест: сообщения, ждущие в очереди лимита, не считаются зависшими"""
+        limiter = TelegramRateLimiter(
+            redis_client=fakeredis.aioredis.FakeRedis(server=self.redis_server),
+            global_rate=10,
+            global_burst=1,
+            chat_rate=1000,
+            chat_burst=1000,
+        )
+        with FakeBotAPI() as api, override_settings(
+            TELEGRAM_BOT_TOKEN="123:TEST", TELEGRAM_API_BASE_URL=api.base_url
+        ):
+            sender = TelegramSender(
+                service_factory=lambda: TelegramService(rate_limiter=limiter)
+            )
+            self.addCleanup(sender.stop)
+            results = sender.send_messages(
+                [(chat_id, "Сообщение") for chat_id in range(10)]
+            )
+
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(len(api.messages), 10)
+
+
+class ReminderBenchmarkTest(TestCase):
+    """
+    Тесты для фейкового Bot API и нагрузочного прогона.
+    """
+
+    def test_fake_bot_api_injects_errors(self):
+        """Тест: фейковый Bot API отвечает 500 и 429 с заданной долей"""
+        api = FakeBotAPI(error_rate=1)
+        status, payload = api.handle_send_message({"chat_id": "1", "text": "Тест"})
+        self.assertEqual((status, payload["error_code"]), (500, 500))
+
+        api = FakeBotAPI(throttle_rate=1)
+        status, payload = api.handle_send_message({"chat_id": "1", "text": "Тест"})
+        self.assertEqual(status, 429)
+        self.assertEqual(payload["parameters"], {"retry_after": 1})
+
+        self.assertEqual(api.rejected, 1)
+        self.assertEqual(api.messages, [])
+
+    def test_percentile(self):
+        """Тест: перцентиль по методу ближайшего ранга"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_seeded_habits_are_due(self):
+        """Тест: созданные привычки попадают в планирование на свою минуту"""
+        fire_at = timezone.localtime().replace(hour=8, minute=1, second=0)
+        habit_ids = seed_benchmark_habits(3, fire_at)
+
+        due = Habit.objects.filter(
+            id__in=habit_ids,
+            fire_minute=8 * 60 + 1,
+            next_due_date__lte=fire_at.date(),
+            user__telegram_chat_id__isnull=False,
+        )
+        self.assertEqual(due.count(), 3)
+
+
+class ReminderMetricsTest(FakeRedisMixin, TestCase):
+    """
+    Тесты для метрик в формате Prometheus.
+    """
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Тест: корзины гистограммы накапливаются"""
+        REMINDER_LAG.observe_many([0.3, 1.5, 700])
+
+        text = render_metrics()
+
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="2.0"} 2', text)
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="600.0"} 2', text)
+        self.assertIn('habit_reminder_lag_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("habit_reminder_lag_seconds_sum 701.8", text)
+        self.assertIn("habit_reminder_lag_seconds_count 3", text)
+        self.assertIn("# TYPE habit_reminders_total counter", text)
+
+    def test_redis_errors_do_not_break_sending(self):
+        """Тест: ошибка Redis при записи метрики не пробрасывается"""
+        with patch.object(self.redis, "pipeline") as pipeline:
+            pipeline.return_value.execute.side_effect = RedisError("down")
+            REMINDER_LAG.observe(1)
+            REMINDER_OUTCOMES.inc_many([REMINDER_SENT])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_endpoint_requires_token(self):
+        """Тест: метрики отдаются только с верным токеном"""
+        for headers in (
+            {},
+            {"Authorization": "Bearer wrong"},
+            {"Authorization": "secret"},
+        ):
+            response = self.client.get("/metrics/", headers=headers)
+            self.assertEqual(response.status_code, 403, headers)
+
+        response = self.client.get(
+            "/metrics/", headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_endpoint_closed_without_token(self):
+        """Тест: без METRICS_TOKEN метрики открыты только при DEBUG"""
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN проверяется на PostgreSQL")
+class QueryPlanTest(TestCase):
+    """
+    Тесты планов запросов: горячие запросы должны использовать индексы.
+    Последовательное сканирование отключается, поэтому тест падает,
+    только если подходящего индекса нет.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123",
+            telegram_chat_id=1,
+        )
+        Habit.objects.bulk_create(
+            [
+                Habit(
+                    user=self.user,
+                    place="Дом",
+                    time=time(minute // 60, minute % 60),
+                    fire_minute=minute,
+                    action=f"Действие {minute}",
+                    execution_time=60,
+                    is_public=minute % 2 == 0,
+                )
+                for minute in range(0, MINUTES_PER_DAY, 7)
+            ]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE habits_habit")
+            cursor.execute("ANALYZE users_user")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_my_habits_list(self):
+        view = HabitViewSet()
+        view.request = SimpleNamespace(user=self.user)
+        self.assertUsesIndex(view.get_queryset()[:5], "habit_user_created_idx")
+
+    def test_public_feed(self):
+        queryset = PublicHabitViewSet().get_queryset()
+        self.assertUsesIndex(queryset[:5], "habit_public_feed_idx")
+        self.assertUsesIndex(
+            queryset.filter(created_at__lt=timezone.now()).order_by(
+                "-created_at", "-id"
+            )[:6],
+            "habit_public_feed_idx",
+        )
+
+    def test_reminder_scan(self):
+        eta = timezone.localtime().replace(hour=8, minute=1)
+        self.assertUsesIndex(due_habits(0, None, eta), "habit_due_reminder_user_idx")
+        first_user_id = self.user.pk
+        self.assertUsesIndex(
+            due_habits(first_user_id, first_user_id + 99, eta),
+            "habit_due_reminder_user_idx",
+        )
+
+    def test_search(self):
+        plan = Habit.objects.filter(search_filter("Действие")).explain()
+        self.assertIn("habit_search_vector_idx", plan, plan)
+        self.assertIn("habit_action_trgm_idx", plan, plan)
+        self.assertIn("habit_place_trgm_idx", plan, plan)
+
+    def test_sync(self):
+        since = timezone.now() - timedelta(minutes=5)
+        # С прошлой синхронизации меняется лишь несколько привычек
+        Habit.objects.filter(user=self.user, fire_minute__gte=70).update(
+            updated_at=since - timedelta(days=1)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE habits_habit")
+        self.assertUsesIndex(
+            Habit.objects.filter(user=self.user, updated_at__gte=since).order_by(
+                "updated_at"
+            ),
+            "habit_user_updated_idx",
+        )
+
+    def test_outbox_drain(self):
+        queryset = ReminderDelivery.objects.filter(
+            status=ReminderDelivery.STATUS_PENDING,
+            next_attempt_at__lte=timezone.now(),
+        ).order_by("next_attempt_at")[:100]
+        self.assertUsesIndex(queryset, "delivery_pending_idx")
+
+
+class QueryBudgetTest(HabitFactoryMixin, FakeRedisMixin, APITestCase):
+    """
+    Тесты бюджета SQL-запросов для всех endpoint'ов и задач.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="owner",
+            email="owner@example.com",
+            password="testpass123",
+            telegram_chat_id=1,
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+        self.pleasant = self.create_habit("Съесть яблоко", is_pleasant=True)
+        self.habit = self.create_habit(
+            "Выпить воду", related_habit=self.pleasant, is_public=True
+        )
+        for i in range(5):
+            author = User.objects.create_user(
+                username=f"author{i}",
+                email=f"author{i}@example.com",
+                password="testpass123",
+                telegram_chat_id=100 + i,
+            )
+            self.create_habit(
+                f"Действие {i}", user=author, is_public=True, periodicity=i + 1
+            )
+
+    def assertWithinBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(context),
+            budget,
+            "\n".join(query["sql"] for query in context.captured_queries),
+        )
+        return result
+
+    def call_endpoint(self, method, url, data=None):
+        budget = view_query_budget(resolve(urlparse(url).path).func, method)
+        self.assertIsNotNone(budget, f"Не объявлен бюджет для {method} {url}")
+        with override_settings(QUERY_COUNT_HEADER=True):
+            response = self.assertWithinBudget(
+                budget, getattr(self.client, method.lower()), url, data, format="json"
+            )
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertEqual(response["X-Query-Budget"], str(budget))
+        self.assertLessEqual(int(response["X-Query-Count"]), budget)
+        return response
+
+    def test_habit_endpoints(self):
+        """Тест: endpoint'ы привычек укладываются в бюджет"""
+        list_url = reverse("habits:habit-list")
+        detail_url = reverse("habits:habit-detail", args=[self.habit.id])
+        payload = {
+            "place": "Офис",
+            "time": "09:00",
+            "action": "Зарядка",
+            "execution_time": 60,
+            "periodicity": 1,
+            "related_habit": self.pleasant.id,
+        }
+
+        self.call_endpoint("GET", list_url)
+        self.call_endpoint("GET", detail_url)
+        created = self.call_endpoint("POST", list_url, payload)
+        self.call_endpoint("PUT", detail_url, payload)
+        self.call_endpoint("PATCH", detail_url, {"place": "Парк"})
+        self.call_endpoint(
+            "DELETE", reverse("habits:habit-detail", args=[created.data["id"]])
+        )
+        self.call_endpoint(
+            "POST",
+            reverse("habits:habit-bulk"),
+            {
+                "create": [payload] * 20,
+                "update": [{"id": self.habit.id, "time": "10:00"}],
+                "delete": [self.create_habit("Старая привычка").id],
+            },
+        )
+
+    def test_sync_endpoint(self):
+        """Тест: полная и дельта-синхронизация укладываются в бюджет"""
+        url = reverse("habits:habit-sync")
+        token = self.call_endpoint("GET", url).data["token"]
+        self.call_endpoint("GET", f"{url}?{urlencode({'since': token})}")
+
+    def test_public_endpoints(self):
+        """Тест: лента публичных привычек без N+1 по авторам"""
+        response = self.call_endpoint("GET", reverse("habits:public-habit-list"))
+        self.assertEqual(response.data["count"], 6)
+        self.call_endpoint(
+            "GET", reverse("habits:public-habit-list") + "?pagination=cursor"
+        )
+        self.call_endpoint(
+            "GET", reverse("habits:public-habit-detail", args=[self.habit.id])
+        )
+
+    def test_export_endpoints(self):
+        """Тест: выгрузка целиком, включая чтение потока, укладывается в бюджет"""
+        for name in ("habits:habit-export", "habits:public-habit-export"):
+            url = reverse(name, args=["ndjson"])
+            budget = view_query_budget(resolve(url).func, "GET")
+            content = self.assertWithinBudget(
+                budget, lambda: b"".join(self.client.get(url).streaming_content)
+            )
+            self.assertTrue(content)
+
+    def test_user_endpoints(self):
+        """Тест: endpoint'ы пользователей укладываются в бюджет"""
+        self.call_endpoint("GET", reverse("users:profile"))
+        self.call_endpoint("PATCH", reverse("users:profile"), {"first_name": "Иван"})
+        self.client.credentials()
+        self.call_endpoint(
+            "POST",
+            reverse("users:register"),
+            {
+                "username": "newuser",
+                "email": "new@example.com",
+                "password": "testpass123",
+            },
+        )
+        self.call_endpoint(
+            "POST",
+            reverse("users:login"),
+            {"username": "owner@example.com", "password": "testpass123"},
+        )
+
+    def test_reminder_tasks(self):
+        """Тест: задачи напоминаний укладываются в бюджет на одну пачку"""
+        sender = TelegramSender(service_factory=RecordingTelegramService)
+        self.addCleanup(sender.stop)
+        fire_at = timezone.localtime().replace(
+            hour=8, minute=0, second=0, microsecond=0
+        )
+        fire_ts = int(fire_at.timestamp())
+
+        with patch.object(schedule_reminder_shard, "delay"):
+            self.assertWithinBudget(
+                schedule_habit_reminders.query_budget, schedule_habit_reminders
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertWithinBudget(
+                schedule_reminder_shard.query_budget,
+                schedule_reminder_shard,
+                0,
+                None,
+                fire_ts,
+            )
+        # Диспетчер и отправители работают в момент напоминания
+        with patch("django.utils.timezone.now", return_value=fire_at), patch(
+            "habits.outbox.telegram_sender", sender
+        ), patch("habits.tasks.telegram_sender", sender):
+            with patch.object(send_habit_reminders_batch, "delay") as delay:
+                self.assertWithinBudget(
+                    dispatch_due_reminders.query_budget, dispatch_due_reminders
+                )
+
+            habit_ids, _ = delay.call_args.args
+            results = self.assertWithinBudget(
+                send_habit_reminders_batch.query_budget,
+                send_habit_reminders_batch,
+                habit_ids,
+                fire_ts,
+            )
+            self.assertEqual(set(results.values()), {REMINDER_SENT})
+
+            ReminderDelivery.objects.update(
+                status=ReminderDelivery.STATUS_PENDING, next_attempt_at=fire_at
+            )
+            self.assertEqual(
+                self.assertWithinBudget(
+                    drain_reminder_outbox.query_budget, drain_reminder_outbox
+                ),
+                len(habit_ids),
+            )
+            self.assertWithinBudget(
+                send_habit_reminder.query_budget, send_habit_reminder, self.habit.id
+            )
@@ -29,7 +29,7 @@ def validate_pleasant_habit(habit):
     if habit.is_pleasant:
         if habit.reward:
             raise ValidationError("У приятной привычки не может быть вознаграждения.")
-        if habit.related_habit:
+        if habit.related_habit_id:
             raise ValidationError(
                 "У приятной привычки не может быть связанной привычки."
             )
@@ -40,7 +40,7 @@ def validate_reward_and_related_habit(habit):
     Валидатор для исключения одновременного выбора связанной привычки
     и вознаграждения.
     """
-    if habit.reward and habit.related_habit:
+    if habit.reward and habit.related_habit_id:
         raise ValidationError(
             "Нельзя одновременно указать вознаграждение и связанную привычку. "
             "Выберите что-то одно."
@@ -50,8 +50,9 @@ def validate_reward_and_related_habit(habit):
 def validate_related_habit_is_pleasant(habit):
     """
     Валидатор для проверки, что связанная привычка является приятной.
+    Связанная привычка загружается только при ее наличии.
     """
-    if habit.related_habit and not habit.related_habit.is_pleasant:
+    if habit.related_habit_id and not habit.related_habit.is_pleasant:
         raise ValidationError(
             "В связанные привычки могут попадать только привычки "
             "с признаком приятной привычки."
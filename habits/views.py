@@ -1,9 +1,37 @@
-from rest_framework import permissions, viewsets
-from rest_framework.pagination import PageNumberPagination
+import hmac
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
+from rest_framework import permissions, serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from .async_views import AsyncAPIViewMixin
+from .bulk import apply_bulk_changes
+from .etags import auser_habits_etag, user_habits_etag
+from .export import export_response
+from .fast_read import habit_list_reader, public_habit_list_reader
+from .feed_cache import (afeed_page_key, aget_or_build_page, feed_page_key,
+                         get_or_build_page)
+from .metrics import render_metrics
 from .models import Habit
 from .permissions import IsOwner
-from .serializers import HabitSerializer, PublicHabitSerializer
+from .renderers import FastJSONRenderer
+from .search import search_habits
+from .serializers import (HabitBulkSerializer, HabitSerializer,
+                          PublicHabitSerializer)
+from .sync import sync_changes
 
 
 class HabitPagination(PageNumberPagination):
@@ -15,41 +43,460 @@ class HabitPagination(PageNumberPagination):
     page_size_query_param = "page_size"
     max_page_size = 100
 
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset через асинхронный ORM (см. async_views.py).
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count задается заранее: Paginator не выполняет синхронный COUNT(*)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        bottom = (number - 1) * page_size
+        top = bottom + page_size
+        rows = [row async for row in queryset[bottom:top]]
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return rows
+
+
+class HabitCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по (created_at, id).
+    Без COUNT(*) и OFFSET: каждая страница читается по индексу от курсора,
+    поэтому время ответа не зависит от глубины страницы.
+
+    Позиция курсора — пара (первое поле сортировки, id), страница
+    начинается строго после нее. Стандартный CursorPagination сравнивает
+    только первое поле и пропускает строки с тем же значением через OFFSET.
+    Второе поле сортировки должно быть id в том же направлении.
+    """
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        CursorPagination.paginate_queryset с фильтром по позиции (поле, id).
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(
+                *(
+                    field[1:] if field.startswith("-") else f"-{field}"
+                    for field in self.ordering
+                )
+            )
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._after(current_position, reverse))
+            except (ValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+
+        if reverse:
+            self.page.reverse()
+            self.next_position, self.previous_position = (
+                current_position,
+                following_position,
+            )
+        else:
+            self.next_position, self.previous_position = (
+                following_position,
+                current_position,
+            )
+        self.has_next = self.next_position is not None
+        self.has_previous = self.previous_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, position, reverse):
+        """
+        Условие «строка после позиции» в порядке чтения страницы,
+        для убывающего порядка — (field, id) < (value, pk).
+        Отдельное field <= value позволяет базе читать индекс от позиции.
+
+        :param position: Позиция курсора "value|id"
+        :param reverse: Курсор на предыдущую страницу
+        """
+        value, _, pk = position.rpartition("|")
+        order = self.ordering[0]
+        field = order.lstrip("-")
+        lookup = "lt" if order.startswith("-") != reverse else "gt"
+        return Q(**{f"{field}__{lookup}e": value}) & (
+            Q(**{f"{field}__{lookup}": value})
+            | Q(**{field: value, f"id__{lookup}": int(pk)})
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        value = super()._get_position_from_instance(instance, ordering)
+        pk = instance["id"] if isinstance(instance, dict) else instance.id
+        return f"{value}|{pk}"
+
+
+class HabitSearchCursorPagination(HabitCursorPagination):
+    """
+    Курсорная пагинация результатов поиска по релевантности.
+    """
+
+    ordering = ("-rank", "-id")
+
+
+class FastListMixin:
+    """
+    Список через values() и простые словари вместо ModelSerializer
+    (см. fast_read.py). Детальный просмотр и запись идут через сериализатор.
+
+    Параметр ?fields=id,action,time ограничивает поля ответа при чтении:
+    список читает через values() только эти колонки, детальный просмотр
+    загружает их через only().
+
+    alist() и aexport() — версии list() и export() для асинхронного
+    dispatch под ASGI (см. async_views.py).
+    """
+
+    list_reader = None
+    export_filename = "habits"
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # Колонки, которые нужны view сверх запрошенных полей (права, select_related)
+    sparse_required_fields = ("user",)
+
+    def get_sparse_fields(self):
+        """
+        Поля из ?fields= или None, если параметр не передан.
+        Неизвестные поля отклоняются до обращения к базе.
+        """
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        if not hasattr(self, "_sparse_fields"):
+            param = self.request.query_params.get("fields")
+            names = None
+            if param is not None:
+                names = {name.strip() for name in param.split(",")} - {""}
+                unknown = names - set(self.list_reader.names)
+                if unknown or not names:
+                    message = (
+                        f"Неизвестные поля: {', '.join(sorted(unknown))}."
+                        if unknown
+                        else "Не указаны поля."
+                    )
+                    available = ", ".join(self.list_reader.names)
+                    raise serializers.ValidationError(
+                        {"fields": [f"{message} Доступные поля: {available}."]}
+                    )
+            self._sparse_fields = names
+        return self._sparse_fields
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Проверка ?fields= до ETag, кэша ленты и запросов к базе
+        self.get_sparse_fields()
 
-class HabitViewSet(viewsets.ModelViewSet):
+    def get_list_reader(self):
+        fields = self.get_sparse_fields()
+        return self.list_reader if fields is None else self.list_reader.select(fields)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.get_sparse_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        if fields is not None and self.action == "retrieve":
+            reader = self.list_reader.select(fields)
+            queryset = queryset.only(*reader.lookups, *self.sparse_required_fields)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_list_reader()
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.to_representation(page))
+        return Response(reader.to_representation(queryset))
+
+    async def alist(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if paginator is not None and not hasattr(paginator, "apaginate_queryset"):
+            # У курсорной пагинации DRF нет асинхронной версии
+            return await sync_to_async(FastListMixin.list)(self, request)
+
+        reader = self.get_list_reader()
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        if paginator is not None:
+            rows = await paginator.apaginate_queryset(queryset, request, view=self)
+            if rows is not None:
+                return self.get_paginated_response(reader.to_representation(rows))
+        rows = [row async for row in queryset]
+        return Response(reader.to_representation(rows))
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"export/(?P<export_format>ndjson|csv)",
+    )
+    def export(self, request, export_format):
+        """
+        Потоковая выгрузка всего списка в NDJSON или CSV (см. export.py).
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by("id")
+        return export_response(
+            self.get_list_reader(), queryset, export_format, self.export_filename
+        )
+
+    async def aexport(self, request, export_format):
+        """
+        Асинхронная версия export: строки читаются асинхронным ORM
+        по мере отдачи ответа.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by("id")
+        return export_response(
+            self.get_list_reader(),
+            queryset,
+            export_format,
+            self.export_filename,
+            asynchronous=True,
+        )
+
+
+@method_decorator(etag(user_habits_etag), name="list")
+@method_decorator(etag(user_habits_etag), name="retrieve")
+class HabitViewSet(AsyncAPIViewMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления привычками пользователя.
     Пользователь может видеть только свои привычки.
+    Список и детальный просмотр поддерживают условные запросы (If-None-Match).
+    Под ASGI список читается асинхронно (см. async_views.py).
     """
 
     serializer_class = HabitSerializer
+    list_reader = habit_list_reader
     permission_classes = [permissions.IsAuthenticated, IsOwner]
     pagination_class = HabitPagination
+    # Максимум SQL-запросов на действие, включая аутентификацию по токену
+    # и агрегат для ETag при холодном кэше
+    query_budgets = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 3,
+        "update": 4,
+        "partial_update": 4,
+        "destroy": 7,
+        "bulk": 14,
+        "export": 2,
+        "sync": 3,
+    }
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Habit.objects.none()  # возвращаем пустой queryset
         return Habit.objects.filter(user=self.request.user)
 
+    async def alist(self, request, *args, **kwargs):
+        """
+        Список через асинхронный ORM. ETag проверяется до чтения списка,
+        как декоратором etag у list.
+        """
+        value = await auser_habits_etag(request)
+        response_etag = quote_etag(value) if value is not None else None
+        response = get_conditional_response(request, etag=response_etag)
+        if response is None:
+            response = await super().alist(request)
+        if response_etag is not None:
+            response.headers.setdefault("ETag", response_etag)
+        return response
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """
+        Изменения и удаления привычек после токена ?since= (см. sync.py).
+        Без токена возвращаются все привычки.
+        """
+        try:
+            data = sync_changes(
+                request.user,
+                self.get_queryset(),
+                self.get_list_reader(),
+                request.query_params.get("since"),
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError(
+                {"since": ["Недействительный токен синхронизации."]}
+            )
+        return Response(data)
+
     def perform_create(self, serializer):
         """
         Автоматически устанавливает текущего пользователя при создании.
         """
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Массовое создание, изменение и удаление привычек одним запросом.
+        Изменения применяются в одной транзакции; при ошибках ответ 400
+        содержит ошибки по каждому элементу и ничего не записывается.
+        """
+        serializer = HabitBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created, updated, deleted = apply_bulk_changes(
+            request.user, serializer.validated_data, self.get_serializer_context()
+        )
+        return Response(
+            {
+                "created": self.get_serializer(created, many=True).data,
+                "updated": self.get_serializer(updated, many=True).data,
+                "deleted": deleted,
+            }
+        )
+
 
-class PublicHabitViewSet(viewsets.ReadOnlyModelViewSet):
+class PublicHabitViewSet(
+    AsyncAPIViewMixin, FastListMixin, viewsets.ReadOnlyModelViewSet
+):
     """
     ViewSet для просмотра публичных привычек.
     Все пользователи могут видеть публичные привычки, но не могут их изменять.
+    Под ASGI лента читается асинхронно (см. async_views.py).
     """
 
     serializer_class = PublicHabitSerializer
+    list_reader = public_habit_list_reader
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = HabitPagination
+    cursor_pagination_class = HabitCursorPagination
+    search_pagination_class = HabitSearchCursorPagination
+    export_filename = "public-habits"
+    query_budgets = {"list": 3, "retrieve": 2, "export": 2}
+
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация включается параметром ?pagination=cursor
+        (или наличием ?cursor=), по умолчанию остается постраничная.
+        Результаты поиска всегда идут курсором по релевантности.
+        """
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if self.get_search_query():
+                self._paginator = self.search_pagination_class()
+            elif params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         """
         Возвращает только публичные привычки.
         """
-        return Habit.objects.filter(is_public=True)
+        return Habit.objects.filter(is_public=True).select_related("user")
+
+    def get_search_query(self):
+        return self.request.query_params.get("search", "").strip()
+
+    def filter_queryset(self, queryset):
+        """
+        Поиск ?search= по ленте и выгрузке (см. search.py).
+        """
+        queryset = super().filter_queryset(queryset)
+        query = self.get_search_query()
+        if query and self.action in ("list", "export"):
+            queryset = search_habits(queryset, query)
+        return queryset
+
+    def get_list_reader(self):
+        reader = super().get_list_reader()
+        if self.get_search_query():
+            # Курсор поиска строится по rank
+            reader = reader.select(reader.names, extra=("rank",))
+        return reader
+
+    def list(self, request, *args, **kwargs):
+        """
+        Первые страницы ленты отдаются из кэша (см. feed_cache.py).
+        """
+        key = feed_page_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        data = get_or_build_page(
+            key, lambda: super(PublicHabitViewSet, self).list(request).data
+        )
+        return Response(data)
+
+    async def alist(self, request, *args, **kwargs):
+        """
+        Асинхронная версия list.
+        """
+        key = await afeed_page_key(request)
+        if key is None:
+            return await super().alist(request)
+
+        async def build():
+            return (await super(PublicHabitViewSet, self).alist(request)).data
+
+        return Response(await aget_or_build_page(key, build))
+
+
+def metrics_view(request):
+    """
+    Метрики отправки напоминаний для Prometheus.
+    Доступ по заголовку "Authorization: Bearer <METRICS_TOKEN>"; если токен
+    не задан, метрики открыты только при DEBUG. Кроме того, nginx пускает
+    к ним только внутреннюю сеть (см. nginx/conf.d).
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        allowed = scheme.lower() == "bearer" and hmac.compare_digest(
+            credentials.encode(), token.encode()
+        )
+    else:
+        allowed = settings.DEBUG
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
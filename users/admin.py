@@ -15,5 +15,5 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ["email", "username", "telegram_chat_id"]
 
     fieldsets = UserAdmin.fieldsets + (
-        ("Дополнительная информация", {"fields": ("telegram_chat_id",)}),
+        ("Дополнительная информация", {"fields": ("telegram_chat_id", "reminder_digest")}),
     )
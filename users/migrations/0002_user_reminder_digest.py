@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="reminder_digest",
+            field=models.BooleanField(
+                default=False,
+                help_text="Объединять напоминания, приходящие в одну минуту, в одно сообщение",
+                verbose_name="Сводка напоминаний",
+            ),
+        ),
+    ]
@@ -15,6 +15,11 @@ class User(AbstractUser):
         verbose_name="Telegram Chat ID",
         help_text="ID чата Telegram для отправки уведомлений",
     )
+    reminder_digest = models.BooleanField(
+        default=False,
+        verbose_name="Сводка напоминаний",
+        help_text="Объединять напоминания, приходящие в одну минуту, в одно сообщение",
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
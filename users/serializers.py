@@ -19,6 +19,7 @@ class UserSerializer(serializers.ModelSerializer):
             "email",
             "password",
             "telegram_chat_id",
+            "reminder_digest",
             "first_name",
             "last_name",
         ]
@@ -35,6 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
             first_name=validated_data.get("first_name", ""),
             last_name=validated_data.get("last_name", ""),
             telegram_chat_id=validated_data.get("telegram_chat_id", None),
+            reminder_digest=validated_data.get("reminder_digest", False),
         )
         return user
 
@@ -51,6 +53,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "username",
             "email",
             "telegram_chat_id",
+            "reminder_digest",
             "first_name",
             "last_name",
         ]
@@ -5,6 +5,8 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from habits.async_views import AsyncAPIViewMixin
+
 from .serializers import UserProfileSerializer, UserSerializer
 
 User = get_user_model()
@@ -18,14 +20,16 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    # Проверки уникальности username, email и telegram_chat_id и две вставки
+    query_budgets = {"post": 5}
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        # Создание токена для нового пользователя
-        token, created = Token.objects.get_or_create(user=user)
+        # У нового пользователя токена еще нет: создаем без лишнего SELECT
+        token = Token.objects.create(user=user)
 
         return Response(
             {"user": UserSerializer(user).data, "token": token.key},
@@ -38,6 +42,9 @@ class UserLoginView(ObtainAuthToken):
     Авторизация пользователя.
     """
 
+    # Пользователь и токен (при первом входе токен создается в savepoint)
+    query_budgets = {"post": 5}
+
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(
             data=request.data, context={"request": request}
@@ -49,13 +56,19 @@ class UserLoginView(ObtainAuthToken):
         return Response({"token": token.key, "user": UserProfileSerializer(user).data})
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(AsyncAPIViewMixin, generics.RetrieveUpdateAPIView):
     """
     Просмотр и обновление профиля пользователя.
+    Под ASGI просмотр выполняется без потока (см. habits/async_views.py).
     """
 
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
+    query_budgets = {"get": 1, "put": 3, "patch": 3}
 
     def get_object(self):
         return self.request.user
+
+    async def aget(self, request, *args, **kwargs):
+        # Пользователь уже загружен аутентификацией: запросов к базе нет
+        return Response(self.get_serializer(request.user).data)